@@ -0,0 +1,349 @@
+import argparse
+import gc
+import json
+import os.path
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+from tempfile import TemporaryDirectory
+from xml.sax.saxutils import escape
+
+from logbook import Logger, NestedSetup, StreamHandler
+
+from bp_checker import BLUEPRINT_MODES, BluePrintChecker
+from check_mats import percentile
+from definition_snapshot import DefinitionSnapshot, write_snapshot
+from scraper import Scraper
+
+
+my_log = Logger(__name__)
+
+COMPONENTS = {"SteelPlate": {"Iron": 7.0},
+              "Construction": {"Iron": 2.67},
+              "InteriorPlate": {"Iron": 1.0},
+              "SmallTube": {"Iron": 1.67},
+              "LargeTube": {"Iron": 10.0},
+              "MetalGrid": {"Iron": 4.0, "Nickel": 1.67, "Cobalt": 1.0},
+              "Motor": {"Iron": 6.67, "Nickel": 1.67},
+              "Computer": {"Iron": 0.17, "Silicon": 0.07},
+              "Display": {"Iron": 0.33, "Silicon": 1.67},
+              "PowerCell": {"Iron": 3.33, "Silicon": 0.33, "Nickel": 0.67}}
+DEFINITIONS_HEAD = ('<?xml version="1.0"?>\n'
+                    '<Definitions xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+                    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n')
+
+
+def generate_content(content_path: str, block_types: int, files: int = 1, prefix: str = "Block",
+                     seed: int = 0) -> list:
+    """
+    Write a synthetic Data directory, block definitions spread over CubeBlocks files and a Blueprints.sbc
+
+    :param content_path: the Content or mod directory to write the Data directory in
+    :param block_types: how many block definitions to write
+    :param files: how many CubeBlocks files to spread them over
+    :param prefix: start of every block's SubtypeId, so mods can add their own blocks
+    :param seed: seed for the random component counts
+    :return: list of the SubtypeIds written
+    """
+    rand = random.Random(seed)
+    cube_blocks_path = os.path.join(content_path, "Data", "CubeBlocks")
+    os.makedirs(cube_blocks_path, exist_ok=True)
+
+    sub_type_ids = [f"{prefix}{index}" for index in range(block_types)]
+    for file_index in range(files):
+        with open(os.path.join(cube_blocks_path, f"CubeBlocks_{file_index}.sbc"), "w") as blocks_file:
+            blocks_file.write(DEFINITIONS_HEAD + "  <CubeBlocks>\n")
+            for sub_type_id in sub_type_ids[file_index::files]:
+                blocks_file.write(f"    <Definition>\n"
+                                  f"      <Id>\n"
+                                  f"        <TypeId>CubeBlock</TypeId>\n"
+                                  f"        <SubtypeId>{escape(sub_type_id)}</SubtypeId>\n"
+                                  f"      </Id>\n"
+                                  f"      <DisplayName>DisplayName_{escape(sub_type_id)}</DisplayName>\n"
+                                  f"      <Components>\n")
+                for component in rand.sample(list(COMPONENTS), rand.randint(1, 5)):
+                    blocks_file.write(f'        <Component Subtype="{component}" '
+                                      f'Count="{rand.randint(1, 50)}" />\n')
+                blocks_file.write("      </Components>\n"
+                                  "    </Definition>\n")
+            blocks_file.write("  </CubeBlocks>\n</Definitions>\n")
+
+    with open(os.path.join(content_path, "Data", "Blueprints.sbc"), "w") as recipes_file:
+        recipes_file.write(DEFINITIONS_HEAD + "  <Blueprints>\n")
+        for component, materials in COMPONENTS.items():
+            recipes_file.write("    <Blueprint>\n"
+                               "      <Prerequisites>\n")
+            for material, m_quantity in materials.items():
+                recipes_file.write(f'        <Item Amount="{m_quantity}" TypeId="Ingot" SubtypeId="{material}" />\n')
+            recipes_file.write(f"      </Prerequisites>\n"
+                               f'      <Result Amount="1" TypeId="Component" SubtypeId="{component}" />\n'
+                               f"    </Blueprint>\n")
+        recipes_file.write("  </Blueprints>\n</Definitions>\n")
+
+    return sub_type_ids
+
+
+def generate_mods(mods_path: str, mods: int, block_types: int, files: int = 1, seed: int = 0) -> list:
+    """
+    Write synthetic mods, each a directory with its own new blocks
+
+    :param mods_path: the directory to write the mods in
+    :param mods: how many mods to write
+    :param block_types: how many block definitions each mod has
+    :param files: how many CubeBlocks files each mod spreads its blocks over
+    :param seed: seed for the random component counts
+    :return: list of the SubtypeIds written
+    """
+    sub_type_ids = []
+    for mod in range(mods):
+        sub_type_ids.extend(generate_content(os.path.join(mods_path, str(1000000000 + mod)), block_types, files,
+                                             f"Mod{mod}Block", seed + mod + 1))
+
+    return sub_type_ids
+
+
+def generate_blueprint(bp_file: str, blocks: int, sub_type_ids: list, grids: int = 1, seed: int = 0) -> None:
+    """
+    Write a synthetic blueprint in the same schema as a ship blueprint's bp.sbc
+
+    The file is written a block at a time, so even a million block blueprint doesn't need much memory.
+
+    :param bp_file: path to write the blueprint to
+    :param blocks: how many cube blocks to write
+    :param sub_type_ids: the block types to pick from
+    :param grids: how many grids to spread the blocks over
+    :param seed: seed for picking the block types
+    :return: None
+    """
+    rand = random.Random(seed)
+
+    with open(bp_file, "w") as blueprint_file:
+        blueprint_file.write(DEFINITIONS_HEAD +
+                             '  <ShipBlueprints>\n'
+                             '    <ShipBlueprint xsi:type="MyObjectBuilder_ShipBlueprintDefinition">\n'
+                             '      <Id Type="MyObjectBuilder_ShipBlueprintDefinition" Subtype="Benchmark" />\n'
+                             '      <DisplayName>Benchmark</DisplayName>\n'
+                             '      <CubeGrids>\n')
+        for grid in range(grids):
+            blueprint_file.write(f"        <CubeGrid>\n"
+                                 f"          <SubtypeName />\n"
+                                 f"          <EntityId>{100000000000000000 + grid}</EntityId>\n"
+                                 f"          <GridSizeEnum>{'Large' if grid % 2 == 0 else 'Small'}</GridSizeEnum>\n"
+                                 f"          <CubeBlocks>\n")
+            for block in range(grid, blocks, grids):
+                blueprint_file.write(f'            <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">\n'
+                                     f'              <SubtypeName>{escape(rand.choice(sub_type_ids))}</SubtypeName>\n'
+                                     f'              <EntityId>{110000000000000000 + block}</EntityId>\n'
+                                     f'              <Min x="{block % 100}" y="{block // 100 % 100}" '
+                                     f'z="{block // 10000}" />\n'
+                                     f'              <ColorMaskHSV x="0" y="-0.8" z="0" />\n'
+                                     f'            </MyObjectBuilder_CubeBlock>\n')
+            blueprint_file.write("          </CubeBlocks>\n"
+                                 "          <DisplayName>Benchmark Grid</DisplayName>\n"
+                                 "        </CubeGrid>\n")
+        blueprint_file.write("      </CubeGrids>\n"
+                             "    </ShipBlueprint>\n"
+                             "  </ShipBlueprints>\n"
+                             "</Definitions>\n")
+
+
+def lookup_blocks(blocks, sub_type_ids: list) -> int:
+    """
+    Look every block's components up, the way a check does
+
+    :param blocks: the blocks, as dicts or anything that reads like them
+    :param sub_type_ids: the blocks to look up
+    :return: int, the total of their components
+    """
+    total = 0
+    for sub_type_id in sub_type_ids:
+        for c_quantity in blocks[sub_type_id]["components"].values():
+            total += c_quantity
+
+    return total
+
+
+def lookup_snapshot(snapshot_file: str, sub_type_ids: list) -> int:
+    """
+    Map a snapshot like a worker does, then look every block's components up from it
+
+    :param snapshot_file: path to a file from write_snapshot
+    :param sub_type_ids: the blocks to look up
+    :return: int, the total of their components
+    """
+    snapshot = DefinitionSnapshot(snapshot_file)
+    try:
+        return lookup_blocks(snapshot.blocks, sub_type_ids)
+    finally:
+        snapshot.close()
+
+
+def measure(run, repeats: int = 3, items: int = 0, setup=None) -> dict:
+    """
+    Time a stage a few times, then run it once more under tracemalloc for its peak memory
+
+    Timings are taken without tracemalloc, it slows allocation heavy code down a lot.
+
+    :param run: the stage, called with whatever setup returns
+    :param repeats: how many timed runs
+    :param items: how many things one run handles, for the throughput
+    :param setup: called before every run and not timed, its result is passed to run
+    :return: dict
+    """
+    timings = []
+    for _ in range(repeats):
+        state = setup() if setup is not None else None
+        gc.collect()
+        started = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - started)
+
+    state = setup() if setup is not None else None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(state)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    mean = sum(timings) / len(timings) if timings else 0.0
+
+    return {"repeats": repeats,
+            "items": items,
+            "seconds": {"mean": mean,
+                        "p50": percentile(timings, 0.5),
+                        "p95": percentile(timings, 0.95),
+                        "max": timings[-1] if timings else 0.0},
+            "items_per_second": items / mean if mean else 0.0,
+            "peak_bytes": peak_bytes}
+
+
+def run_benchmarks(work_dir: str, block_types: int = 1000, files: int = 10, mods: int = 1,
+                   mod_block_types: int = 100, bp_blocks: int = 10000, grids: int = 1, repeats: int = 3,
+                   modes: tuple = BLUEPRINT_MODES, seed: int = 0) -> dict:
+    """
+    Generate synthetic content, mods and a blueprint, then benchmark loading and checking them stage by stage
+
+    :param work_dir: an empty directory to generate everything in
+    :param block_types: how many vanilla block definitions to generate
+    :param files: how many CubeBlocks files to spread the vanilla blocks over
+    :param mods: how many mods to generate
+    :param mod_block_types: how many block definitions each mod has
+    :param bp_blocks: how many cube blocks the blueprint has
+    :param grids: how many grids to spread the blueprint's blocks over
+    :param repeats: how many timed runs of each stage
+    :param modes: which blueprint modes to benchmark checks with
+    :param seed: seed for everything random, so runs can be compared
+    :return: dict with the parameters and the results of every stage
+    """
+    se_path = os.path.join(work_dir, "Content")
+    mods_path = os.path.join(work_dir, "mods")
+    bp_file = os.path.join(work_dir, "bp.sbc")
+
+    sub_type_ids = generate_content(se_path, block_types, files, seed=seed)
+    sub_type_ids += generate_mods(mods_path, mods, mod_block_types, seed=seed)
+    generate_blueprint(bp_file, bp_blocks, sub_type_ids, grids, seed)
+
+    cube_blocks_path = os.path.join(se_path, "Data", "CubeBlocks")
+    mod_paths = [os.path.join(mods_path, mod, "Data", "CubeBlocks") for mod in sorted(os.listdir(mods_path))]
+    recipes_file = os.path.join(se_path, "Data", "Blueprints.sbc")
+
+    scraper = Scraper()
+    scraper.load_block_dirs([cube_blocks_path] + mod_paths)
+    scraper.load_recipes(recipes_file)
+
+    stages = {
+        "load_blocks": measure(lambda _: Scraper().load_blocks(cube_blocks_path), repeats, block_types),
+        "load_blocks_modded": measure(lambda _: Scraper().load_block_dirs([cube_blocks_path] + mod_paths), repeats,
+                                      len(sub_type_ids)),
+        "load_recipes": measure(lambda _: Scraper().load_recipes(recipes_file), repeats, len(COMPONENTS))
+    }
+
+    def make_checker():
+        return BluePrintChecker(scraper.all_blocks, scraper.all_recipes)
+
+    def make_precompiled_checker():
+        checker = make_checker()
+        checker.precompile()
+        return checker
+
+    stages["precompile"] = measure(lambda checker: checker.precompile(), repeats, len(scraper.all_blocks),
+                                   make_checker)
+
+    # what a worker process holds to look blocks up, the definitions pickled over to it or a shared snapshot
+    snapshot_file = os.path.join(work_dir, "definitions.snapshot")
+    write_snapshot(snapshot_file, scraper.all_blocks, scraper.all_recipes)
+    definitions = pickle.dumps((scraper.all_blocks, scraper.all_recipes))
+    stages["lookup_dict"] = measure(lambda _: lookup_blocks(pickle.loads(definitions)[0], sub_type_ids), repeats,
+                                    len(sub_type_ids))
+    stages["lookup_snapshot"] = measure(lambda _: lookup_snapshot(snapshot_file, sub_type_ids), repeats,
+                                        len(sub_type_ids))
+
+    for mode in modes:
+        stages[f"check_blueprint_{mode}"] = measure(lambda checker: checker.check_blueprint(bp_file, mode), repeats,
+                                                    bp_blocks, make_checker)
+        stages[f"check_blueprint_{mode}_precompiled"] = measure(
+            lambda checker: checker.check_blueprint(bp_file, mode), repeats, bp_blocks, make_precompiled_checker)
+
+    return {"parameters": {"block_types": block_types,
+                           "files": files,
+                           "mods": mods,
+                           "mod_block_types": mod_block_types,
+                           "bp_blocks": bp_blocks,
+                           "bp_bytes": os.path.getsize(bp_file),
+                           "grids": grids,
+                           "repeats": repeats,
+                           "seed": seed},
+            "python": sys.version.split()[0],
+            "stages": stages}
+
+
+if __name__ == "__main__":
+    """
+    usage: benchmark.py [-h] [--block-types BLOCK_TYPES] [--files FILES] [--mods MODS]
+                        [--mod-block-types MOD_BLOCK_TYPES] [--bp-blocks BP_BLOCKS] [--grids GRIDS]
+                        [--repeats REPEATS] [--seed SEED] [-o OUTPUT]
+
+    Benchmark scraping and checking with synthetic content and blueprints
+
+    options:
+      -h, --help                           show this help message and exit
+      --block-types BLOCK_TYPES            vanilla block definitions to generate
+      --files FILES                        CubeBlocks files to spread the vanilla blocks over
+      --mods MODS                          mods to generate
+      --mod-block-types MOD_BLOCK_TYPES    block definitions in each mod
+      --bp-blocks BP_BLOCKS                cube blocks in the blueprint
+      --grids GRIDS                        grids to spread the blueprint's blocks over
+      --repeats REPEATS                    timed runs of each stage
+      --seed SEED                          seed for the generated content, keep it the same to compare runs
+      -o OUTPUT, --output OUTPUT           write the results to this json file instead of stdout
+    """
+    argp = argparse.ArgumentParser(prog="benchmark.py",
+                                   description="Benchmark scraping and checking with synthetic content and blueprints")
+    argp.add_argument("--block-types", help="vanilla block definitions to generate", type=int, default=1000)
+    argp.add_argument("--files", help="CubeBlocks files to spread the vanilla blocks over", type=int, default=10)
+    argp.add_argument("--mods", help="mods to generate", type=int, default=1)
+    argp.add_argument("--mod-block-types", help="block definitions in each mod", type=int, default=100)
+    argp.add_argument("--bp-blocks", help="cube blocks in the blueprint", type=int, default=10000)
+    argp.add_argument("--grids", help="grids to spread the blueprint's blocks over", type=int, default=1)
+    argp.add_argument("--repeats", help="timed runs of each stage", type=int, default=3)
+    argp.add_argument("--seed", help="seed for the generated content, keep it the same to compare runs", type=int,
+                      default=0)
+    argp.add_argument("-o", "--output", help="write the results to this json file instead of stdout", type=str)
+    args = argp.parse_args()
+
+    # warnings only, unknown block warnings would swamp the output otherwise
+    with NestedSetup([StreamHandler(sys.stderr, level="WARNING")]):
+        with TemporaryDirectory() as benchmark_dir:
+            results = run_benchmarks(benchmark_dir, args.block_types, args.files, args.mods, args.mod_block_types,
+                                     args.bp_blocks, args.grids, args.repeats, seed=args.seed)
+
+    if args.output:
+        with open(args.output, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
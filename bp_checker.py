@@ -1,42 +1,384 @@
+import io
+import math
+import mmap
+import re
 import xml.etree.ElementTree as ElementTree
 
 from logbook import Logger
 
+from mod_list import mod_item_id
+from stats import NO_STATS, Stats, source_size
+
 
 my_log = Logger(__name__)
 
+BLUEPRINT_MODES = ("dom", "stream", "scan")
+
+BLOCK_START_PATTERN = re.compile(rb"<MyObjectBuilder_CubeBlock[\s>/]")
+# a block whose SubtypeName is its first child, which is how the game writes them
+BLOCK_NAME_PATTERN = re.compile(rb"<MyObjectBuilder_CubeBlock\b[^>]*(?<!/)>\s*<SubtypeName>([^<]*)</SubtypeName>")
+ENCODING_PATTERN = re.compile(rb"<\?xml[^>]*encoding=[\"']([^\"']+)[\"']")
+# anything that could hide or invent a tag from a byte search, or change what the bytes mean
+UNSPLITTABLE = (b"<!--", b"<![CDATA[", b"<!DOCTYPE", b"<!ENTITY")
+
 
 class BluePrintChecker:
     """
     Checks blueprint details
     """
-    def __init__(self, blocks: dict, components: dict) -> None:
+    def __init__(self, blocks: dict, components: dict, instrument: bool = False) -> None:
         """
         Create a BluePrintChecker class
 
         :param blocks: a dict with all the blocks in
+        :param instrument: time each stage of a check and add the stats to the result
         :return: None
         """
         self.blocks = blocks  # for calculating component costs later
         self.components = components  # for calculating materials estimate later
+        self.block_table = None  # flat block costs, see precompile
+        self.instrument = instrument
 
-    def check_blueprint(self, bp_file: str) -> dict:
+    def check_blueprint(self, bp_file: str, mode: str = "dom", breakdown: bool = False,
+                        remaining: bool = False) -> dict:
         """
         Check a blueprint
 
         :param bp_file: path to an xml blueprint file
+        :param mode: "dom" to parse the whole blueprint, "stream" to count blocks without keeping the tree,
+            "scan" to search the bytes for blocks without parsing, falling back to "stream" when it can't
+        :param breakdown: also give the totals for each grid and each grid size, see check_grids
+        :param remaining: also give what is left to build of partly built or damaged blocks, see check_remaining,
+            the blueprint is always streamed for this
+        :return: dict, with a "stats" dict too if the checker is instrumented
+        """
+        if breakdown and remaining:
+            raise ValueError("A check can't have both a breakdown and the remaining cost")
+
+        if not self.instrument:
+            if remaining:
+                return self.check_remaining(*self.count_build_state(bp_file))
+            if breakdown:
+                return self.check_grids(self.count_grids(bp_file, mode))
+            return self.check_counts(self.count_blocks(bp_file, mode))
+
+        stats = Stats()
+        with stats.stage("check_blueprint"):
+            if remaining:
+                with stats.stage("count_build_state"):
+                    blocks, partial_blocks = self.count_build_state(bp_file)
+                with stats.stage("check_remaining"):
+                    result = self.check_remaining(blocks, partial_blocks)
+                stats.count("partial_blocks", len(partial_blocks))
+            elif breakdown:
+                with stats.stage("count_grids"):
+                    grids = self.count_grids(bp_file, mode)
+                with stats.stage("check_grids"):
+                    result = self.check_grids(grids)
+                blocks = result["blocks"]
+            else:
+                blocks = self.count_blocks(bp_file, mode, stats)
+                result = self.check_counts(blocks, stats)
+
+        stats.count("files_parsed")
+        stats.count("bytes_parsed", source_size(bp_file))
+        stats.count("cube_blocks", sum(blocks.values()))
+        stats.count("block_types", len(blocks))
+        stats.count("unknown_blocks", len(result["unknown_blocks"]))
+        result["stats"] = stats.as_dict()
+
+        return result
+
+    def count_blocks(self, bp_file: str, mode: str = "dom", stats: Stats = NO_STATS) -> dict:
+        """
+        Count the blocks in a blueprint
+
+        :param bp_file: path to an xml blueprint file
+        :param mode: "dom" to parse the whole blueprint, "stream" to count blocks without keeping the tree,
+            "scan" to search the bytes for blocks without parsing, falling back to "stream" when it can't
+        :param stats: where to time the parsing and counting
+        :return: dict
+        """
+        if mode == "scan":
+            with stats.stage("scan_blocks"):
+                used_blocks = self.scan_blocks(bp_file)
+            if used_blocks is not None:
+                return used_blocks
+
+            stats.count("scan_fallbacks")
+            mode = "stream"
+
+        if mode == "dom":
+            with stats.stage("open_blueprint"):
+                blueprint = self.open_blueprint(bp_file)
+            with stats.stage("check_blocks"):
+                return self.check_blocks(blueprint)
+
+        if mode == "stream":
+            with stats.stage("stream_blocks"):
+                return self.stream_blocks(bp_file)
+
+        raise ValueError(f"Unknown blueprint mode: {mode}")
+
+    def count_grids(self, bp_file: str, mode: str = "dom") -> list:
+        """
+        Count the blocks in each grid of a blueprint, in one pass over it
+
+        Blocks that aren't in any grid are counted in a last grid with no size or name.
+
+        :param bp_file: path to an xml blueprint file
+        :param mode: "dom" keeps the tree while parsing, "stream" and "scan" drop each block once it is counted
+        :return: list of dicts with each grid's "grid_size", "display_name" and "blocks"
+        """
+        if mode not in BLUEPRINT_MODES:
+            raise ValueError(f"Unknown blueprint mode: {mode}")
+
+        grids = []
+        grid = None
+        loose_blocks = {}
+        parents = []
+        try:
+            for event, element in ElementTree.iterparse(bp_file, events=("start", "end")):
+                if event == "start":
+                    parents.append(element)
+                    if element.tag == "CubeGrid":
+                        grid = {"grid_size": None, "display_name": None, "blocks": {}}
+                        grids.append(grid)
+                    continue
+
+                parents.pop()
+                if element.tag == "MyObjectBuilder_CubeBlock":
+                    used_blocks = grid["blocks"] if grid is not None else loose_blocks
+                    sub_type_name = self.get_block_name(element)
+                    used_blocks[sub_type_name] = used_blocks.get(sub_type_name, 0) + 1
+                elif element.tag == "CubeGrid":
+                    grid = None
+                elif grid is not None and parents[-1].tag == "CubeGrid":
+                    if element.tag == "GridSizeEnum":
+                        grid["grid_size"] = element.text
+                    elif element.tag == "DisplayName":
+                        grid["display_name"] = element.text
+                    continue
+                else:
+                    continue
+
+                if mode != "dom":
+                    element.clear()
+                    if parents:
+                        parents[-1].remove(element)
+
+        except ElementTree.ParseError:
+            my_log.error(f"Could not read grids from BP due to ParseError: {bp_file}")
+            return []
+
+        if loose_blocks:
+            grids.append({"grid_size": None, "display_name": None, "blocks": loose_blocks})
+
+        return grids
+
+    def check_grids(self, grids: list) -> dict:
+        """
+        Check the components and materials for each grid, each grid size and the whole blueprint
+
+        The totals are added up from the grids' results, so each grid's blocks are only looked at once.
+
+        :param grids: grids from count_grids
+        :return: dict like check_counts gives, plus "grids" and "grid_sizes" with the same totals for each
+        """
+        grid_results = []
+        grid_sizes = {}
+        result = {"blocks": {}, "components": {}, "unknown_blocks": [], "materials_estimate": {}}
+        for grid in grids:
+            grid_result = self.check_counts(grid["blocks"])
+            grid_results.append({"grid_size": grid["grid_size"], "display_name": grid["display_name"],
+                                 **grid_result})
+
+            grid_size = grid["grid_size"] or "Unknown"
+            if grid_size not in grid_sizes:
+                grid_sizes[grid_size] = {"blocks": {}, "components": {}, "unknown_blocks": [],
+                                         "materials_estimate": {}}
+            add_result(grid_sizes[grid_size], grid_result)
+            add_result(result, grid_result)
+
+        result["grids"] = grid_results
+        result["grid_sizes"] = grid_sizes
+
+        return result
+
+    def count_build_state(self, bp_file: str) -> tuple:
+        """
+        Count the blocks in a blueprint and note the build state of the ones that aren't finished, in one pass
+
+        A block is unfinished if its BuildPercent or IntegrityPercent is under 1, or it has components in its
+        ConstructionStockpile waiting to be welded in. The game leaves these out for finished blocks.
+
+        :param bp_file: path to an xml blueprint file
+        :return: tuple of the block counts and a list of (SubtypeName, fraction installed, stockpile) for each
+            unfinished block
+        """
+        used_blocks = {}
+        partial_blocks = []
+        parents = []
+        try:
+            for event, element in ElementTree.iterparse(bp_file, events=("start", "end")):
+                if event == "start":
+                    parents.append(element)
+                    continue
+
+                parents.pop()
+                if element.tag != "MyObjectBuilder_CubeBlock":
+                    continue
+
+                sub_type_name = self.get_block_name(element)
+                used_blocks[sub_type_name] = used_blocks.get(sub_type_name, 0) + 1
+
+                installed = min(self.get_percent(element, "BuildPercent"),
+                                self.get_percent(element, "IntegrityPercent"))
+                stockpile = self.get_stockpile(element)
+                if installed < 1.0 or stockpile:
+                    partial_blocks.append((sub_type_name, max(installed, 0.0), stockpile))
+
+                element.clear()
+                if parents:
+                    parents[-1].remove(element)
+
+        except ElementTree.ParseError:
+            my_log.error(f"Could not read build state from BP due to ParseError: {bp_file}")
+            return {}, []
+
+        return used_blocks, partial_blocks
+
+    def check_remaining(self, blocks: dict, partial_blocks: list) -> dict:
+        """
+        Check the components and materials for counted blocks, and what is left to build of the unfinished ones
+
+        Every block's full cost goes through check_counts by type, only the unfinished blocks are looked at one by one.
+        A finished block has nothing left to build.
+
+        :param blocks: a dict of block counts, finished or not
+        :param partial_blocks: unfinished blocks from count_build_state
+        :return: dict like check_counts gives, plus "remaining_components" and "remaining_materials"
+        """
+        result = self.check_counts(blocks)
+
+        remaining_components = {}
+        for sub_type_name, installed, stockpile in partial_blocks:
+            if sub_type_name not in self.blocks:
+                continue
+
+            for component, c_quantity in self.remaining_components(sub_type_name, installed, stockpile).items():
+                remaining_components[component] = remaining_components.get(component, 0) + c_quantity
+
+        result["remaining_components"] = remaining_components
+        result["remaining_materials"] = self.check_mats(remaining_components)["materials"]
+
+        return result
+
+    def remaining_components(self, sub_type_name: str, installed: float, stockpile: dict) -> dict:
+        """
+        The components an unfinished block still needs
+
+        The installed fraction of the block's components, in whole components, is taken to be the ones first in its
+        definition, since that is the order they are welded in. Components in the stockpile are there already.
+
+        :param sub_type_name: the block's SubtypeName
+        :param installed: the fraction of the block that is built, the lower of its build and integrity percent
+        :param stockpile: components waiting in the block's construction stockpile
         :return: dict
         """
-        blueprint = self.open_blueprint(bp_file)
-        blocks = self.check_blocks(blueprint)
-        components = self.check_components(blocks)
-        materials = self.check_mats(components["components"])
+        components = self.blocks[sub_type_name]["components"]
+        # the small amount stops float error turning e.g. 0.6 * 10 into 5 components
+        installed_left = math.floor(installed * sum(components.values()) + 1e-9)
+
+        remaining = {}
+        for component, c_quantity in components.items():
+            c_installed = min(c_quantity, installed_left)
+            installed_left -= c_installed
+            c_remaining = c_quantity - c_installed - stockpile.get(component, 0)
+            if c_remaining > 0:
+                remaining[component] = c_remaining
+
+        return remaining
+
+    def check_counts(self, blocks: dict, stats: Stats = NO_STATS) -> dict:
+        """
+        Check the components and materials for counted blocks
+
+        :param blocks: a dict of block counts
+        :param stats: where to time the totalling
+        :return: dict
+        """
+        if self.block_table is not None:
+            with stats.stage("check_table"):
+                return self.check_table(blocks)
+
+        with stats.stage("check_components"):
+            components = self.check_components(blocks)
+        with stats.stage("check_mats"):
+            materials = self.check_mats(components["components"])
 
         return {"blocks": blocks,
                 "components": components["components"],
                 "unknown_blocks": components["unknown_blocks"],
                 "materials_estimate": materials["materials"]}
 
+    def precompile(self) -> None:
+        """
+        Flatten every block's components and raw materials into one table, so checks skip the recipe walk
+
+        The table is built from the definitions as they are now, precompile again if they change.
+
+        :return: None
+        """
+        block_table = {}
+        for sub_type_id, block in self.blocks.items():
+            materials = {}
+            for component, c_quantity in block["components"].items():
+                if component not in self.components:
+                    continue
+
+                for material, m_quantity in self.components[component]["materials"].items():
+                    materials[material] = materials.get(material, 0) + m_quantity * c_quantity
+
+            block_table[sub_type_id] = (tuple(block["components"].items()), tuple(materials.items()))
+
+        self.block_table = block_table
+
+    def check_table(self, blocks: dict) -> dict:
+        """
+        Check the components and materials for counted blocks with the precompiled table
+
+        Gives the same totals as check_components and check_mats, materials can differ by float rounding.
+
+        :param blocks: a dict of block counts
+        :return: dict
+        """
+        used_components = {}
+        used_materials = {}
+        unknown_blocks = []
+        for block, b_quantity in blocks.items():
+            costs = self.block_table.get(block)
+            if costs is None:
+                my_log.warn(f"Unknown block type: {block}")
+                unknown_blocks.append(block)
+                continue
+
+            components, materials = costs
+            for component, c_quantity in components:
+                used_components[component] = used_components.get(component, 0) + c_quantity * b_quantity
+            for material, m_quantity in materials:
+                used_materials[material] = used_materials.get(material, 0) + m_quantity * b_quantity
+
+        # the table leaves out components without a recipe, warn about them like check_mats does
+        for component in used_components:
+            if component not in self.components:
+                my_log.warn(f"Unknown component type: {component}")
+
+        return {"blocks": blocks,
+                "components": used_components,
+                "unknown_blocks": unknown_blocks,
+                "materials_estimate": used_materials}
+
     def check_blocks(self, blueprint: ElementTree) -> dict:
         """
         Checks the blocks in a blueprint
@@ -55,6 +397,67 @@ class BluePrintChecker:
 
         return used_blocks
 
+    def stream_blocks(self, bp_file: str) -> dict:
+        """
+        Counts the blocks in a blueprint while parsing it, dropping each block once it is counted
+
+        :param bp_file: path to an xml blueprint file
+        :return: dict
+        """
+        used_blocks = {}
+        parents = []
+        try:
+            for event, element in ElementTree.iterparse(bp_file, events=("start", "end")):
+                if event == "start":
+                    parents.append(element)
+                    continue
+
+                parents.pop()
+                if element.tag != "MyObjectBuilder_CubeBlock":
+                    continue
+
+                sub_type_name = self.get_block_name(element)
+                if sub_type_name in used_blocks:
+                    used_blocks[sub_type_name] += 1
+                else:
+                    used_blocks[sub_type_name] = 1
+
+                # the parser may be ahead of us, so the block isn't always the last child
+                element.clear()
+                if parents:
+                    parents[-1].remove(element)
+
+        except ElementTree.ParseError:
+            my_log.error(f"Could not stream BP due to ParseError: {bp_file}")
+            return {}
+
+        return used_blocks
+
+    @staticmethod
+    def scan_blocks(bp_file) -> dict:
+        """
+        Counts the blocks in a blueprint by searching its bytes, without building any elements
+
+        Only the start of each block and the SubtypeName that follows it are looked at, big files are memory mapped
+        rather than read. Anything a byte search could get wrong, such as comments, entities, an encoding other than
+        utf-8 or a block without a SubtypeName as its first child, means the blueprint has to be parsed instead.
+
+        :param bp_file: path to an xml blueprint file, or a file object, only a BytesIO is searched since reading
+            any other file object would use it up before it could be parsed
+        :return: dict, or None if the blueprint has to be parsed
+        """
+        if isinstance(bp_file, io.BytesIO):
+            return scan_bytes(bp_file.getvalue())
+        if not isinstance(bp_file, str):
+            return None
+
+        try:
+            with open(bp_file, "rb") as blueprint_file:
+                with mmap.mmap(blueprint_file.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                    return scan_bytes(contents)
+        except (OSError, ValueError):  # an empty file can't be mapped
+            return None
+
     def check_components(self, blocks: dict) -> dict:
         """
         Checks the components required for blocks
@@ -121,6 +524,80 @@ class BluePrintChecker:
             my_log.error(f"Could not open BP due to ParseError: {bp_file}")
             return ElementTree
 
+    @staticmethod
+    def referenced_mods(bp_file: str) -> list:
+        """
+        Get the workshop ids of the mods a blueprint lists in its Mods section
+
+        :param bp_file: path to an xml blueprint file
+        :return: list of str, empty if there is no Mods section or the blueprint can't be read
+        """
+        mod_ids = []
+        parents = []
+        try:
+            for event, element in ElementTree.iterparse(bp_file, events=("start", "end")):
+                if event == "start":
+                    parents.append(element)
+                    continue
+
+                parents.pop()
+                if element.tag == "ModItem":
+                    mod_id = mod_item_id(element)
+                    if mod_id and mod_id not in mod_ids:
+                        mod_ids.append(mod_id)
+                elif element.tag != "MyObjectBuilder_CubeBlock":
+                    continue
+
+                element.clear()
+                if parents:
+                    parents[-1].remove(element)
+
+        except ElementTree.ParseError:
+            my_log.error(f"Could not read mods from BP due to ParseError: {bp_file}")
+            return []
+
+        return mod_ids
+
+    @staticmethod
+    def get_percent(block: ElementTree, tag: str) -> float:
+        """
+        Get how far along a block is, e.g. its BuildPercent
+
+        :param block: an ElementTree of a single block
+        :param tag: the percent's tag
+        :return: float, 1.0 for a finished block or if the percent isn't a number
+        """
+        percent = block.findtext(tag)
+        if not percent:
+            return 1.0
+
+        try:
+            value = float(percent)
+        except ValueError:
+            value = math.nan
+        if not math.isfinite(value):
+            my_log.warn(f"Bad {tag} {percent!r} on a {block.findtext('SubtypeName')}, counting it as finished")
+            return 1.0
+
+        return value
+
+    @staticmethod
+    def get_stockpile(block: ElementTree) -> dict:
+        """
+        Get the components waiting in a block's construction stockpile
+
+        :param block: an ElementTree of a single block
+        :return: dict, empty if the block has no stockpile
+        """
+        stockpile = {}
+        for item in block.iterfind("ConstructionStockpile/Items/MyObjectBuilder_StockpileItem"):
+            component = item.findtext("PhysicalContent/SubtypeName") or item.get("SubtypeName")
+            amount = item.findtext("Amount") or item.get("Amount")
+            if component and amount:
+                stockpile[component] = stockpile.get(component, 0) + int(amount)
+
+        return stockpile
+
     @staticmethod
     def get_block_name(block: ElementTree) -> str:
         """
@@ -138,3 +615,55 @@ class BluePrintChecker:
             my_log.info(f"Trying block_name: {block_name}")
 
         return block_name
+
+
+def add_result(totals: dict, result: dict) -> None:
+    """
+    Add a check's blocks, components, unknown blocks and materials to running totals
+
+    :param totals: the totals, changed in place
+    :param result: a result from check_counts
+    :return: None
+    """
+    for key in ["blocks", "components", "materials_estimate"]:
+        for name, quantity in result[key].items():
+            totals[key][name] = totals[key].get(name, 0) + quantity
+    for block in result["unknown_blocks"]:
+        if block not in totals["unknown_blocks"]:
+            totals["unknown_blocks"].append(block)
+
+
+def scan_bytes(contents) -> dict:
+    """
+    Count the blocks in a blueprint's bytes, see BluePrintChecker.scan_blocks
+
+    :param contents: the blueprint xml, as bytes or an mmap
+    :return: dict, or None if the blueprint has to be parsed
+    """
+    if any(contents.find(marker) != -1 for marker in UNSPLITTABLE) or contents[:2] in (b"\xff\xfe", b"\xfe\xff"):
+        return None
+
+    head = contents[:200]
+    declaration = ENCODING_PATTERN.match(head[3:] if head.startswith(b"\xef\xbb\xbf") else head)
+    if declaration is not None and declaration.group(1).lower() not in (b"utf-8", b"utf8", b"us-ascii", b"ascii"):
+        return None
+
+    used_blocks = {}
+    found = 0
+    for name_match in BLOCK_NAME_PATTERN.finditer(contents):
+        sub_type_name = name_match.group(1)
+        # empty names need the block's type, and entities need unescaping, the parser does both
+        if not sub_type_name or b"&" in sub_type_name or b"\r" in sub_type_name:
+            return None
+
+        found += 1
+        used_blocks[sub_type_name] = used_blocks.get(sub_type_name, 0) + 1
+
+    # a block the name search skipped, e.g. one with its SubtypeName further down, would go uncounted
+    if found != sum(1 for _ in BLOCK_START_PATTERN.finditer(contents)):
+        return None
+
+    try:
+        return {sub_type_name.decode("utf-8"): b_quantity for sub_type_name, b_quantity in used_blocks.items()}
+    except UnicodeDecodeError:
+        return None
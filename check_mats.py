@@ -1,55 +1,512 @@
 import argparse
+import glob
+import json
+import math
 import os.path
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from tempfile import TemporaryDirectory
 
 import yaml
 from logbook import Logger, NestedSetup, StreamHandler, TimedRotatingFileHandler
 
-from bp_checker import BluePrintChecker
+from bp_checker import BLUEPRINT_MODES, BluePrintChecker
+from definition_cache import DefinitionCache
+from definition_snapshot import DefinitionSnapshot, write_snapshot
+from discovery import find_recipe_files
+from mod_archive import ARCHIVE_EXTENSION
+from mod_index import ModIndex
+from mod_list import mod_load_order, read_mod_list
+from mod_profile import profile_mods, write_profile
+from production import ProductionPlanner, machines_from_config
+from recipe_graph import RecipeGraph
 from scraper import Scraper
+from stats import NO_STATS, Stats, source_size
+from world_scanner import WorldScanner
 
 
 my_log = Logger(__name__)
 
 
-def check_mats(**kwargs) -> dict:
-    scraper = Scraper()
-    scraper.load_blocks(os.path.join(kwargs["config"]["se_path"], "Data", "CubeBlocks"))
+def load_config(config_file: str = None) -> dict:
+    """
+    Load the yaml config
+
+    :param config_file: path to a yaml config, config.yaml if not given
+    :return: dict
+    """
+    if not config_file:
+        config_file = "config.yaml"
+
+    with open(config_file, "r") as config_yaml:
+        return yaml.safe_load(config_yaml.read())
+
+
+def log_setup(config: dict) -> NestedSetup:
+    """
+    Set up the log handlers named in the config
+
+    :param config: the loaded config
+    :return: NestedSetup
+    """
+    log_handlers = []
+    if "handlers" in config["logger"].keys():
+        for handler, options in config["logger"]["handlers"].items():
+            if handler == "stream":
+                log_handlers.append(StreamHandler(sys.stdout, **options))
+            if handler == "timed_rotating_file":
+                log_handlers.append(TimedRotatingFileHandler(os.path.abspath("log/bulk-add-role-groups"), **options))
+
+    if log_handlers is None:
+        my_log.error("No log handlers configured")
+        quit()
+
+    return NestedSetup(log_handlers)
+
+
+def load_scraper(**kwargs) -> Scraper:
+    """
+    Load the block and recipe definitions named in the config
+
+    :return: Scraper
+    """
+    cache = None
+    # profiling times every file's parse, so nothing can come from the cache
+    if kwargs["config"].get("cache_path") and not kwargs.get("profile_mods"):
+        cache = DefinitionCache(kwargs["config"]["cache_path"])
+        cache.load()
+
+    stats = Stats() if kwargs.get("stats") or kwargs.get("profile_mods") else None
+    scraper = Scraper(cache, kwargs["config"].get("compact_definitions", False), stats,
+                      kwargs["config"].get("discover_definitions", False))
+    scraper.load_block_dirs(cube_blocks_paths(**kwargs), kwargs.get("workers", 1))
+    scraper.load_recipes(recipes_file(**kwargs))
+
+    if cache is not None:
+        my_log.info(f"Definition cache hits: {cache.hits}, misses: {cache.misses}")
+        cache.prune()
+        cache.save()
+
+    if kwargs.get("stats"):
+        stats.emit(my_log, "Definition loading")
+
+    if kwargs.get("profile_mods"):
+        write_profile(profile_mods(scraper), kwargs["profile_mods"])
+
+    return scraper
+
+
+def cube_blocks_paths(**kwargs) -> list:
+    """
+    The CubeBlocks directories to load, vanilla first and then every mod if modded blocks are on
+
+    With a mod_list, from the command line or the config, only the mods it lists are loaded, in the game's load
+    order. Pass mod_ids to only load those mods. Local mods are loaded from local_mods_path in the config, if set.
+
+    :return: list
+    """
+    paths = [os.path.join(kwargs["config"]["se_path"], "Data", "CubeBlocks")]
 
     if kwargs["modded_blocks"]:
-        modded_dirs = next(os.walk(kwargs["config"]["mods_path"]))[1]
-        for mod in modded_dirs:
-            scraper.load_blocks(os.path.join(kwargs["config"]["mods_path"], mod, "Data", "CubeBlocks"))
+        mods_path = kwargs["config"]["mods_path"]
+        local_mods_path = kwargs["config"].get("local_mods_path")
+        mod_list_file = kwargs.get("mod_list") or kwargs["config"].get("mod_list")
+        if mod_list_file:
+            mod_paths = mod_load_order(mods_path, read_mod_list(mod_list_file), local_mods_path)
+        else:
+            mod_paths = []
+            for path in [mods_path, local_mods_path] if local_mods_path else [mods_path]:
+                _, modded_dirs, mod_files = next(os.walk(path), (path, [], []))
+                # zipped mods are read from their archives, as if they were extracted next to them
+                zipped = [file.removesuffix(ARCHIVE_EXTENSION) for file in mod_files
+                          if file.endswith(ARCHIVE_EXTENSION)]
+                modded_dirs += [mod for mod in zipped if mod not in modded_dirs]
+                mod_paths += [os.path.join(path, mod) for mod in modded_dirs]
+        if kwargs.get("mod_ids") is not None:
+            mod_paths = [mod_path for mod_path in mod_paths if os.path.basename(mod_path) in kwargs["mod_ids"]]
+        for mod_path in mod_paths:
+            paths.append(os.path.join(mod_path, "Data", "CubeBlocks"))
+
+    return paths
+
 
-    scraper.load_recipes(os.path.join(kwargs["config"]["se_path"], "Data", "Blueprints.sbc"))
+def recipes_file(**kwargs) -> str:
+    """
+    The recipes blueprint file to load
+
+    :return: str
+    """
+    return os.path.join(kwargs["config"]["se_path"], "Data", "Blueprints.sbc")
+
+
+def load_recipe_graph(**kwargs) -> RecipeGraph:
+    """
+    Load every blueprint, vanilla and from mods if modded blocks are on, into a recipe graph
+
+    :return: RecipeGraph
+    """
+    cache = None
+    if kwargs["config"].get("cache_path"):
+        cache = DefinitionCache(kwargs["config"]["cache_path"])
+        cache.load()
+
+    recipe_graph = RecipeGraph(kwargs["config"].get("preferred_recipes"))
+    recipe_graph.load_file(recipes_file(**kwargs), cache)
+    for cube_blocks_path in cube_blocks_paths(**kwargs)[1:]:
+        for mod_recipes_file in find_recipe_files(os.path.dirname(cube_blocks_path),
+                                                  kwargs["config"].get("discover_definitions", False), cache):
+            recipe_graph.load_file(mod_recipes_file, cache)
+    recipe_graph.build()
+
+    if cache is not None:
+        cache.save()
 
+    return recipe_graph
+
+
+def check_mats(**kwargs) -> dict:
     bp_file = "blueprints/bp.sbc"
     if "file" in kwargs.keys():
         bp_file = kwargs["file"]
 
-    bpc = BluePrintChecker(scraper.all_blocks, scraper.all_recipes)
+    if kwargs.get("modded_blocks") and kwargs.get("referenced_mods"):
+        mod_ids = BluePrintChecker.referenced_mods(bp_file)
+        if mod_ids:
+            my_log.info(f"Loading only the mods the blueprint lists: {mod_ids}")
+            kwargs["mod_ids"] = mod_ids
+        else:
+            my_log.info("The blueprint doesn't list its mods, loading them all")
+
+    if kwargs.get("modded_blocks") and kwargs.get("lazy_mods"):
+        result = check_mats_lazy(bp_file, **kwargs)
+    else:
+        scraper = load_scraper(**kwargs)
+
+        bpc = BluePrintChecker(scraper.all_blocks, scraper.all_recipes, kwargs.get("stats", False))
+        result = bpc.check_blueprint(bp_file, kwargs.get("mode", "dom"), kwargs.get("grids", False),
+                                     kwargs.get("remaining", False))
+
+    if "stats" in result:
+        Stats.from_dict(result["stats"]).emit(my_log, f"Check of {bp_file}")
+
+    if kwargs.get("deep") or kwargs.get("plan"):
+        add_production(result, load_recipe_graph(**kwargs), **kwargs)
+
+    return result
+
+
+def add_production(result: dict, recipe_graph: RecipeGraph, **kwargs) -> None:
+    """
+    Add the raw estimate and the production plan, whichever were asked for, to a check's result
+
+    :param result: the check's result
+    :param recipe_graph: every blueprint loaded
+    :return: None
+    """
+    if kwargs.get("deep"):
+        result["raw_estimate"] = recipe_graph.expand_components(result["components"])
+
+    if kwargs.get("plan"):
+        machines = machines_from_config(kwargs["config"].get("factory", {"assemblers": 1, "refineries": 1}))
+        result["production"] = ProductionPlanner(recipe_graph, machines).plan(result["components"])
+
+
+def check_mats_lazy(bp_file: str, **kwargs) -> dict:
+    """
+    Check a blueprint against vanilla first, then load only the mods that define its blocks
+
+    Mods that redefine a vanilla block the blueprint uses are loaded too, so the result is the same as loading
+    every mod.
+
+    :param bp_file: path to an xml blueprint file
+    :return: dict, with a "stats" dict too if stats were asked for
+    """
+    if kwargs.get("grids") and kwargs.get("remaining"):
+        raise ValueError("A check can't have both a breakdown and the remaining cost")
+
+    stats = Stats() if kwargs.get("stats") else NO_STATS
+    with stats.stage("check_mats_lazy"):
+        scraper = load_scraper(**dict(kwargs, modded_blocks=False))
+        bpc = BluePrintChecker(scraper.all_blocks, scraper.all_recipes)
+        grids = None
+        if kwargs.get("grids"):
+            with stats.stage("count_grids"):
+                grids = bpc.count_grids(bp_file, kwargs.get("mode", "dom"))
+            blocks = {}
+            for grid in grids:
+                for block, b_quantity in grid["blocks"].items():
+                    blocks[block] = blocks.get(block, 0) + b_quantity
+        else:
+            blocks = bpc.count_blocks(bp_file, kwargs.get("mode", "dom"), stats)
+        unknown_blocks = [block for block in blocks if block not in scraper.all_blocks]
+
+        with stats.stage("load_mods"):
+            mod_index = ModIndex(scraper.cache, scraper.discover)
+            mod_index.build(cube_blocks_paths(**kwargs)[1:])
+            mod_paths = mod_index.mods_for(list(blocks))
+            my_log.info(f"Loading {len(mod_paths)} of {len(mod_index.cube_blocks_paths)} mods for "
+                        f"{len(unknown_blocks)} blocks vanilla doesn't have")
+
+            scraper.load_block_dirs(mod_paths, kwargs.get("workers", 1))
+            if scraper.cache is not None:
+                scraper.cache.save()
+        stats.count("mods_loaded", len(mod_paths))
+
+        bpc = BluePrintChecker(scraper.all_blocks, scraper.all_recipes, stats.enabled)
+        if kwargs.get("remaining"):
+            result = bpc.check_blueprint(bp_file, remaining=True)
+        elif grids is not None:
+            with stats.stage("check_grids"):
+                result = bpc.check_grids(grids)
+        else:
+            # the blueprint was only read once, check its counts against everything now loaded
+            result = bpc.check_counts(blocks, stats)
+
+    if not stats.enabled:
+        return result
+
+    if "stats" in result:
+        # the remaining cost reads the blueprint again and counts that itself
+        stats.merge(Stats.from_dict(result["stats"]))
+    else:
+        stats.count("files_parsed")
+        stats.count("bytes_parsed", source_size(bp_file))
+        stats.count("cube_blocks", sum(blocks.values()))
+        stats.count("block_types", len(blocks))
+        stats.count("unknown_blocks", len(result["unknown_blocks"]))
+    result["stats"] = stats.as_dict()
+
+    return result
+
+
+def check_mats_batch(**kwargs) -> dict:
+    """
+    Check every blueprint in a directory or glob, loading the definitions once
+
+    :return: dict summary of the run
+    """
+    scraper = load_scraper(**kwargs)
+    bpc = BluePrintChecker(scraper.all_blocks, scraper.all_recipes, kwargs.get("stats", False))
+    bpc.precompile()
+
+    bp_files = find_blueprints(kwargs["batch"])
+    my_log.info(f"Checking {len(bp_files)} blueprints")
+
+    output = kwargs.get("output")
+    with open(output, "w") if output else nullcontext(sys.stdout) as results_file:
+        return check_blueprints(bpc, bp_files, results_file, kwargs.get("mode", "dom"), kwargs.get("workers", 1),
+                                kwargs.get("grids", False))
+
+
+def check_mats_world(**kwargs) -> dict:
+    """
+    Cost every grid in a world save, writing one json line per grid as it goes and then one per owner
+
+    :return: dict of the world's totals and each owner's totals, see WorldScanner.scan
+    """
+    scraper = load_scraper(**kwargs)
+    scanner = WorldScanner(BluePrintChecker(scraper.all_blocks, scraper.all_recipes))
+
+    started = time.perf_counter()
+    output = kwargs.get("output")
+    with open(output, "w") if output else nullcontext(sys.stdout) as results_file:
+        totals = scanner.scan(kwargs["world"], kwargs.get("workers", 1),
+                              lambda grid_result: results_file.write(json.dumps({"grid": grid_result}) + "\n"))
+        for owner, owner_totals in totals["owners"].items():
+            results_file.write(json.dumps({"owner": owner, "result": owner_totals}) + "\n")
+        if not totals["complete"]:
+            results_file.write(json.dumps({"error": totals["error"]}) + "\n")
+
+    my_log.info(f"World summary: {totals['grids']} grids, {sum(totals['blocks'].values())} blocks, "
+                f"{len(totals['owners'])} owners in {time.perf_counter() - started:.1f}s"
+                f"{'' if totals['complete'] else ', incomplete'}")
+
+    return totals
+
+
+def find_blueprints(path: str) -> list:
+    """
+    Find the blueprints to check, every bp.sbc under a directory or every file matching a glob
+
+    :param path: a directory or a glob
+    :return: list
+    """
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "**", "bp.sbc"), recursive=True))
+
+    return sorted(glob.glob(path, recursive=True))
+
+
+def check_blueprints(bpc: BluePrintChecker, bp_files: list, results_file, mode: str = "dom",
+                     workers: int = 1, breakdown: bool = False) -> dict:
+    """
+    Check blueprints with a shared checker, writing one json line per blueprint
+
+    :param bpc: the checker to check the blueprints with
+    :param bp_files: paths to xml blueprint files
+    :param results_file: a text file to write the json lines to
+    :param mode: how to read the blueprints, see BluePrintChecker.check_blueprint
+    :param workers: number of processes to check blueprints with
+    :param breakdown: also give the totals for each grid and each grid size
+    :return: dict summary of the run
+    """
+    started = time.perf_counter()
+    latencies = []
+    failed = 0
+    stats = Stats()
+
+    snapshot_dir = None
+    if workers > 1 and len(bp_files) > 1:
+        # the workers all map one snapshot of the definitions, rather than each being sent a copy
+        snapshot_dir = TemporaryDirectory()
+        snapshot_file = os.path.join(snapshot_dir.name, "definitions.snapshot")
+        write_snapshot(snapshot_file, bpc.blocks, bpc.components, bpc.block_table)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_checker,
+                                       initargs=(snapshot_file, bpc.instrument))
+        chunk_size = max(1, len(bp_files) // (workers * 4))
+        checked = executor.map(_check_batch_blueprint, bp_files, [mode] * len(bp_files),
+                               [breakdown] * len(bp_files), chunksize=chunk_size)
+    else:
+        executor = None
+        checked = (_check_blueprint_timed(bpc, bp_file, mode, breakdown) for bp_file in bp_files)
+
+    try:
+        for checked_bp in checked:
+            latencies.append(checked_bp["seconds"])
+            if "error" in checked_bp:
+                failed += 1
+            elif "stats" in checked_bp["result"]:
+                stats.merge(Stats.from_dict(checked_bp["result"]["stats"]))
+            results_file.write(json.dumps(checked_bp) + "\n")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if snapshot_dir is not None:
+            snapshot_dir.cleanup()
+
+    latencies.sort()
+    summary = {
+        "blueprints": len(bp_files),
+        "failed": failed,
+        "wall_seconds": time.perf_counter() - started,
+        "latency_seconds": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "max": latencies[-1] if latencies else 0.0
+        }
+    }
+    if bpc.instrument:
+        summary["stats"] = stats.as_dict()
+    my_log.info(f"Batch summary: {summary}")
+
+    return summary
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """
+    Nearest rank percentile of some already sorted values
+
+    :param sorted_values: the values, sorted
+    :param fraction: which percentile, between 0 and 1
+    :return: float
+    """
+    if not sorted_values:
+        return 0.0
+
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+
+    return sorted_values[rank]
+
+
+_batch_checker = None
+
+
+def _init_batch_checker(snapshot_file: str, instrument: bool = False) -> None:
+    """
+    Give a batch worker process its own checker, reading the definitions from the shared snapshot
+
+    :return: None
+    """
+    global _batch_checker
+    _batch_checker = DefinitionSnapshot(snapshot_file).checker(instrument)
+
+
+def _check_batch_blueprint(bp_file: str, mode: str, breakdown: bool = False) -> dict:
+    """
+    Check a blueprint in a batch worker process
+
+    :return: dict
+    """
+    return _check_blueprint_timed(_batch_checker, bp_file, mode, breakdown)
+
+
+def _check_blueprint_timed(bpc: BluePrintChecker, bp_file: str, mode: str, breakdown: bool = False) -> dict:
+    """
+    Check a blueprint, recording how long it took and any error instead of stopping the batch
+
+    :return: dict
+    """
+    started = time.perf_counter()
+    try:
+        result = {"file": bp_file, "result": bpc.check_blueprint(bp_file, mode, breakdown)}
+    except Exception as error:
+        my_log.error(f"Could not check BP: {bp_file}: {error!r}")
+        result = {"file": bp_file, "error": repr(error)}
+    result["seconds"] = time.perf_counter() - started
 
-    return bpc.check_blueprint(bp_file)
+    return result
 
 
 if __name__ == "__main__":
     """       
-    usage: check_mats.py [-h] -f FILE [-c [CONFIG]] [-mb | --modded-blocks]
+    usage: check_mats.py [-h] (-f FILE | -b BATCH | --world WORLD) [-c [CONFIG]] [-mb | --modded-blocks]
+                         [-m {dom,stream,scan}] [-w WORKERS] [-o OUTPUT] [-s | --stats] [-p PROFILE_MODS]
+                         [-rm | --referenced-mods] [-lm | --lazy-mods] [-g | --grids] [-d | --deep]
+                         [-pl | --plan] [-r | --remaining] [-ml MOD_LIST]
     
     Determine the blocks that make up a blueprint
     
     options:
       -h, --help                      show this help message and exit
       -f FILE, --file FILE            a blueprint to check
+      -b BATCH, --batch BATCH         check every bp.sbc under a directory, or every file matching a glob
+      --world WORLD                   cost every grid in a world save, by grid and by owner
       -c [CONFIG], --config [CONFIG]  override config.yaml with another, better yaml file
       -mb, --modded-blocks            load modded blocks from mods path
+      -m {dom,stream,scan}, --mode {dom,stream,scan}
+                                      how to read the blueprint, stream keeps memory flat for huge blueprints,
+                                      scan searches the bytes for blocks and is fastest
+      -w WORKERS, --workers WORKERS   number of processes to scrape block files and check blueprints with
+      -o OUTPUT, --output OUTPUT      write batch or world results to this json lines file instead of stdout
+      -s, --stats                     time each stage of loading and checking, and log the stats
+      -p PROFILE_MODS, --profile-mods PROFILE_MODS
+                                      write a json report of each mod's load time and blocks, slowest first
+      -rm, --referenced-mods          with -mb, only load the mods the blueprint lists
+      -lm, --lazy-mods                with -mb, check against vanilla first and only load the mods that define
+                                      the blueprint's blocks
+      -g, --grids                     also give the totals for each grid and each grid size
+      -d, --deep                      also expand the components all the way down to ore
+      -pl, --plan                     also plan making the components on the config's factory
+      -r, --remaining                 also give what is left to build of partly built or damaged blocks
+      -ml MOD_LIST, --mod-list MOD_LIST
+                                      with -mb, only load the mods listed in a world's Sandbox.sbc or a modlist
+                                      file, in the game's load order
     """
     argp = argparse.ArgumentParser(prog="check_mats.py",
                                    description="Determine the blocks that make up a blueprint")
-    argp.add_argument("-f", "--file",
-                      help="a blueprint to check",
-                      type=str,
-                      required=True)
+    bp_group = argp.add_mutually_exclusive_group(required=True)
+    bp_group.add_argument("-f", "--file",
+                          help="a blueprint to check",
+                          type=str)
+    bp_group.add_argument("-b", "--batch",
+                          help="check every bp.sbc under a directory, or every file matching a glob",
+                          type=str)
+    bp_group.add_argument("--world",
+                          help="cost every grid in a world save, by grid and by owner",
+                          type=str)
     argp.add_argument("-c", "--config",
                       help="override config.yaml with another, better yaml file",
                       type=str,
@@ -58,32 +515,74 @@ if __name__ == "__main__":
                       help="load modded blocks from mods path",
                       action=argparse.BooleanOptionalAction,
                       default=False)
+    argp.add_argument("-m", "--mode",
+                      help="how to read the blueprint, stream keeps memory flat for huge blueprints, scan searches the "
+                           "bytes for blocks and is fastest",
+                      choices=BLUEPRINT_MODES,
+                      default="dom")
+    argp.add_argument("-w", "--workers",
+                      help="number of processes to scrape block files and check blueprints with",
+                      type=int,
+                      default=1)
+    argp.add_argument("-o", "--output",
+                      help="write batch or world results to this json lines file instead of stdout",
+                      type=str)
+    argp.add_argument("-s", "--stats",
+                      help="time each stage of loading and checking, and log the stats",
+                      action=argparse.BooleanOptionalAction,
+                      default=False)
+    argp.add_argument("-p", "--profile-mods",
+                      help="write a json report of each mod's load time and blocks, slowest first",
+                      type=str)
+    argp.add_argument("-rm", "--referenced-mods",
+                      help="with -mb, only load the mods the blueprint lists",
+                      action=argparse.BooleanOptionalAction,
+                      default=False)
+    argp.add_argument("-lm", "--lazy-mods",
+                      help="with -mb, check against vanilla first and only load the mods that define the "
+                           "blueprint's blocks",
+                      action=argparse.BooleanOptionalAction,
+                      default=False)
+    argp.add_argument("-g", "--grids",
+                      help="also give the totals for each grid and each grid size",
+                      action=argparse.BooleanOptionalAction,
+                      default=False)
+    argp.add_argument("-d", "--deep",
+                      help="also expand the components all the way down to ore",
+                      action=argparse.BooleanOptionalAction,
+                      default=False)
+    argp.add_argument("-pl", "--plan",
+                      help="also plan making the components on the config's factory",
+                      action=argparse.BooleanOptionalAction,
+                      default=False)
+    argp.add_argument("-r", "--remaining",
+                      help="also give what is left to build of partly built or damaged blocks",
+                      action=argparse.BooleanOptionalAction,
+                      default=False)
+    argp.add_argument("-ml", "--mod-list",
+                      help="with -mb, only load the mods listed in a world's Sandbox.sbc or a modlist file, in the "
+                           "game's load order",
+                      type=str)
     args = argp.parse_args()
 
-    if not args.config:
-        args.config = "config.yaml"
-
-    with open(args.config, "r") as config_yaml:
-        config = yaml.safe_load(config_yaml.read())
-        args.config = config
-
-    log_handlers = []
-    if "handlers" in config["logger"].keys():
-        for handler, options in config["logger"]["handlers"].items():
-            if handler == "stream":
-                log_handlers.append(StreamHandler(sys.stdout, **options))
-            if handler == "timed_rotating_file":
-                log_handlers.append(TimedRotatingFileHandler(os.path.abspath("log/bulk-add-role-groups"), **options))
-
-    if log_handlers is None:
-        my_log.error("No log handlers configured")
-        quit()
-
-    log_setup = NestedSetup(log_handlers)
+    config = load_config(args.config)
+    args.config = config
 
-    with log_setup:
+    with log_setup(config):
         my_log.info("Starting check_mats")
         my_log.info(f"With options: {vars(args)}")
         my_log.info(f"With config: {config}")
-        mats = check_mats(config=args.config, file=args.file, modded_blocks=args.modded_blocks)
-        print(mats)
+        if args.batch:
+            check_mats_batch(config=args.config, batch=args.batch, output=args.output,
+                             modded_blocks=args.modded_blocks, mode=args.mode, workers=args.workers,
+                             stats=args.stats, profile_mods=args.profile_mods, grids=args.grids,
+                             mod_list=args.mod_list)
+        elif args.world:
+            check_mats_world(config=args.config, world=args.world, output=args.output,
+                             modded_blocks=args.modded_blocks, workers=args.workers, mod_list=args.mod_list)
+        else:
+            mats = check_mats(config=args.config, file=args.file, modded_blocks=args.modded_blocks, mode=args.mode,
+                              workers=args.workers, stats=args.stats, profile_mods=args.profile_mods,
+                              referenced_mods=args.referenced_mods, lazy_mods=args.lazy_mods, grids=args.grids,
+                              deep=args.deep, plan=args.plan, remaining=args.remaining, mod_list=args.mod_list)
+            print(mats)
@@ -0,0 +1,158 @@
+import json
+import os.path
+
+from logbook import Logger
+
+from mod_archive import source_exists, source_stamp
+
+
+my_log = Logger(__name__)
+
+CACHE_VERSION = 1
+
+
+class DefinitionCache:
+    """
+    Caches scraped definitions on disk, keyed by the source file path, size and mtime, and CRC for files in archives
+    """
+    def __init__(self, cache_file: str) -> None:
+        """
+        Create a DefinitionCache class
+
+        :param cache_file: path to the json file the cache is kept in
+        :return: None
+        """
+        self.cache_file = cache_file
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+
+    def load(self) -> None:
+        """
+        Load the cache from disk, starting empty if it is missing or unreadable
+
+        :return: None
+        """
+        self.entries = {}
+        self.dirty = False
+
+        if not os.path.isfile(self.cache_file):
+            return None
+
+        try:
+            with open(self.cache_file, "r") as cache_json:
+                cached = json.load(cache_json)
+        except (OSError, ValueError):
+            my_log.warn(f"Ignoring unreadable definition cache: {self.cache_file}")
+            return None
+
+        if not isinstance(cached, dict) or cached.get("version") != CACHE_VERSION:
+            my_log.info(f"Ignoring outdated definition cache: {self.cache_file}")
+            return None
+
+        self.entries = cached["entries"]
+
+    def save(self) -> None:
+        """
+        Write the cache to disk if anything changed since it was loaded
+
+        :return: None
+        """
+        if not self.dirty:
+            return None
+
+        cache_dir = os.path.dirname(self.cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        # write to a temporary file first so a killed run can't leave half a cache behind
+        temp_file = f"{self.cache_file}.tmp"
+        with open(temp_file, "w") as cache_json:
+            json.dump({"version": CACHE_VERSION, "entries": self.entries}, cache_json, default=self.as_json)
+        os.replace(temp_file, self.cache_file)
+
+        self.dirty = False
+
+    def get(self, kind: str, source_file: str) -> dict:
+        """
+        Get the cached definitions for a source file, if the file hasn't changed
+
+        :param kind: the kind of definitions, e.g. "blocks" or "recipes"
+        :param source_file: path to the file the definitions were scraped from
+        :return: dict, or None when there is no valid entry
+        """
+        entry = self.entries.get(kind, {}).get(os.path.abspath(source_file))
+
+        if entry is None or entry["stamp"] != self.stamp(source_file):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry["definitions"]
+
+    def put(self, kind: str, source_file: str, definitions: dict) -> None:
+        """
+        Store the definitions scraped from a source file
+
+        :param kind: the kind of definitions, e.g. "blocks" or "recipes"
+        :param source_file: path to the file the definitions were scraped from
+        :param definitions: the scraped definitions
+        :return: None
+        """
+        self.entries.setdefault(kind, {})[os.path.abspath(source_file)] = {
+            "stamp": self.stamp(source_file),
+            "definitions": definitions
+        }
+        self.dirty = True
+
+    def swap(self, kind: str, source_file: str, definitions: dict) -> None:
+        """
+        Swap in an equivalent form of a file's cached definitions, such as compact ones, so they aren't held twice
+
+        :param kind: the kind of definitions, e.g. "blocks" or "recipes"
+        :param source_file: path to the file the definitions were scraped from
+        :param definitions: definitions equal to the ones already cached
+        :return: None
+        """
+        entry = self.entries.get(kind, {}).get(os.path.abspath(source_file))
+
+        if entry is not None:
+            entry["definitions"] = definitions
+
+    def prune(self) -> None:
+        """
+        Drop entries for source files, or files in archives, that no longer exist
+
+        :return: None
+        """
+        for kind_entries in self.entries.values():
+            for source_file in list(kind_entries.keys()):
+                if not source_exists(source_file):
+                    del kind_entries[source_file]
+                    self.dirty = True
+
+    @staticmethod
+    def as_json(definition) -> dict:
+        """
+        Turn a definition json doesn't know about, such as a CompactBlock, into a dict
+
+        :param definition: anything with an as_dict method
+        :return: dict
+        """
+        if not hasattr(definition, "as_dict"):
+            raise TypeError(f"Can't cache {type(definition).__name__}")
+
+        return definition.as_dict()
+
+    @staticmethod
+    def stamp(source_file: str) -> list:
+        """
+        Get the size and mtime of a file, used to spot files that have changed
+
+        A file inside an archive gets the archive's size and mtime, and its own CRC.
+
+        :param source_file: path to a file, or a file inside an archive
+        :return: list
+        """
+        return source_stamp(source_file)
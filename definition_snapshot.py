@@ -0,0 +1,513 @@
+import math
+import mmap
+import os
+import os.path
+import struct
+from collections.abc import ItemsView, Mapping, ValuesView
+
+from logbook import Logger
+
+from bp_checker import BluePrintChecker
+
+
+my_log = Logger(__name__)
+
+MAGIC = b"SEDS"
+SNAPSHOT_VERSION = 1
+# magic, version, string count, block count, block slots, recipe count, recipe slots, then where each section starts
+HEADER = struct.Struct("<4sIIIIII7Q")
+STRING_OFFSET = struct.Struct("<I")
+SLOT = struct.Struct("<I")  # record index + 1, 0 for an empty slot
+# sub_type_id, type_id, display_name, components start and count, materials start and count
+BLOCK_RECORD = struct.Struct("<IIIIIII")
+# output_type_id, materials start and count, output_quantity
+RECIPE_RECORD = struct.Struct("<IIId")
+PAIR = struct.Struct("<Id")  # name, quantity
+NO_STRING = 0xFFFFFFFF
+NO_QUANTITY = math.nan
+FNV_OFFSET = 0x811c9dc5
+FNV_PRIME = 0x01000193
+# the most decoded strings a snapshot keeps, so a long running worker doesn't end up with every string decoded
+STRING_CACHE_SIZE = 4096
+
+
+class DefinitionSnapshot:
+    """
+    Block and recipe definitions read straight out of a memory mapped snapshot file
+
+    Every process that opens the same snapshot shares the one copy the OS has of it, nothing is read until it is
+    looked up. See write_snapshot for the layout.
+    """
+    def __init__(self, snapshot_file: str) -> None:
+        """
+        Create a DefinitionSnapshot class
+
+        :param snapshot_file: path to a file from write_snapshot
+        :return: None
+        :raises ValueError: if the file isn't a snapshot this version can read
+        """
+        self.snapshot_file = snapshot_file
+        with open(snapshot_file, "rb") as snapshot:
+            self.data = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.data) < HEADER.size:
+            self.close()
+            raise ValueError(f"Not a definition snapshot: {snapshot_file}")
+        (magic, version, self.string_count, block_count, block_slots, recipe_count, recipe_slots,
+         self.string_offsets, self.string_data, block_slots_at, block_records_at, recipe_slots_at,
+         recipe_records_at, self.pairs_at) = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"Not a definition snapshot this version can read: {snapshot_file}")
+
+        self.strings = {}  # recently decoded strings, by index, at most STRING_CACHE_SIZE of them
+        self.blocks = SnapshotTable(self, block_count, block_slots, block_slots_at, block_records_at, BLOCK_RECORD,
+                                    SnapshotBlock)
+        self.recipes = SnapshotTable(self, recipe_count, recipe_slots, recipe_slots_at, recipe_records_at,
+                                     RECIPE_RECORD, SnapshotRecipe)
+        self.block_table = SnapshotTable(self, block_count, block_slots, block_slots_at, block_records_at,
+                                         BLOCK_RECORD, snapshot_costs)
+
+    def checker(self, instrument: bool = False) -> BluePrintChecker:
+        """
+        A checker using the snapshot's definitions and the costs precompiled into it
+
+        :param instrument: time each stage of a check and add the stats to the result
+        :return: BluePrintChecker
+        """
+        checker = BluePrintChecker(self.blocks, self.recipes, instrument)
+        checker.block_table = self.block_table
+
+        return checker
+
+    def string(self, index: int) -> str:
+        """
+        A string from the string table
+
+        :param index: the string's index, or NO_STRING
+        :return: str, None for NO_STRING
+        """
+        if index == NO_STRING:
+            return None
+
+        string = self.strings.get(index)
+        if string is None:
+            string = self.string_bytes(index).decode("utf-8")
+            if len(self.strings) >= STRING_CACHE_SIZE:
+                # dicts keep their order, so this drops the string decoded longest ago
+                del self.strings[next(iter(self.strings))]
+            self.strings[index] = string
+
+        return string
+
+    def string_bytes(self, index: int) -> bytes:
+        """
+        A string from the string table, still encoded, for comparing keys without decoding them
+
+        :param index: the string's index
+        :return: bytes
+        """
+        start, end = struct.unpack_from("<II", self.data, self.string_offsets + index * STRING_OFFSET.size)
+
+        return self.data[self.string_data + start:self.string_data + end]
+
+    def pairs(self, start: int, count: int) -> tuple:
+        """
+        Names and quantities from the pairs section
+
+        :param start: the first pair's index
+        :param count: how many pairs
+        :return: tuple of (name, quantity) tuples
+        """
+        return tuple((self.string(name), quantity)
+                     for name, quantity in PAIR.iter_unpack(self.data[self.pairs_at + start * PAIR.size:
+                                                                      self.pairs_at + (start + count) * PAIR.size]))
+
+    def quantities(self, start: int, count: int, whole: bool = False) -> "SnapshotQuantities":
+        """
+        Names and quantities from the pairs section, read from the snapshot as they are looked up
+
+        :param start: the first pair's index
+        :param count: how many pairs
+        :param whole: the quantities are counts, give them as ints
+        :return: SnapshotQuantities
+        """
+        return SnapshotQuantities(self, start, count, whole)
+
+    def close(self) -> None:
+        """
+        Unmap the snapshot, nothing read from it can be used after this
+
+        :return: None
+        """
+        self.data.close()
+
+
+class SnapshotTable(Mapping):
+    """
+    The blocks or recipes in a snapshot, looked up by name through the snapshot's hash table
+    """
+    def __init__(self, snapshot: DefinitionSnapshot, count: int, slots: int, slots_at: int, records_at: int,
+                 record: struct.Struct, make) -> None:
+        """
+        Create a SnapshotTable class
+
+        :param snapshot: the snapshot the table is in
+        :param count: number of records
+        :param slots: number of hash slots, a power of two
+        :param slots_at: where the hash slots start
+        :param records_at: where the records start
+        :param record: the layout of a record, the first field is always the name
+        :param make: called with the snapshot, the name and the record's other fields to make each value
+        :return: None
+        """
+        self.snapshot = snapshot
+        self.count = count
+        self.slots = slots
+        self.slots_at = slots_at
+        self.records_at = records_at
+        self.record = record
+        self.make = make
+        # names already found to their record's index, there are at most count of them and each process has its own
+        self.indexes = {}
+
+    def find(self, key: str) -> int:
+        """
+        Find a record by name, following the slots on from where its hash lands
+
+        :param key: the name
+        :return: int, the record's index, or -1 if it isn't there
+        """
+        if not self.slots or not isinstance(key, str):
+            return -1
+        index = self.indexes.get(key)
+        if index is not None:
+            return index
+
+        encoded = key.encode("utf-8")
+        mask = self.slots - 1
+        slot = fnv1a(encoded) & mask
+        while True:
+            entry = SLOT.unpack_from(self.snapshot.data, self.slots_at + slot * SLOT.size)[0]
+            if entry == 0:
+                return -1
+
+            name = SLOT.unpack_from(self.snapshot.data, self.records_at + (entry - 1) * self.record.size)[0]
+            if self.snapshot.string_bytes(name) == encoded:
+                self.indexes[key] = entry - 1
+                return entry - 1
+
+            slot = (slot + 1) & mask
+
+    def __getitem__(self, key: str):
+        index = self.find(key)
+        if index == -1:
+            raise KeyError(key)
+
+        fields = self.record.unpack_from(self.snapshot.data, self.records_at + index * self.record.size)
+        return self.make(self.snapshot, key, *fields[1:])
+
+    def __contains__(self, key) -> bool:
+        return self.find(key) != -1
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.snapshot.string(
+                SLOT.unpack_from(self.snapshot.data, self.records_at + index * self.record.size)[0])
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class SnapshotBlock(Mapping):
+    """
+    A block read out of a snapshot, it can be read like the dict from Block.as_dict
+    """
+    __slots__ = ("type_id", "sub_type_id", "display_name", "components")
+
+    def __init__(self, snapshot: DefinitionSnapshot, sub_type_id: str, type_id: int, display_name: int,
+                 components_start: int, components_count: int, materials_start: int, materials_count: int) -> None:
+        """
+        Create a SnapshotBlock class
+
+        :return: None
+        """
+        self.type_id = snapshot.string(type_id)
+        self.sub_type_id = sub_type_id
+        self.display_name = snapshot.string(display_name)
+        self.components = snapshot.quantities(components_start, components_count, True)
+
+    def as_dict(self) -> dict:
+        """
+        Output a block as a dict
+
+        :return: dict
+        """
+        return {"type_id": self.type_id,
+                "sub_type_id": self.sub_type_id,
+                "display_name": self.display_name,
+                "components": dict(self.components)}
+
+    def __getitem__(self, key: str):
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+
+class SnapshotRecipe(Mapping):
+    """
+    A recipe read out of a snapshot, it can be read like the dict from Recipe.as_dict
+    """
+    __slots__ = ("materials", "output_type_id", "output_quantity")
+
+    def __init__(self, snapshot: DefinitionSnapshot, output_type_id: str, materials_start: int,
+                 materials_count: int, output_quantity: float) -> None:
+        """
+        Create a SnapshotRecipe class
+
+        :return: None
+        """
+        self.materials = snapshot.quantities(materials_start, materials_count)
+        self.output_type_id = output_type_id  # recipes are keyed by what they make
+        self.output_quantity = None if math.isnan(output_quantity) else output_quantity
+
+    def as_dict(self) -> dict:
+        """
+        Output a recipe as a dict
+
+        :return: dict
+        """
+        return {
+            "materials": dict(self.materials),
+            "output_type_id": self.output_type_id,
+            "output_quantity": self.output_quantity
+        }
+
+    def __getitem__(self, key: str):
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+
+class SnapshotQuantities(Mapping):
+    """
+    A read only view of some pairs in a snapshot, it can be read like a dict of quantities without building one
+    """
+    __slots__ = ("snapshot", "start", "count", "whole")
+
+    def __init__(self, snapshot: DefinitionSnapshot, start: int, count: int, whole: bool = False) -> None:
+        """
+        Create a SnapshotQuantities class
+
+        :param snapshot: the snapshot the pairs are in
+        :param start: the first pair's index
+        :param count: how many pairs
+        :param whole: the quantities are counts, give them as ints
+        :return: None
+        """
+        self.snapshot = snapshot
+        self.start = start
+        self.count = count
+        self.whole = whole
+
+    def pairs(self):
+        """
+        The names and quantities, unpacked from the snapshot one at a time
+
+        :return: generator of (name, quantity) tuples
+        """
+        data = self.snapshot.data
+        position = self.snapshot.pairs_at + self.start * PAIR.size
+        for _ in range(self.count):
+            name, quantity = PAIR.unpack_from(data, position)
+            position += PAIR.size
+            yield self.snapshot.string(name), int(quantity) if self.whole else quantity
+
+    def __getitem__(self, key: str):
+        # a block has a handful of components, looking through them is quicker than hashing into a dict
+        for name, quantity in self.pairs():
+            if name == key:
+                return quantity
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (name for name, _ in self.pairs())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def items(self) -> ItemsView:
+        return SnapshotItems(self)
+
+    def values(self) -> ValuesView:
+        return SnapshotValues(self)
+
+
+class SnapshotItems(ItemsView):
+    """
+    The items of a SnapshotQuantities, read straight from the snapshot
+    """
+    __slots__ = ()
+
+    def __iter__(self):
+        return self._mapping.pairs()
+
+
+class SnapshotValues(ValuesView):
+    """
+    The values of a SnapshotQuantities, read straight from the snapshot
+    """
+    __slots__ = ()
+
+    def __iter__(self):
+        return (quantity for _, quantity in self._mapping.pairs())
+
+
+def snapshot_costs(snapshot: DefinitionSnapshot, sub_type_id: str, type_id: int, display_name: int,
+                   components_start: int, components_count: int, materials_start: int,
+                   materials_count: int) -> tuple:
+    """
+    A block's precompiled costs, as BluePrintChecker.precompile has them
+
+    :return: tuple of the components and the materials, each a tuple of (name, quantity)
+    """
+    components = tuple((component, int(c_quantity))
+                       for component, c_quantity in snapshot.pairs(components_start, components_count))
+
+    return components, snapshot.pairs(materials_start, materials_count)
+
+
+def write_snapshot(snapshot_file: str, blocks: Mapping, recipes: Mapping, block_table: dict = None) -> None:
+    """
+    Write definitions to a snapshot file for DefinitionSnapshot to map
+
+    After the header there is a string table of offsets into one block of utf-8, then for blocks and for recipes a
+    table of hash slots and a table of fixed size records, then every component and material list as one array of
+    (name, quantity) pairs the records point into. Names are found by the FNV-1a hash of their utf-8, with linear
+    probing. Each block's costs are precompiled into it too.
+
+    :param snapshot_file: path to write to, it is replaced in one go
+    :param blocks: the blocks, as dicts or anything that reads like them
+    :param recipes: the recipes, likewise
+    :param block_table: the costs from BluePrintChecker.precompile, if they have already been worked out
+    :return: None
+    """
+    if block_table is None:
+        checker = BluePrintChecker(blocks, recipes)
+        checker.precompile()
+        block_table = checker.block_table
+
+    strings = {}
+
+    def string(value: str) -> int:
+        if value is None:
+            return NO_STRING
+        return strings.setdefault(value, len(strings))
+
+    pairs = []
+
+    def add_pairs(quantities) -> tuple:
+        start = len(pairs)
+        pairs.extend((string(name), float(quantity)) for name, quantity in quantities)
+        return start, len(pairs) - start
+
+    block_records = []
+    for sub_type_id, block in blocks.items():
+        components, materials = block_table[sub_type_id]
+        block_records.append((string(sub_type_id), string(block.get("type_id")), string(block.get("display_name")),
+                              *add_pairs(components), *add_pairs(materials)))
+    recipe_records = []
+    for output_type_id, recipe in recipes.items():
+        output_quantity = recipe.get("output_quantity")
+        recipe_records.append((string(output_type_id), *add_pairs(recipe["materials"].items()),
+                               NO_QUANTITY if output_quantity is None else float(output_quantity)))
+
+    string_offsets = bytearray()
+    string_data = bytearray()
+    for value in strings:
+        string_offsets += STRING_OFFSET.pack(len(string_data))
+        string_data += value.encode("utf-8")
+    string_offsets += STRING_OFFSET.pack(len(string_data))
+
+    names = list(strings)
+    block_slots = hash_slots([names[record[0]] for record in block_records])
+    recipe_slots = hash_slots([names[record[0]] for record in recipe_records])
+    sections = [bytes(string_offsets),
+                bytes(string_data),
+                b"".join(SLOT.pack(entry) for entry in block_slots),
+                b"".join(BLOCK_RECORD.pack(*record) for record in block_records),
+                b"".join(SLOT.pack(entry) for entry in recipe_slots),
+                b"".join(RECIPE_RECORD.pack(*record) for record in recipe_records),
+                b"".join(PAIR.pack(*pair) for pair in pairs)]
+
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        # sections start on 8 bytes, so the pairs' doubles are aligned
+        position += -position % 8
+        offsets.append(position)
+        position += len(section)
+
+    snapshot_dir = os.path.dirname(snapshot_file)
+    if snapshot_dir:
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    # write to a temporary file first so a worker can never map half a snapshot
+    temp_file = f"{snapshot_file}.tmp"
+    with open(temp_file, "wb") as snapshot:
+        snapshot.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(strings), len(block_records), len(block_slots),
+                                   len(recipe_records), len(recipe_slots), *offsets))
+        for offset, section in zip(offsets, sections):
+            snapshot.write(b"\0" * (offset - snapshot.tell()))
+            snapshot.write(section)
+    os.replace(temp_file, snapshot_file)
+
+    my_log.info(f"Wrote a snapshot of {len(block_records)} blocks and {len(recipe_records)} recipes to "
+                f"{snapshot_file}, {position} bytes")
+
+
+def hash_slots(names: list) -> list:
+    """
+    Lay out the hash slots for some names, at most half full so lookups stay short
+
+    :param names: the names, in record order
+    :return: list of record index + 1 for each slot, 0 for empty slots
+    """
+    slots = 1
+    while slots < len(names) * 2:
+        slots *= 2
+    table = [0] * slots if names else []
+
+    for index, name in enumerate(names):
+        slot = fnv1a(name.encode("utf-8")) & (slots - 1)
+        while table[slot]:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = index + 1
+
+    return table
+
+
+def fnv1a(data: bytes) -> int:
+    """
+    The 32 bit FNV-1a hash of some bytes
+
+    :param data: the bytes
+    :return: int
+    """
+    hashed = FNV_OFFSET
+    for byte in data:
+        hashed = ((hashed ^ byte) * FNV_PRIME) & 0xFFFFFFFF
+
+    return hashed
@@ -0,0 +1,169 @@
+import mmap
+import os
+import os.path
+import re
+
+from logbook import Logger
+
+from definition_cache import DefinitionCache
+from mod_archive import ARCHIVE_ERRORS, archive_for, list_members, open_source, source_exists, split_member
+
+
+my_log = Logger(__name__)
+
+SECTIONS = ("CubeBlocks", "Blueprints")
+SECTION_PATTERN = re.compile(rb"<(CubeBlocks|Blueprints)[\s>]")
+CHUNK_BYTES = 1 << 20
+
+
+def find_block_files(cube_blocks_path: str, discover: bool = False, cache: DefinitionCache = None) -> list:
+    """
+    The block files a CubeBlocks directory is loaded from, out of its mod's archive if the mod is zipped
+
+    :param cube_blocks_path: path to a CubeBlocks directory
+    :param discover: every block file in the CubeBlocks directory's Data directory instead, see discover_files
+    :param cache: an optional cache to keep each file's sections in, between runs
+    :return: list, or None if neither the directory nor an archive of its mod is there
+    """
+    data_path = os.path.dirname(cube_blocks_path)
+    if os.path.isdir(data_path if discover else cube_blocks_path):
+        if discover:
+            return discover_files(data_path, "CubeBlocks", cache)
+
+        # sorted so the override order doesn't depend on the file system
+        return [os.path.join(cube_blocks_path, file) for file in sorted(os.listdir(cube_blocks_path))
+                if file.endswith(".sbc")]
+
+    archive = archive_for(os.path.dirname(data_path))
+    if archive is None:
+        return None
+
+    if discover:
+        return [source_file for source_file in list_members(archive, "Data", recursive=True)
+                if "CubeBlocks" in file_sections(source_file, cache)]
+
+    return list_members(archive, "Data/CubeBlocks")
+
+
+def find_recipe_files(data_path: str, discover: bool = False, cache: DefinitionCache = None) -> list:
+    """
+    A mod's recipe files, out of its archive if the mod is zipped
+
+    :param data_path: path to a mod's Data directory
+    :param discover: every file with blueprints in the Data directory, see discover_files
+    :param cache: an optional cache to keep each file's sections in, between runs
+    :return: list
+    """
+    if os.path.isdir(data_path):
+        if discover:
+            return discover_files(data_path, "Blueprints", cache)
+        recipes_files = [os.path.join(data_path, "Blueprints.sbc")]
+    else:
+        archive = archive_for(os.path.dirname(data_path))
+        if archive is None:
+            return []
+        if discover:
+            return [source_file for source_file in list_members(archive, "Data", recursive=True)
+                    if "Blueprints" in file_sections(source_file, cache)]
+        # names in an archive are matched without case like windows does, as list_members does
+        recipes_files = [source_file for source_file in list_members(archive, "Data")
+                         if split_member(source_file)[1].lower() == "data/blueprints.sbc"]
+
+    return [recipes_file for recipes_file in recipes_files if source_exists(recipes_file)]
+
+
+def discover_files(data_path: str, section: str, cache: DefinitionCache = None) -> list:
+    """
+    Find every .sbc file under a Data directory, at any depth, that has a section of definitions in it
+
+    :param data_path: path to a Data directory
+    :param section: "CubeBlocks" or "Blueprints"
+    :param cache: an optional cache to keep each file's sections in, between runs
+    :return: list, sorted so the load order doesn't depend on the file system
+    """
+    found = []
+    for dir_path, dir_names, file_names in os.walk(data_path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".sbc"):
+                continue
+
+            source_file = os.path.join(dir_path, file_name)
+            if section in file_sections(source_file, cache):
+                found.append(source_file)
+
+    return found
+
+
+def file_sections(source_file: str, cache: DefinitionCache = None) -> list:
+    """
+    The sections of definitions a file has, from the cache if it hasn't changed
+
+    :param source_file: path to an .sbc file
+    :param cache: an optional cache of previously sniffed files
+    :return: list
+    """
+    sections = cache.get("sections", source_file) if cache is not None else None
+    if sections is None:
+        sections = sniff_sections(source_file)
+        if cache is not None:
+            cache.put("sections", source_file, sections)
+
+    return sections
+
+
+def sniff_sections(source_file: str) -> list:
+    """
+    Find which sections of definitions a file has with a byte search instead of parsing it
+
+    A section named in a comment is found too, that only means a file gets parsed that didn't need to be.
+
+    :param source_file: path to an .sbc file, or a file inside an archive
+    :return: list
+    """
+    if split_member(source_file) is not None:
+        return sniff_member_sections(source_file)
+
+    try:
+        with open(source_file, "rb") as sbc_file, \
+                mmap.mmap(sbc_file.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+            sections = set()
+            for match in SECTION_PATTERN.finditer(contents):
+                sections.add(match.group(1).decode())
+                if len(sections) == len(SECTIONS):
+                    break
+    except ValueError:  # an empty file can't be mapped, and has nothing in it anyway
+        return []
+    except OSError as error:
+        my_log.warn(f"Could not sniff {source_file}: {error!r}")
+        return []
+
+    return sorted(sections)
+
+
+def sniff_member_sections(source_file: str) -> list:
+    """
+    Find which sections of definitions a file inside an archive has, decompressing it a chunk at a time
+
+    :param source_file: a path to a file inside an archive
+    :return: list
+    """
+    sections = set()
+    tail = b""
+    try:
+        with open_source(source_file) as sbc_file:
+            while len(sections) < len(SECTIONS):
+                chunk = sbc_file.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+
+                # keep the end of the last chunk, a tag can be cut in two
+                contents = tail + chunk
+                for match in SECTION_PATTERN.finditer(contents):
+                    sections.add(match.group(1).decode())
+                tail = contents[-16:]
+    except (OSError, *ARCHIVE_ERRORS) as error:
+        my_log.warn(f"Could not sniff {source_file}: {error!r}")
+        return []
+
+    return sorted(sections)
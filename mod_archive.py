@@ -0,0 +1,194 @@
+import contextlib
+import os
+import os.path
+import zipfile
+import zlib
+
+from logbook import Logger
+
+
+my_log = Logger(__name__)
+
+ARCHIVE_EXTENSION = ".sbm"
+# a file inside an archive is named like C:/Mods/123.sbm::Data/CubeBlocks/Blocks.sbc
+MEMBER_SEPARATOR = "::"
+# what reading a damaged archive can raise, on top of OSError
+ARCHIVE_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError)
+
+_members = {}  # archive path to its stamp and members, so each archive's directory is only read once
+
+
+def archive_for(mod_path: str) -> str:
+    """
+    The zipped archive a mod is kept in, if it isn't extracted
+
+    A local mod can be zipped next to where its directory would be, a workshop item can be a directory with one
+    archive in it.
+
+    :param mod_path: path to a mod's directory, which may not exist
+    :return: str, or None if there isn't one
+    """
+    if os.path.isfile(f"{mod_path}{ARCHIVE_EXTENSION}"):
+        return f"{mod_path}{ARCHIVE_EXTENSION}"
+
+    if os.path.isdir(mod_path):
+        archives = sorted(file for file in os.listdir(mod_path) if file.lower().endswith(ARCHIVE_EXTENSION))
+        if archives:
+            return os.path.join(mod_path, archives[0])
+
+    return None
+
+
+def member_path(archive: str, member: str) -> str:
+    """
+    The path used for a file inside an archive, anywhere a file path is
+
+    :param archive: path to the archive
+    :param member: the file's name in the archive
+    :return: str
+    """
+    return f"{archive}{MEMBER_SEPARATOR}{member}"
+
+
+def split_member(source_file: str) -> tuple:
+    """
+    Split a path into the archive and the file inside it
+
+    :param source_file: a file path, or a path from member_path
+    :return: tuple of the archive and the member name, or None if it isn't in an archive
+    """
+    archive, separator, member = source_file.partition(MEMBER_SEPARATOR)
+    if not separator or not archive.lower().endswith(ARCHIVE_EXTENSION):
+        return None
+
+    # a path that went through normpath on windows has backslashes, names in an archive don't
+    return archive, member.replace("\\", "/")
+
+
+def archive_members(archive: str) -> dict:
+    """
+    The files in an archive, read from its directory again only when the archive changes
+
+    :param archive: path to the archive
+    :return: dict of member names to their ZipInfo, empty if the archive can't be read
+    """
+    stat = os.stat(archive)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _members.get(archive)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    try:
+        with zipfile.ZipFile(archive) as zip_file:
+            members = {info.filename.replace("\\", "/"): info for info in zip_file.infolist() if not info.is_dir()}
+    except (OSError, *ARCHIVE_ERRORS) as error:
+        my_log.warn(f"Could not read archive {archive}: {error!r}")
+        members = {}
+
+    _members[archive] = (stamp, members)
+
+    return members
+
+
+def list_members(archive: str, directory: str, recursive: bool = False) -> list:
+    """
+    The .sbc files in a directory of an archive, leaving out empty ones, without decompressing anything
+
+    :param archive: path to the archive
+    :param directory: the directory in the archive, e.g. "Data/CubeBlocks", matched without case like windows does
+    :param recursive: include files in its subdirectories too
+    :return: list of member paths, sorted so the load order doesn't depend on how the archive was made
+    """
+    prefix = f"{directory.strip('/').lower()}/"
+    found = []
+    for member, info in archive_members(archive).items():
+        if not member.lower().startswith(prefix) or not member.lower().endswith(".sbc") or info.file_size == 0:
+            continue
+        if not recursive and "/" in member[len(prefix):]:
+            continue
+
+        found.append(member)
+
+    return [member_path(archive, member) for member in sorted(found)]
+
+
+def member_info(source_file: str) -> zipfile.ZipInfo:
+    """
+    The ZipInfo of a file inside an archive
+
+    :param source_file: a path from member_path
+    :return: ZipInfo
+    :raises FileNotFoundError: if the archive or the file in it isn't there
+    """
+    archive, member = split_member(source_file)
+    info = archive_members(archive).get(member)
+    if info is None:
+        raise FileNotFoundError(f"No {member} in {archive}")
+
+    return info
+
+
+def source_exists(source_file: str) -> bool:
+    """
+    Whether a file, or a file inside an archive, is there
+
+    :param source_file: a file path, or a path from member_path
+    :return: bool
+    """
+    if split_member(source_file) is None:
+        return os.path.isfile(source_file)
+
+    try:
+        member_info(source_file)
+    except OSError:
+        return False
+
+    return True
+
+
+def source_stamp(source_file: str) -> list:
+    """
+    Get the size and mtime of a file, or for a file inside an archive the archive's and the file's CRC
+
+    :param source_file: a file path, or a path from member_path
+    :return: list
+    """
+    if split_member(source_file) is None:
+        stat = os.stat(source_file)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    archive = split_member(source_file)[0]
+    stat = os.stat(archive)
+
+    return [stat.st_size, stat.st_mtime_ns, member_info(source_file).CRC]
+
+
+def file_size(source_file: str) -> int:
+    """
+    The size of a file, uncompressed for a file inside an archive
+
+    :param source_file: a file path, or a path from member_path
+    :return: int
+    """
+    if split_member(source_file) is None:
+        return os.path.getsize(source_file)
+
+    return member_info(source_file).file_size
+
+
+@contextlib.contextmanager
+def open_source(source_file: str):
+    """
+    Open a file, or a file inside an archive, to read its bytes, an archived file is decompressed as it is read
+
+    :param source_file: a file path, or a path from member_path
+    :return: a binary file object
+    """
+    member = split_member(source_file)
+    if member is None:
+        with open(source_file, "rb") as sbc_file:
+            yield sbc_file
+        return
+
+    with zipfile.ZipFile(member[0]) as zip_file, zip_file.open(member_info(source_file)) as sbc_file:
+        yield sbc_file
@@ -0,0 +1,120 @@
+import os.path
+import re
+from xml.sax.saxutils import unescape
+
+from logbook import Logger
+
+from definition_cache import DefinitionCache
+from discovery import find_block_files
+from mod_archive import ARCHIVE_ERRORS, open_source
+
+
+my_log = Logger(__name__)
+
+# both ways a definition's id can be written, <Id><SubtypeId>X</SubtypeId></Id> and <Id Type="T" Subtype="X" />,
+# a definition with an empty <SubtypeId /> is keyed by its TypeId, like the Scraper does
+EMPTY_SUBTYPE = rb"(?:<SubtypeId\s*/>|<SubtypeId></SubtypeId>)"
+SUBTYPE_PATTERN = re.compile(rb"<SubtypeId>([^<]+)</SubtypeId>|<Id\b[^>]*?\bSubtype=\"([^\"]+)\"|"
+                             rb"<TypeId>([^<]+)</TypeId>\s*" + EMPTY_SUBTYPE + rb"|"
+                             + EMPTY_SUBTYPE + rb"\s*<TypeId>([^<]+)</TypeId>")
+
+
+class ModIndex:
+    """
+    Knows which mod directories define which block subtypes, without parsing any of them
+    """
+    def __init__(self, cache: DefinitionCache = None, discover: bool = False) -> None:
+        """
+        Create a ModIndex class
+
+        :param cache: an optional cache to keep each file's subtypes in, between runs
+        :param discover: index block files anywhere in each CubeBlocks directory's Data directory, like the Scraper
+        :return: None
+        """
+        self.cache = cache
+        self.discover = discover
+        self.cube_blocks_paths = []
+        self.sources = {}  # sub_type_id to the directories defining it, in load order
+
+    def build(self, cube_blocks_paths: list) -> None:
+        """
+        Index the subtypes defined in CubeBlocks directories, only scanning files that changed since they were cached
+
+        :param cube_blocks_paths: paths to CubeBlocks directories, in load order
+        :return: None
+        """
+        for cube_blocks_path in cube_blocks_paths:
+            cube_blocks_path = os.path.normpath(cube_blocks_path)
+            if cube_blocks_path in self.cube_blocks_paths:
+                continue
+
+            cube_blocks_files = find_block_files(cube_blocks_path, self.discover, self.cache)
+            if cube_blocks_files is None:
+                continue
+
+            self.cube_blocks_paths.append(cube_blocks_path)
+            for cube_blocks_file in cube_blocks_files:
+                for sub_type_id in self.file_subtypes(cube_blocks_file):
+                    sources = self.sources.setdefault(sub_type_id, [])
+                    if cube_blocks_path not in sources:
+                        sources.append(cube_blocks_path)
+
+    def file_subtypes(self, cube_blocks_file: str) -> list:
+        """
+        The subtypes a block file defines, from the cache if it hasn't changed
+
+        :param cube_blocks_file: path to an .sbc file
+        :return: list
+        """
+        sub_type_ids = None
+        if self.cache is not None:
+            sub_type_ids = self.cache.get("subtypes", cube_blocks_file)
+
+        if sub_type_ids is None:
+            sub_type_ids = scan_subtypes(cube_blocks_file)
+            if self.cache is not None:
+                self.cache.put("subtypes", cube_blocks_file, sub_type_ids)
+
+        return sub_type_ids
+
+    def mods_for(self, sub_type_ids: list) -> list:
+        """
+        The directories to load to get some subtypes, in load order
+
+        Every directory defining a subtype is included, so the one that would win with everything loaded still does.
+
+        :param sub_type_ids: the subtypes wanted
+        :return: list
+        """
+        wanted = set()
+        for sub_type_id in sub_type_ids:
+            wanted.update(self.sources.get(sub_type_id, []))
+
+        return [cube_blocks_path for cube_blocks_path in self.cube_blocks_paths if cube_blocks_path in wanted]
+
+
+def scan_subtypes(cube_blocks_file: str) -> list:
+    """
+    Find the subtypes a block file defines with a byte search instead of parsing it
+
+    This can find subtypes that aren't blocks, that only means a mod gets loaded that didn't need to be.
+
+    :param cube_blocks_file: path to an .sbc file
+    :return: list
+    """
+    try:
+        with open_source(cube_blocks_file) as sbc_file:
+            contents = sbc_file.read()
+    except (OSError, *ARCHIVE_ERRORS) as error:
+        my_log.warn(f"Could not index {cube_blocks_file}: {error!r}")
+        return []
+
+    sub_type_ids = []
+    seen = set()
+    for matches in SUBTYPE_PATTERN.findall(contents):
+        sub_type_id = unescape(b"".join(matches).decode("utf-8", "replace"), {"&quot;": '"'})
+        if sub_type_id not in seen:
+            seen.add(sub_type_id)
+            sub_type_ids.append(sub_type_id)
+
+    return sub_type_ids
@@ -0,0 +1,141 @@
+import os.path
+import re
+import xml.etree.ElementTree as ElementTree
+
+from logbook import Logger
+
+from mod_archive import archive_for
+
+
+my_log = Logger(__name__)
+
+# a workshop link, e.g. https://steamcommunity.com/sharedfiles/filedetails/?id=123456789
+WORKSHOP_URL_PATTERN = re.compile(r"[?&]id=(\d+)")
+
+
+def read_mod_list(mod_list_file: str) -> list:
+    """
+    Read a server's mods, in the order the game lists them, from a world's Sandbox.sbc or a modlist file
+
+    A modlist file has one mod per line, as a workshop id, a workshop link or a local mod's name, lines starting
+    with # are comments.
+
+    :param mod_list_file: path to a Sandbox.sbc, or any xml with a Mods list, or a modlist file
+    :return: list of mod directory names, the first has the highest priority
+    """
+    with open(mod_list_file, "rb") as list_file:
+        is_xml = list_file.read(64).lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"<")
+
+    mod_ids = read_mods_xml(mod_list_file) if is_xml else read_mods_text(mod_list_file)
+    my_log.info(f"{len(mod_ids)} mods listed in {mod_list_file}")
+
+    return mod_ids
+
+
+def read_mods_xml(mod_list_file: str) -> list:
+    """
+    Read the ModItems in an xml file's Mods list, stopping once it has been read
+
+    :param mod_list_file: path to a Sandbox.sbc or a blueprint
+    :return: list of mod directory names
+    """
+    mod_ids = []
+    parents = []
+    try:
+        for event, element in ElementTree.iterparse(mod_list_file, events=("start", "end")):
+            if event == "start":
+                parents.append(element)
+                continue
+
+            parents.pop()
+            if element.tag == "ModItem":
+                mod_id = mod_item_id(element)
+                if mod_id and mod_id not in mod_ids:
+                    mod_ids.append(mod_id)
+            elif element.tag == "Mods":
+                # a Sandbox.sbc has nothing else to do with mods, no need to read the rest
+                break
+            elif parents and parents[-1].tag == "ModItem":
+                continue
+
+            element.clear()
+            if parents:
+                parents[-1].remove(element)
+
+    except ElementTree.ParseError:
+        my_log.error(f"Could not read mods due to ParseError: {mod_list_file}")
+        return []
+
+    return mod_ids
+
+
+def read_mods_text(mod_list_file: str) -> list:
+    """
+    Read a modlist file, see read_mod_list
+
+    :param mod_list_file: path to a modlist file
+    :return: list of mod directory names
+    """
+    mod_ids = []
+    with open(mod_list_file, "r", encoding="utf-8-sig") as list_file:
+        for line in list_file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            url_match = WORKSHOP_URL_PATTERN.search(line)
+            mod_id = url_match.group(1) if url_match else line.removesuffix(".sbm")
+            if mod_id not in mod_ids:
+                mod_ids.append(mod_id)
+
+    return mod_ids
+
+
+def mod_item_id(mod_item: ElementTree) -> str:
+    """
+    The directory a ModItem's mod is in, its workshop id, or its Name for local mods
+
+    Only mods from the Steam workshop and local mods can be loaded, mods from other services are skipped.
+
+    :param mod_item: a ModItem element
+    :return: str, empty if it has neither or isn't from the Steam workshop
+    """
+    mod_id = mod_item.findtext("PublishedFileId") or mod_item.get("PublishedFileId")
+    if not mod_id or mod_id == "0":
+        # local mods have no workshop id, their Name is the directory name
+        mod_id = (mod_item.findtext("Name") or mod_item.get("Name") or "").removesuffix(".sbm")
+
+    service = mod_item.findtext("PublishedServiceName") or mod_item.get("PublishedServiceName") or "Steam"
+    if mod_id and service != "Steam":
+        my_log.warn(f"Skipped mod {mod_id} from {service}, only Steam workshop and local mods can be loaded")
+        return ""
+
+    return mod_id
+
+
+def mod_load_order(mods_path: str, mod_ids: list, local_mods_path: str = None) -> list:
+    """
+    The mod directories to load, in the order to load them in
+
+    The game gives the mod at the top of the list priority, and later directories win on a clash, so the list is
+    loaded bottom up. Workshop mods are in mods_path, local mods are listed by name and kept in local_mods_path,
+    without one they are looked for in mods_path too.
+
+    :param mods_path: the directory the workshop mods are in
+    :param mod_ids: mod directory names, in the order the game lists them
+    :param local_mods_path: the directory the local mods are in, e.g. %AppData%/SpaceEngineers/Mods
+    :return: list of paths to the mod directories that are there, extracted or zipped
+    """
+    mod_paths = []
+    for mod_id in reversed(mod_ids):
+        is_local = not mod_id.isdigit()
+        search_path = local_mods_path if is_local and local_mods_path else mods_path
+        mod_path = os.path.join(search_path, mod_id)
+        if os.path.isdir(mod_path) or archive_for(mod_path) is not None:
+            mod_paths.append(mod_path)
+        elif is_local and not local_mods_path:
+            my_log.warn(f"Local mod {mod_id} is listed but not in {mods_path}, set local_mods_path to load it")
+        else:
+            my_log.warn(f"Mod {mod_id} is listed but not in {search_path}, is it downloaded?")
+
+    return mod_paths
@@ -0,0 +1,89 @@
+import json
+import os.path
+
+from logbook import Logger
+
+from mod_archive import file_size
+from scraper import Scraper
+
+
+my_log = Logger(__name__)
+
+
+def profile_mods(scraper: Scraper) -> list:
+    """
+    Report how long each loaded block directory took to scrape and what it added, slowest first
+
+    The scraper must have been given a Stats, and no cache, or cached files show up as taking no time.
+
+    :param scraper: a scraper that has loaded its block directories
+    :return: list of dicts, one per directory
+    """
+    profiles = {}
+    for cube_blocks_path in scraper.block_dirs:
+        stage = scraper.stats.stages.get(f"scrape_blocks:{cube_blocks_path}", {})
+        profiles[cube_blocks_path] = {
+            "mod": mod_name(cube_blocks_path),
+            "path": cube_blocks_path,
+            "parse_seconds": stage.get("wall_seconds", 0.0),
+            "cpu_seconds": stage.get("cpu_seconds", 0.0),
+            "files": 0,
+            "bytes": 0,
+            "blocks": 0,
+            "parse_errors": scraper.stats.counters.get(f"parse_errors:{cube_blocks_path}", 0),
+            "overrides": [],
+            "shadowed": []
+        }
+
+    for cube_blocks_file, entry in scraper.block_files.items():
+        profile = profiles[entry["dir"]]
+        profile["files"] += 1
+        # a file inside an archive is stamped with the whole archive's size
+        profile["bytes"] += file_size(cube_blocks_file)
+        profile["blocks"] += len(entry["blocks"])
+
+    for sub_type_id, sources in scraper.block_sources.items():
+        # only clashes between directories count, a mod redefining its own block is its own business
+        source_dirs = []
+        for cube_blocks_file in sources:
+            cube_blocks_path = scraper.block_files[cube_blocks_file]["dir"]
+            if cube_blocks_path not in source_dirs:
+                source_dirs.append(cube_blocks_path)
+
+        if len(source_dirs) < 2:
+            continue
+
+        profiles[source_dirs[-1]]["overrides"].append(sub_type_id)
+        for cube_blocks_path in source_dirs[:-1]:
+            profiles[cube_blocks_path]["shadowed"].append(sub_type_id)
+
+    return sorted(profiles.values(), key=lambda profile: profile["parse_seconds"], reverse=True)
+
+
+def mod_name(cube_blocks_path: str) -> str:
+    """
+    The name of the mod a CubeBlocks directory belongs to, the directory above Data
+
+    :param cube_blocks_path: path to a CubeBlocks directory
+    :return: str
+    """
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.normpath(cube_blocks_path))))
+
+
+def write_profile(profiles: list, profile_file: str, top: int = 5) -> None:
+    """
+    Write the profile report as json and log the slowest directories
+
+    :param profiles: the report from profile_mods
+    :param profile_file: path to write the json to
+    :param top: how many of the slowest directories to log
+    :return: None
+    """
+    with open(profile_file, "w") as profile_json:
+        json.dump(profiles, profile_json, indent=2)
+
+    for profile in profiles[:top]:
+        my_log.info(f"{profile['mod']}: {profile['parse_seconds']:.3f}s, {profile['files']} files, "
+                    f"{profile['bytes']} bytes, {profile['blocks']} blocks, {profile['parse_errors']} parse errors, "
+                    f"{len(profile['overrides'])} overrides, {len(profile['shadowed'])} shadowed")
+    my_log.info(f"Mod profile written to {profile_file}")
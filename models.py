@@ -1,4 +1,6 @@
+import sys
 import xml.etree.ElementTree as ElementTree
+from collections.abc import ItemsView, Mapping, ValuesView
 
 
 class Block:
@@ -99,3 +101,202 @@ class Recipe:
             "output_type_id": self.output_type_id,
             "output_quantity": self.output_quantity
         }
+
+
+class CompactBlock(Mapping):
+    """
+    A read only block with interned names and its components packed into one flat tuple, for big modpacks
+
+    It can be read like the dict from Block.as_dict, so BluePrintChecker can use it as is.
+    """
+    __slots__ = ("type_id", "sub_type_id", "display_name", "components")
+
+    def __init__(self, type_id: str, sub_type_id: str, display_name: str, components: dict) -> None:
+        """
+        Create a CompactBlock class
+
+        :param components: a dict of component counts
+        :return: None
+        """
+        self.type_id = sys.intern(type_id)
+        self.sub_type_id = sub_type_id
+        self.display_name = sys.intern(display_name) if display_name is not None else None
+        self.components = pack(components)  # (component, count, component, count, ...)
+
+    @classmethod
+    def from_dict(cls, block: Mapping) -> "CompactBlock":
+        """
+        Make a compact block from a block dict, compact blocks are returned as they are
+
+        :param block: a dict from Block.as_dict
+        :return: CompactBlock
+        """
+        if isinstance(block, cls):
+            return block
+
+        return cls(block["type_id"], block["sub_type_id"], block["display_name"], block["components"])
+
+    def as_dict(self) -> dict:
+        """
+        Output a block as a dict
+
+        :return: dict
+        """
+        return {"type_id": self.type_id,
+                "sub_type_id": self.sub_type_id,
+                "display_name": self.display_name,
+                "components": unpack(self.components)}
+
+    def __getitem__(self, key: str):
+        if key == "components":
+            return PackedQuantities(self.components)
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+
+class CompactRecipe(Mapping):
+    """
+    A read only recipe with interned names and its materials packed into one flat tuple, for big modpacks
+
+    It can be read like the dict from Recipe.as_dict, so BluePrintChecker can use it as is.
+    """
+    __slots__ = ("materials", "output_type_id", "output_quantity")
+
+    def __init__(self, materials: dict, output_type_id: str, output_quantity: float) -> None:
+        """
+        Create a CompactRecipe class
+
+        :param materials: a dict of material amounts
+        :return: None
+        """
+        self.materials = pack(materials)  # (material, amount, material, amount, ...)
+        self.output_type_id = sys.intern(output_type_id)
+        self.output_quantity = output_quantity
+
+    @classmethod
+    def from_dict(cls, recipe: Mapping) -> "CompactRecipe":
+        """
+        Make a compact recipe from a recipe dict, compact recipes are returned as they are
+
+        :param recipe: a dict from Recipe.as_dict
+        :return: CompactRecipe
+        """
+        if isinstance(recipe, cls):
+            return recipe
+
+        return cls(recipe["materials"], recipe["output_type_id"], recipe["output_quantity"])
+
+    def as_dict(self) -> dict:
+        """
+        Output a recipe as a dict
+
+        :return: dict
+        """
+        return {
+            "materials": unpack(self.materials),
+            "output_type_id": self.output_type_id,
+            "output_quantity": self.output_quantity
+        }
+
+    def __getitem__(self, key: str):
+        if key == "materials":
+            return PackedQuantities(self.materials)
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+
+class PackedQuantities(Mapping):
+    """
+    A read only view of a tuple from pack, it can be read like the dict it was packed from without building one
+    """
+    __slots__ = ("packed",)
+
+    def __init__(self, packed: tuple) -> None:
+        """
+        Create a PackedQuantities class
+
+        :param packed: a tuple from pack
+        :return: None
+        """
+        self.packed = packed
+
+    def __getitem__(self, key: str):
+        # a block has a handful of components, looking through them is quicker than hashing into a dict
+        for index in range(0, len(self.packed), 2):
+            if self.packed[index] == key:
+                return self.packed[index + 1]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.packed[::2])
+
+    def __len__(self) -> int:
+        return len(self.packed) // 2
+
+    def items(self) -> ItemsView:
+        return PackedItems(self)
+
+    def values(self) -> ValuesView:
+        return PackedValues(self)
+
+
+class PackedItems(ItemsView):
+    """
+    The items of a PackedQuantities, read straight from the packed tuple
+    """
+    __slots__ = ()
+
+    def __iter__(self):
+        packed = self._mapping.packed
+        return zip(packed[::2], packed[1::2])
+
+
+class PackedValues(ValuesView):
+    """
+    The values of a PackedQuantities, read straight from the packed tuple
+    """
+    __slots__ = ()
+
+    def __iter__(self):
+        return iter(self._mapping.packed[1::2])
+
+
+def pack(quantities: Mapping) -> tuple:
+    """
+    Pack a dict of quantities into one flat tuple of interned names and quantities
+
+    A flat tuple is about a third of the size of the dict, or of a tuple of pairs.
+
+    :param quantities: a dict of quantities
+    :return: tuple
+    """
+    packed = []
+    for name, quantity in quantities.items():
+        packed.append(sys.intern(name))
+        packed.append(quantity)
+
+    return tuple(packed)
+
+
+def unpack(packed: tuple) -> dict:
+    """
+    Unpack a flat tuple of names and quantities back into a dict
+
+    :param packed: a tuple from pack
+    :return: dict
+    """
+    return dict(zip(packed[::2], packed[1::2]))
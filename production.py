@@ -0,0 +1,221 @@
+import heapq
+import math
+
+from logbook import Logger
+
+from recipe_graph import RecipeGraph, item_name
+
+
+my_log = Logger(__name__)
+
+# what one module adds, these depend on the world settings so change them to match yours
+SPEED_MODULE_BONUS = 0.5
+YIELD_MODULE_BONUS = 0.1
+
+
+class Machine:
+    """
+    An assembler or refinery
+    """
+    def __init__(self, name: str, kind: str, speed: float = 1.0, yield_factor: float = 1.0) -> None:
+        """
+        Create a Machine class
+
+        :param name: what to call the machine in the plan
+        :param kind: "assembler" or "refinery"
+        :param speed: how many times faster than a blueprint's BaseProductionTimeInSeconds it works
+        :param yield_factor: how many times a blueprint's results it makes, only refineries have yield modules
+        :return: None
+        """
+        self.name = name
+        self.kind = kind
+        self.speed = speed
+        self.yield_factor = yield_factor
+
+    @classmethod
+    def from_modules(cls, name: str, kind: str, speed_modules: int = 0, yield_modules: int = 0) -> "Machine":
+        """
+        Make a machine with some speed and yield modules fitted
+
+        :return: Machine
+        """
+        return cls(name, kind, 1.0 + SPEED_MODULE_BONUS * speed_modules, 1.0 + YIELD_MODULE_BONUS * yield_modules)
+
+
+class ProductionPlanner:
+    """
+    Works out how long a build takes on a set of assemblers and refineries
+
+    Every item's runs are worked out from the recipe graph, split into one piece per machine so an item can be made on
+    all of them at once, and scheduled longest piece first onto whichever machine would finish it soonest. Refineries
+    are assumed to keep the assemblers fed, so the build takes as long as the slower of the two.
+    """
+    def __init__(self, recipe_graph: RecipeGraph, machines: list) -> None:
+        """
+        Create a ProductionPlanner class
+
+        :param recipe_graph: the blueprints, with their production times
+        :param machines: the assemblers and refineries, with no refineries the ingots are taken as already made
+        :return: None
+        """
+        self.recipe_graph = recipe_graph
+        self.machines = machines
+        self.kinds = {}
+        for machine in machines:
+            self.kinds.setdefault(machine.kind, []).append(machine)
+
+        if not recipe_graph.order:
+            recipe_graph.build()
+
+    def machine_kind(self, item: tuple) -> str:
+        """
+        Which kind of machine makes an item
+
+        :param item: the item
+        :return: str
+        """
+        return "refinery" if item[0] == "Ingot" else "assembler"
+
+    def demand(self, items: dict) -> tuple:
+        """
+        Work out the runs of every blueprint needed to make some items, and what has to be on hand already
+
+        :param items: items to amounts
+        :return: tuple of the jobs, item to kind, runs and seconds at speed 1, and the inputs, item to amount
+        """
+        needed = dict(items)
+        jobs = {}
+        inputs = {}
+
+        # every item comes after the items it is made from, so going backwards an item's demand is complete
+        # before it is passed down to what it is made from
+        for item in reversed(self.recipe_graph.order):
+            amount = needed.pop(item, 0)
+            if amount <= 0:
+                continue
+
+            blueprint_id = self.recipe_graph.recipes.get(item)
+            kind = self.machine_kind(item)
+            if blueprint_id is None or kind not in self.kinds:
+                inputs[item] = inputs.get(item, 0) + amount
+                continue
+
+            blueprint = self.recipe_graph.blueprints[blueprint_id]
+            machines = self.kinds[kind]
+            yield_factor = sum(machine.yield_factor for machine in machines) / len(machines)
+            runs = amount / (blueprint["results"][item] * yield_factor)
+            jobs[item] = {"kind": kind, "blueprint": blueprint_id, "amount": amount, "runs": runs,
+                          "seconds": runs * blueprint["seconds"]}
+
+            for prerequisite, p_quantity in blueprint["prerequisites"].items():
+                needed[prerequisite] = needed.get(prerequisite, 0) + runs * p_quantity
+
+        # items with no blueprint, and items that close a recipe cycle, are taken as raw
+        for item, amount in needed.items():
+            if amount > 0:
+                inputs[item] = inputs.get(item, 0) + amount
+
+        return jobs, inputs
+
+    def plan(self, components: dict) -> dict:
+        """
+        Plan making a check's components
+
+        :param components: component SubtypeIds to counts
+        :return: dict with the makespan, the bottleneck, every machine's queue and the inputs needed
+        """
+        jobs, inputs = self.demand({("Component", component): c_quantity
+                                    for component, c_quantity in components.items()})
+
+        queues = {machine.name: [] for machine in self.machines}
+        busy = {machine.name: 0.0 for machine in self.machines}
+        stages = {}
+        for kind, machines in self.kinds.items():
+            kind_jobs = {item: job for item, job in jobs.items() if job["kind"] == kind}
+            stages[kind] = self.schedule(kind_jobs, machines, queues, busy)
+
+        bottleneck = max(stages, key=lambda kind: stages[kind]["makespan_seconds"]) if stages else None
+        bottleneck_items = []
+        if bottleneck is not None:
+            work = stages[bottleneck]["work_seconds"]
+            for item, job in sorted(jobs.items(), key=lambda item_job: item_job[1]["seconds"], reverse=True):
+                if job["kind"] == bottleneck and len(bottleneck_items) < 5:
+                    bottleneck_items.append({"item": item_name(item), "seconds": job["seconds"],
+                                             "share": job["seconds"] / work if work else 0.0})
+
+        return {
+            "makespan_seconds": max((stage["makespan_seconds"] for stage in stages.values()), default=0.0),
+            "sequential_seconds": sum(stage["makespan_seconds"] for stage in stages.values()),
+            "stages": stages,
+            "bottleneck": bottleneck,
+            "bottleneck_items": bottleneck_items,
+            "inputs": {item_name(item): amount for item, amount in inputs.items()},
+            "machines": [{"name": machine.name,
+                          "kind": machine.kind,
+                          "speed": machine.speed,
+                          "yield": machine.yield_factor,
+                          "busy_seconds": busy[machine.name],
+                          "queue": queues[machine.name]} for machine in self.machines]
+        }
+
+    @staticmethod
+    def schedule(jobs: dict, machines: list, queues: dict, busy: dict) -> dict:
+        """
+        Schedule one kind of machine's jobs, longest piece first, each onto the machine that would finish it soonest
+
+        :param jobs: item to job, from demand
+        :param machines: the machines of this kind
+        :param queues: machine name to its queue, added to
+        :param busy: machine name to the time it is busy until, added to
+        :return: dict with the stage's makespan and total work
+        """
+        pieces = []
+        for item, job in jobs.items():
+            # one piece per machine, fewer for items that take less than a run each
+            count = max(1, min(len(machines), math.ceil(job["runs"])))
+            for _ in range(count):
+                pieces.append((job["seconds"] / count, job["runs"] / count, item))
+        pieces.sort(key=lambda piece: piece[0], reverse=True)
+
+        same_speed = len({machine.speed for machine in machines}) == 1
+        free = [(busy[machine.name], index) for index, machine in enumerate(machines)]
+        heapq.heapify(free)
+        for seconds, runs, item in pieces:
+            if same_speed:
+                start, index = heapq.heappop(free)
+            else:
+                # a fast machine that is busy for a while can still finish first
+                index = min(range(len(machines)),
+                            key=lambda i: busy[machines[i].name] + seconds / machines[i].speed)
+                start = busy[machines[index].name]
+
+            machine = machines[index]
+            end = start + seconds / machine.speed
+            queues[machine.name].append({"item": item_name(item), "runs": runs, "start": start, "end": end})
+            busy[machine.name] = end
+            if same_speed:
+                heapq.heappush(free, (end, index))
+
+        return {"machines": len(machines),
+                "work_seconds": sum(job["seconds"] for job in jobs.values()),
+                "makespan_seconds": max((busy[machine.name] for machine in machines), default=0.0)}
+
+
+def machines_from_config(factory: dict) -> list:
+    """
+    Make the machines described in the config's factory section
+
+    :param factory: counts and modules of assemblers and refineries, only refineries take yield modules
+    :return: list of Machine
+    """
+    if factory.get("assembler_yield_modules"):
+        my_log.warn("Assemblers don't take yield modules, ignoring assembler_yield_modules")
+
+    machines = []
+    for kind, plural in [("assembler", "assemblers"), ("refinery", "refineries")]:
+        yield_modules = factory.get("refinery_yield_modules", 0) if kind == "refinery" else 0
+        for index in range(factory.get(plural, 0)):
+            machines.append(Machine.from_modules(f"{kind}-{index + 1}", kind,
+                                                 factory.get(f"{kind}_speed_modules", 0), yield_modules))
+
+    return machines
@@ -0,0 +1,255 @@
+import xml.etree.ElementTree as ElementTree
+
+from logbook import Logger
+
+from definition_cache import DefinitionCache
+from mod_archive import ARCHIVE_ERRORS, open_source, source_exists
+
+
+my_log = Logger(__name__)
+
+
+class RecipeGraph:
+    """
+    Every blueprint's inputs and outputs, for expanding items all the way down to ore
+
+    Items are (TypeId, SubtypeId) tuples, e.g. ("Ingot", "Iron"). Each item is made with one chosen blueprint,
+    the expansion of every item into raw items is worked out once, so expanding a whole build costs the same as
+    check_mats' one level pass.
+    """
+    def __init__(self, preferred: dict = None) -> None:
+        """
+        Create a RecipeGraph class
+
+        :param preferred: item names, e.g. "Ingot/Iron", to the blueprint that should make them
+        :return: None
+        """
+        self.blueprints = {}  # blueprint id to its prerequisites, results and production time
+        self.producers = {}  # item to the blueprints that make it, in load order
+        self.preferred = preferred or {}
+        self.recipes = {}  # item to the blueprint chosen to make it
+        self.order = []  # items, every item after the items it is made from
+        self.expansions = {}  # item to the raw items that make one of it
+
+    def load_file(self, recipes_file: str, cache: DefinitionCache = None) -> None:
+        """
+        Add the blueprints in a recipes file, later blueprints replace earlier ones with the same id
+
+        :param recipes_file: path to an .sbc file, or a file inside an archive
+        :param cache: an optional cache of previously scraped blueprints
+        :return: None
+        """
+        if not source_exists(recipes_file):
+            my_log.warn(f"recipes_file does not exist = {recipes_file}")
+            return None
+
+        blueprints = cache.get("recipe_graph", recipes_file) if cache is not None else None
+        if blueprints is None:
+            blueprints = scrape_graph_file(recipes_file)
+            if blueprints is None:
+                return None
+            if cache is not None:
+                cache.put("recipe_graph", recipes_file, blueprints)
+
+        for blueprint in blueprints:
+            self.add_blueprint(blueprint["id"],
+                               {tuple(item): amount for item, amount in blueprint["prerequisites"]},
+                               {tuple(item): amount for item, amount in blueprint["results"]},
+                               blueprint["seconds"])
+
+    def add_blueprint(self, blueprint_id: str, prerequisites: dict, results: dict, seconds: float) -> None:
+        """
+        Add a blueprint, the graph needs building again afterwards
+
+        :param blueprint_id: the blueprint's SubtypeId
+        :param prerequisites: items to the amounts used
+        :param results: items to the amounts made
+        :param seconds: BaseProductionTimeInSeconds
+        :return: None
+        """
+        if blueprint_id in self.blueprints:
+            for item in self.blueprints[blueprint_id]["results"]:
+                self.producers[item].remove(blueprint_id)
+
+        # nothing can be made from a blueprint that makes none of it
+        results = {item: amount for item, amount in results.items() if amount > 0}
+        self.blueprints[blueprint_id] = {"prerequisites": prerequisites, "results": results, "seconds": seconds}
+        for item in results:
+            self.producers.setdefault(item, []).append(blueprint_id)
+
+        self.order = []
+        self.expansions = {}
+
+    def recipe_for(self, item: tuple) -> str:
+        """
+        Choose the blueprint that makes an item
+
+        A preferred blueprint wins, then blueprints that only make this item, so a multi result blueprint such as
+        stone to ingots is only used when nothing else makes the item. After that the first one loaded wins.
+
+        :param item: the item
+        :return: str, the blueprint id, or None if nothing makes the item
+        """
+        producers = self.producers.get(item)
+        if not producers:
+            return None
+
+        preferred = self.preferred.get(item_name(item))
+        if preferred is not None:
+            if preferred in producers:
+                return preferred
+            my_log.warn(f"Preferred blueprint {preferred} doesn't make {item_name(item)}")
+
+        single_result = [blueprint_id for blueprint_id in producers
+                         if len(self.blueprints[blueprint_id]["results"]) == 1]
+
+        return (single_result or producers)[0]
+
+    def build(self) -> None:
+        """
+        Choose a blueprint for every item, order the items and work out what each is made of
+
+        A cycle, such as ingots that can be made back into ore, is broken by treating the item that closes it as raw.
+
+        :return: None
+        """
+        self.recipes = {}
+        for item in self.producers:
+            blueprint_id = self.recipe_for(item)
+            if blueprint_id is not None:
+                self.recipes[item] = blueprint_id
+
+        self.order = []
+        self.expansions = {}
+        state = {}  # item to 1 while it is being visited, 2 once it is done
+        for item in self.recipes:
+            if item not in state:
+                self.visit(item, state)
+
+    def visit(self, item: tuple, state: dict) -> None:
+        """
+        Work out an item's expansion after the expansions of everything it is made from
+
+        :param item: the item
+        :param state: the items visited so far
+        :return: None
+        """
+        state[item] = 1
+        blueprint_id = self.recipes.get(item)
+        expansion = {}
+
+        if blueprint_id is None:
+            expansion[item] = 1.0
+        else:
+            blueprint = self.blueprints[blueprint_id]
+            made = blueprint["results"][item]
+            for prerequisite, amount in blueprint["prerequisites"].items():
+                if state.get(prerequisite) == 1:
+                    my_log.warn(f"Recipe cycle through {item_name(prerequisite)}, treating it as raw")
+                    expansion[prerequisite] = expansion.get(prerequisite, 0.0) + amount / made
+                    continue
+
+                if state.get(prerequisite) is None:
+                    self.visit(prerequisite, state)
+                for raw_item, raw_amount in self.expansions[prerequisite].items():
+                    expansion[raw_item] = expansion.get(raw_item, 0.0) + raw_amount * amount / made
+
+        state[item] = 2
+        self.order.append(item)
+        self.expansions[item] = expansion
+
+    def expand(self, items: dict) -> dict:
+        """
+        Expand items into the raw items they are made from
+
+        :param items: items to amounts
+        :return: dict of raw items to amounts
+        """
+        if not self.order:
+            self.build()
+
+        raw_items = {}
+        for item, quantity in items.items():
+            expansion = self.expansions.get(item)
+            if expansion is None:
+                expansion = {item: 1.0}
+
+            for raw_item, raw_amount in expansion.items():
+                raw_items[raw_item] = raw_items.get(raw_item, 0.0) + raw_amount * quantity
+
+        return raw_items
+
+    def expand_components(self, components: dict) -> dict:
+        """
+        Expand a check's components into raw items, the same shape of result as check_mats
+
+        :param components: component SubtypeIds to counts
+        :return: dict of raw item names, e.g. "Ore/Iron", to amounts
+        """
+        raw_items = self.expand({("Component", component): c_quantity
+                                 for component, c_quantity in components.items()})
+
+        return {item_name(item): amount for item, amount in raw_items.items()}
+
+
+def item_name(item: tuple) -> str:
+    """
+    Name an item for output and config, e.g. "Ingot/Iron"
+
+    :param item: the item
+    :return: str
+    """
+    return "/".join(item)
+
+
+def item_key(element: ElementTree) -> tuple:
+    """
+    The item an Item or Result element is about
+
+    :param element: the element
+    :return: tuple
+    """
+    return element.attrib["TypeId"].removeprefix("MyObjectBuilder_"), element.attrib["SubtypeId"]
+
+
+def scrape_graph_file(recipes_file: str) -> list:
+    """
+    Scrape every blueprint from a recipes file, whatever it makes
+
+    :param recipes_file: path to an .sbc file, or a file inside an archive
+    :return: list of dicts, or None if the file could not be parsed
+    """
+    try:
+        with open_source(recipes_file) as source:
+            tree = ElementTree.parse(source)
+    except ElementTree.ParseError:
+        my_log.warn(f"Skipped due to ParseError: {recipes_file}")
+        return None
+    except ARCHIVE_ERRORS as error:
+        my_log.warn(f"Skipped due to damaged archive: {recipes_file}: {error!r}")
+        return None
+
+    blueprints = []
+    for element in tree.getroot().iter("Blueprint"):
+        id_element = element.find("Id")
+        if id_element is None:
+            continue
+        blueprint_id = id_element.findtext("SubtypeId") or id_element.get("Subtype")
+
+        # a blueprint either has one Result or a Results list
+        results = element.findall("Result") or element.findall("Results/Item")
+        if not blueprint_id or not results:
+            continue
+
+        try:
+            blueprints.append({
+                "id": blueprint_id,
+                "prerequisites": [[item_key(item), float(item.attrib["Amount"])]
+                                  for item in element.findall("Prerequisites/Item")],
+                "results": [[item_key(result), float(result.attrib["Amount"])] for result in results],
+                "seconds": float(element.findtext("BaseProductionTimeInSeconds") or 0.0)
+            })
+        except (KeyError, ValueError):
+            my_log.warn(f"Skipped blueprint {blueprint_id} with a malformed item: {recipes_file}")
+
+    return blueprints
@@ -0,0 +1,311 @@
+import hashlib
+import io
+import json
+import os
+import os.path
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from bp_checker import ENCODING_PATTERN, UNSPLITTABLE, BluePrintChecker
+from definition_cache import DefinitionCache
+
+GRID_PATTERN = re.compile(rb"<CubeGrid[\s>/]|</CubeGrid>")
+GRID_HEAD = (b'<CubeGrids xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+             b'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">')
+GRID_TAIL = b"</CubeGrids>"
+
+
+class ResultCache:
+    """
+    A least recently used cache of json results, bounded by entries, bytes and age, optionally backed by files
+    """
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 ** 2, ttl_seconds: float = None,
+                 cache_dir: str = None) -> None:
+        """
+        Create a ResultCache class
+
+        :param max_entries: most results to keep in memory
+        :param max_bytes: most bytes of json to keep in memory
+        :param ttl_seconds: drop results older than this, None keeps them until they are evicted
+        :param cache_dir: also keep results as files in this directory, so they outlive the process
+        :return: None
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()  # key to the time it was stored and its json
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # the server looks results up from more than one thread
+
+    def get(self, key: str):
+        """
+        Get a cached result, from memory or disk, if it hasn't expired
+
+        :param key: the result's key
+        :return: the result, or None if it isn't cached
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.expired(entry[0]):
+                self.discard(key)
+                entry = None
+
+            if entry is None and self.cache_dir is not None:
+                entry = self.read_file(key)
+                if entry is not None:
+                    self.store(key, *entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        return json.loads(entry[1])
+
+    def put(self, key: str, result) -> None:
+        """
+        Cache a result, evicting the least recently used ones if the cache is full
+
+        :param key: the result's key
+        :param result: anything json can store
+        :return: None
+        """
+        stored_at = time.time()
+        text = json.dumps(result, default=DefinitionCache.as_json)
+        with self.lock:
+            self.store(key, stored_at, text)
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_file = f"{self.file_path(key)}.tmp"
+            with open(temp_file, "w") as result_json:
+                result_json.write(text)
+            os.replace(temp_file, self.file_path(key))
+
+    def store(self, key: str, stored_at: float, text: str) -> None:
+        """
+        Keep a result's json in memory, the lock must be held
+
+        :return: None
+        """
+        self.discard(key)
+        self.entries[key] = (stored_at, text)
+        self.size_bytes += len(text)
+
+        while self.entries and (len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes):
+            self.discard(next(iter(self.entries)))
+
+    def discard(self, key: str) -> None:
+        """
+        Drop a result from memory, it stays on disk, the lock must be held
+
+        :return: None
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[1])
+
+    def expired(self, stored_at: float) -> bool:
+        """
+        Whether a result stored at a time is too old to use
+
+        :return: bool
+        """
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def file_path(self, key: str) -> str:
+        """
+        Where a result is kept on disk
+
+        :return: str
+        """
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def read_file(self, key: str) -> tuple:
+        """
+        Read a result kept on disk, if it is there and hasn't expired
+
+        :return: tuple of the time it was stored and its json, or None
+        """
+        try:
+            stored_at = os.path.getmtime(self.file_path(key))
+            if self.expired(stored_at):
+                os.remove(self.file_path(key))
+                return None
+
+            with open(self.file_path(key), "r") as result_json:
+                return stored_at, result_json.read()
+        except OSError:
+            return None
+
+    def prune(self) -> None:
+        """
+        Delete expired result files, keeping at most max_entries of the newest
+
+        :return: None
+        """
+        if self.cache_dir is None or not os.path.isdir(self.cache_dir):
+            return None
+
+        result_files = []
+        for file in os.listdir(self.cache_dir):
+            if file.endswith(".json"):
+                result_file = os.path.join(self.cache_dir, file)
+                result_files.append((os.path.getmtime(result_file), result_file))
+        result_files.sort(reverse=True)
+
+        for index, (stored_at, result_file) in enumerate(result_files):
+            if index >= self.max_entries or self.expired(stored_at):
+                os.remove(result_file)
+
+
+class CachingChecker:
+    """
+    Checks blueprint bytes, reusing results for blueprints it has seen and block counts for grids it has seen
+    """
+    def __init__(self, checker: BluePrintChecker, results: ResultCache = None, grids: ResultCache = None) -> None:
+        """
+        Create a CachingChecker class
+
+        :param checker: the checker to check with
+        :param results: cache of whole results, keyed by the blueprint and the definitions
+        :param grids: cache of each CubeGrid's block counts, keyed by the grid's bytes
+        :return: None
+        """
+        self.checker = checker
+        self.results = results
+        self.grids = grids
+        self.fingerprint = None
+
+    def result_key(self, body: bytes) -> str:
+        """
+        The key a blueprint's result is cached under, it changes whenever the blueprint or the definitions do
+
+        :param body: the blueprint xml
+        :return: str
+        """
+        if self.fingerprint is None:
+            self.fingerprint = definitions_fingerprint(self.checker.blocks, self.checker.components)
+
+        key = hashlib.sha256(self.fingerprint.encode())
+        key.update(body)
+
+        return key.hexdigest()
+
+    def cached_result(self, body: bytes) -> tuple:
+        """
+        Look a blueprint's result up in the cache
+
+        :param body: the blueprint xml
+        :return: tuple of the key and the result, which is None if it isn't cached
+        """
+        if self.results is None:
+            return None, None
+
+        key = self.result_key(body)
+
+        return key, self.results.get(key)
+
+    def check_bytes(self, body: bytes, mode: str = "dom") -> dict:
+        """
+        Check a blueprint, from the cache if it has been checked with these definitions before
+
+        :param body: the blueprint xml
+        :param mode: how to read the blueprint, see BluePrintChecker.check_blueprint
+        :return: dict
+        """
+        key, result = self.cached_result(body)
+        if result is not None:
+            return result
+
+        result = self.checker.check_counts(self.count_bytes(body, mode))
+
+        if key is not None:
+            self.results.put(key, result)
+
+        return result
+
+    def count_bytes(self, body: bytes, mode: str = "dom") -> dict:
+        """
+        Count the blocks in a blueprint, only parsing the grids that aren't in the grid cache
+
+        :param body: the blueprint xml
+        :param mode: how to read the blueprint, see BluePrintChecker.check_blueprint
+        :return: dict
+        """
+        fragments = split_grids(body) if self.grids is not None else None
+        if fragments is None:
+            return self.checker.count_blocks(io.BytesIO(body), mode)
+
+        used_blocks = {}
+        for fragment in fragments:
+            key = hashlib.sha256(fragment).hexdigest()
+            grid_blocks = self.grids.get(key)
+            if grid_blocks is None:
+                grid_blocks = self.checker.count_blocks(io.BytesIO(GRID_HEAD + fragment + GRID_TAIL), mode)
+                self.grids.put(key, grid_blocks)
+
+            for block, b_quantity in grid_blocks.items():
+                used_blocks[block] = used_blocks.get(block, 0) + b_quantity
+
+        return used_blocks
+
+
+def definitions_fingerprint(blocks: dict, components: dict) -> str:
+    """
+    A hash of a set of definitions, equal definitions always give the same one
+
+    :param blocks: a dict with all the blocks in
+    :param components: a dict with all the component recipes in
+    :return: str
+    """
+    definitions = json.dumps([blocks, components], sort_keys=True, default=DefinitionCache.as_json)
+
+    return hashlib.sha256(definitions.encode()).hexdigest()
+
+
+def split_grids(body: bytes) -> list:
+    """
+    Cut a blueprint into the bytes of each of its CubeGrids, without parsing it
+
+    Gives up on anything a byte search could get wrong, such as comments, and on blocks outside any grid.
+
+    :param body: the blueprint xml
+    :return: list of bytes, or None if the blueprint has to be parsed whole
+    """
+    if any(marker in body for marker in UNSPLITTABLE) or body.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return None
+
+    declaration = ENCODING_PATTERN.match(body.lstrip(b"\xef\xbb\xbf"))
+    if declaration is not None and declaration.group(1).lower() not in (b"utf-8", b"utf8", b"us-ascii", b"ascii"):
+        return None
+
+    fragments = []
+    start = None
+    outside = 0
+    for match in GRID_PATTERN.finditer(body):
+        if match.group() == b"</CubeGrid>":
+            if start is None:
+                return None
+            fragments.append(body[start:match.end()])
+            outside = match.end()
+            start = None
+        else:
+            # nested or self closing grids aren't something a blueprint has
+            if start is not None or body.find(b">", match.start()) == body.find(b"/>", match.start()) + 1:
+                return None
+            if b"MyObjectBuilder_CubeBlock" in body[outside:match.start()]:
+                return None
+            start = match.start()
+
+    if start is not None or not fragments or b"MyObjectBuilder_CubeBlock" in body[outside:]:
+        return None
+
+    return fragments
@@ -1,9 +1,16 @@
+import bisect
+import functools
 import os.path
 import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ProcessPoolExecutor
 
 from logbook import Logger
 
-from models import Block, Recipe
+from definition_cache import DefinitionCache
+from discovery import find_block_files
+from mod_archive import ARCHIVE_ERRORS, file_size, open_source, source_exists
+from models import Block, CompactBlock, CompactRecipe, Recipe
+from stats import NO_STATS, Stats, timed
 
 
 my_log = Logger(__name__)
@@ -15,43 +22,61 @@ class Scraper:
 
     :return: None
     """
-    def __init__(self) -> None:
+    def __init__(self, cache: DefinitionCache = None, compact: bool = False, stats: Stats = None,
+                 discover: bool = False) -> None:
         """
         Create a scraper class
+
+        :param cache: an optional cache of previously scraped definitions
+        :param compact: keep definitions as CompactBlock and CompactRecipe instead of dicts, to save memory
+        :param stats: time scraping and count files, bytes and cache hits here, per directory
+        :param discover: find block files anywhere in each CubeBlocks directory's Data directory, not just in it,
+            only parsing the files that have a CubeBlocks section
         """
         self.all_blocks = {}
         self.all_recipes = {}
+        self.cache = cache
+        self.compact = compact
+        self.stats = stats if stats is not None else NO_STATS
+        self.discover = discover
+
+        # where everything came from, so changed files can be reloaded on their own
+        self.block_dirs = []
+        self.block_dir_index = {}
+        self.block_files = {}
+        self.block_file_dirs = {}  # discovered block files to the CubeBlocks directory they are loaded with
+        self.block_sources = {}
+        self.recipe_files = {}
 
-    def load_blocks(self, cube_blocks_path: str) -> None:
+    def load_blocks(self, cube_blocks_path: str, workers: int = 1) -> None:
         """
         Load the blocks from files in a content directory
 
+        :param cube_blocks_path: path to a CubeBlocks directory
+        :param workers: number of processes to scrape files with
         :return: None
         """
-        if not os.path.isdir(cube_blocks_path):
-            my_log.warn(f"cube_blocks_path does not exist = {cube_blocks_path}")
-            return None
-
-        for file in os.listdir(cube_blocks_path):
-            if not file.endswith(".sbc"):
-                continue
+        self.load_block_dirs([cube_blocks_path], workers)
 
-            cube_blocks_file = os.path.join(cube_blocks_path, file)
+    def load_block_dirs(self, cube_blocks_paths: list, workers: int = 1) -> None:
+        """
+        Load the blocks from files in several content directories, later directories win on a clash
 
-            try:
-                tree = ElementTree.parse(cube_blocks_file)
-                for element in tree.getroot().iter("Definition"):
-                    block = Block()
-                    block.from_element(element)
+        :param cube_blocks_paths: paths to CubeBlocks directories, in load order
+        :param workers: number of processes to scrape files with
+        :return: None
+        """
+        cube_blocks_paths = [os.path.normpath(cube_blocks_path) for cube_blocks_path in cube_blocks_paths]
+        for cube_blocks_path in cube_blocks_paths:
+            if cube_blocks_path not in self.block_dir_index:
+                self.block_dir_index[cube_blocks_path] = len(self.block_dirs)
+                self.block_dirs.append(cube_blocks_path)
 
-                    if block.type_id is None:
-                        my_log.warn(f"Skipped due to None type_id: {cube_blocks_file}")
-                        continue
-                    self.all_blocks[block.sub_type_id] = block.as_dict()
+        cube_blocks_files = []
+        for cube_blocks_path in cube_blocks_paths:
+            cube_blocks_files.extend(self.list_block_files(cube_blocks_path))
 
-            except ElementTree.ParseError:
-                my_log.warn(f"Skipped due to ParseError: {cube_blocks_file}")
-                continue
+        self.add_block_files(cube_blocks_files, workers)
 
     def load_recipes(self, recipes_file: str) -> None:
         """
@@ -59,20 +84,384 @@ class Scraper:
 
         :return: None
         """
-        if not os.path.isfile(recipes_file):
+        if not source_exists(recipes_file):
             my_log.warn(f"recipes_file does not exist = {recipes_file}")
             return None
 
-        try:
-            tree = ElementTree.parse(recipes_file)
-            for element in tree.getroot().iter("Blueprint"):
-                recipe = Recipe()
-                recipe.from_element(element)
+        stamp = DefinitionCache.stamp(recipes_file)
+        recipes = self.scrape_files("recipes", [recipes_file], scrape_recipes_file)[0]
+        if recipes is None:
+            return None
+
+        if self.compact:
+            recipes = self.compacted("recipes", recipes_file, recipes, CompactRecipe)
+
+        self.recipe_files[recipes_file] = {"stamp": stamp, "recipes": recipes}
+        self.all_recipes.update(recipes)
+
+    def refresh(self, cube_blocks_paths: list = None, workers: int = 1) -> list:
+        """
+        Reload only the definition files that have changed since they were loaded
+
+        Every file is still listed and stat'ed, but only new or changed files are scraped again.
+
+        :param cube_blocks_paths: the CubeBlocks directories that should now be loaded, if they have changed
+        :param workers: number of processes to scrape files with
+        :return: list of the files that were added, changed or removed
+        """
+        return self.refresh_blocks(cube_blocks_paths, workers) + self.refresh_recipes()
+
+    def refresh_blocks(self, cube_blocks_paths: list = None, workers: int = 1) -> list:
+        """
+        Reload the block files that have changed, restoring any blocks a removed definition was shadowing
+
+        :param cube_blocks_paths: the CubeBlocks directories that should now be loaded, if they have changed
+        :param workers: number of processes to scrape files with
+        :return: list of the files that were added, changed or removed
+        """
+        if cube_blocks_paths is not None:
+            cube_blocks_paths = [os.path.normpath(cube_blocks_path) for cube_blocks_path in cube_blocks_paths]
+
+        reorder = cube_blocks_paths is not None and cube_blocks_paths != self.block_dirs
+        if reorder:
+            self.block_dirs = cube_blocks_paths
+            self.block_dir_index = {cube_blocks_path: index for index, cube_blocks_path in enumerate(self.block_dirs)}
+
+        current = {}
+        for cube_blocks_path in self.block_dirs:
+            for cube_blocks_file in self.list_block_files(cube_blocks_path, warn=False):
+                current[cube_blocks_file] = DefinitionCache.stamp(cube_blocks_file)
+
+        removed = [cube_blocks_file for cube_blocks_file in self.block_files if cube_blocks_file not in current]
+        for cube_blocks_file in removed:
+            self.drop_block_file(cube_blocks_file)
+
+        if reorder:
+            for sub_type_id, sources in self.block_sources.items():
+                sources.sort(key=self.block_order)
+                self.all_blocks[sub_type_id] = self.block_files[sources[-1]]["blocks"][sub_type_id]
+
+        changed = [cube_blocks_file for cube_blocks_file, stamp in current.items()
+                   if cube_blocks_file not in self.block_files or self.block_files[cube_blocks_file]["stamp"] != stamp]
+        self.add_block_files(changed, workers)
+
+        if removed or changed:
+            my_log.info(f"Reloaded {len(changed)} changed and dropped {len(removed)} removed block files")
+
+        return removed + changed
+
+    def refresh_recipes(self) -> list:
+        """
+        Reload the recipe files that have changed
+
+        :return: list of the files that were changed or removed
+        """
+        changed = []
+        for recipes_file, entry in list(self.recipe_files.items()):
+            if not source_exists(recipes_file):
+                del self.recipe_files[recipes_file]
+                changed.append(recipes_file)
+                continue
+
+            stamp = DefinitionCache.stamp(recipes_file)
+            if stamp == entry["stamp"]:
+                continue
+
+            recipes = self.scrape_files("recipes", [recipes_file], scrape_recipes_file)[0] or {}
+            if self.compact:
+                recipes = self.compacted("recipes", recipes_file, recipes, CompactRecipe)
+
+            self.recipe_files[recipes_file] = {"stamp": stamp, "recipes": recipes}
+            changed.append(recipes_file)
+
+        if changed:
+            # there are only ever a handful of recipe files, so just merge them again
+            self.all_recipes = {}
+            for entry in self.recipe_files.values():
+                self.all_recipes.update(entry["recipes"])
+
+        return changed
+
+    def list_block_files(self, cube_blocks_path: str, warn: bool = True) -> list:
+        """
+        List the .sbc files in a content directory, or with discover on every block file in its Data directory
+
+        A mod that is still zipped has its files listed from the archive.
+
+        :param cube_blocks_path: path to a CubeBlocks directory
+        :param warn: log a warning if the directory doesn't exist
+        :return: list
+        """
+        cube_blocks_files = find_block_files(cube_blocks_path, self.discover, self.cache)
+        if cube_blocks_files is None:
+            if warn:
+                my_log.warn(f"cube_blocks_path does not exist = {cube_blocks_path}")
+            return []
+
+        for cube_blocks_file in cube_blocks_files:
+            self.block_file_dirs[cube_blocks_file] = cube_blocks_path
+
+        return cube_blocks_files
+
+    def add_block_files(self, cube_blocks_files: list, workers: int = 1) -> None:
+        """
+        Scrape block files and add their blocks, replacing anything already loaded from them
+
+        :param cube_blocks_files: paths to the files, which must be in one of the loaded directories
+        :param workers: number of processes to scrape files with
+        :return: None
+        """
+        stamps = [DefinitionCache.stamp(cube_blocks_file) for cube_blocks_file in cube_blocks_files]
+        scraped = self.scrape_files("blocks", cube_blocks_files,
+                                    scrape_block_sections if self.discover else scrape_blocks_file, workers)
+
+        for cube_blocks_file, stamp, blocks in zip(cube_blocks_files, stamps, scraped):
+            if cube_blocks_file in self.block_files:
+                self.drop_block_file(cube_blocks_file)
+
+            if self.compact and blocks:
+                blocks = self.compacted("blocks", cube_blocks_file, blocks, CompactBlock)
+
+            # files that failed to parse are kept too, so they aren't scraped again until they change
+            self.block_files[cube_blocks_file] = {"dir": self.block_file_dirs.get(cube_blocks_file,
+                                                                                  os.path.dirname(cube_blocks_file)),
+                                                  "stamp": stamp,
+                                                  "blocks": blocks or {}}
+
+            for sub_type_id, block in self.block_files[cube_blocks_file]["blocks"].items():
+                sources = self.block_sources.setdefault(sub_type_id, [])
+                bisect.insort(sources, cube_blocks_file, key=self.block_order)
+
+                if sources[-1] == cube_blocks_file:
+                    self.all_blocks[sub_type_id] = block
+
+    def compacted(self, kind: str, source_file: str, definitions: dict, compact_type) -> dict:
+        """
+        Turn a file's definitions into compact ones, swapping them into the cache so they aren't held twice
+
+        :param kind: the kind of definitions, e.g. "blocks" or "recipes"
+        :param source_file: path to the file the definitions came from
+        :param definitions: the definitions as dicts
+        :param compact_type: CompactBlock or CompactRecipe
+        :return: dict
+        """
+        compacted = {name: compact_type.from_dict(definition) for name, definition in definitions.items()}
 
-                if recipe.output_type_id is None:
+        if self.cache is not None:
+            self.cache.swap(kind, source_file, compacted)
+
+        return compacted
+
+    def drop_block_file(self, cube_blocks_file: str) -> None:
+        """
+        Remove the blocks loaded from a file, falling back to any earlier definitions of them
+
+        :param cube_blocks_file: path to the file
+        :return: None
+        """
+        entry = self.block_files.pop(cube_blocks_file)
+
+        for sub_type_id in entry["blocks"]:
+            sources = self.block_sources[sub_type_id]
+            sources.remove(cube_blocks_file)
+
+            if sources:
+                self.all_blocks[sub_type_id] = self.block_files[sources[-1]]["blocks"][sub_type_id]
+            else:
+                del self.block_sources[sub_type_id]
+                del self.all_blocks[sub_type_id]
+
+    def block_order(self, cube_blocks_file: str) -> tuple:
+        """
+        Where a block file comes in the load order, later files win on a clash
+
+        :param cube_blocks_file: path to a loaded file
+        :return: tuple
+        """
+        cube_blocks_path = self.block_files[cube_blocks_file]["dir"]
+
+        # the whole path, so discovered files in subdirectories are in order too
+        return self.block_dir_index[cube_blocks_path], cube_blocks_file
+
+    def scrape_files(self, kind: str, source_files: list, scrape, workers: int = 1) -> list:
+        """
+        Scrape definitions from files, using the cache where possible and a process pool for the rest
+
+        :param kind: the kind of definitions, e.g. "blocks" or "recipes"
+        :param source_files: paths to the files to scrape
+        :param scrape: the function that scrapes a file, must be a module level function
+        :param workers: number of processes to scrape files with
+        :return: list of definitions in the same order as source_files, None for files that failed
+        """
+        results = [None] * len(source_files)
+        missed = []
+        for index, source_file in enumerate(source_files):
+            if self.cache is not None:
+                results[index] = self.cache.get(kind, source_file)
+
+            if results[index] is None:
+                missed.append(index)
+
+        self.stats.count(f"{kind}_cache_hits", len(source_files) - len(missed))
+        self.stats.count(f"{kind}_cache_misses", len(missed))
+
+        missed_files = [source_files[index] for index in missed]
+        if self.stats.enabled:
+            # time each file where it is scraped, so the time can be put down to the directory, i.e. mod, it is in
+            scrape = functools.partial(timed, scrape)
+
+        with self.stats.stage(f"scrape_{kind}"):
+            if workers > 1 and len(missed_files) > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    chunk_size = max(1, len(missed_files) // (workers * 4))
+                    scraped = list(executor.map(scrape, missed_files, chunksize=chunk_size))
+            else:
+                scraped = [scrape(source_file) for source_file in missed_files]
+
+        if self.stats.enabled:
+            scraped = [self.record_scrape(kind, source_file, *timed_scrape)
+                       for source_file, timed_scrape in zip(missed_files, scraped)]
+
+        for index, definitions in zip(missed, scraped):
+            results[index] = definitions
+
+            if self.cache is not None and definitions is not None:
+                self.cache.put(kind, source_files[index], definitions)
+
+        return results
+
+    def record_scrape(self, kind: str, source_file: str, definitions: dict, wall_seconds: float,
+                      cpu_seconds: float) -> dict:
+        """
+        Add a scraped file's time and counts to the stats, under the directory it is loaded with
+
+        :param kind: the kind of definitions, e.g. "blocks" or "recipes"
+        :param source_file: path to the file that was scraped
+        :param definitions: what was scraped, None if the file failed to parse
+        :param wall_seconds: how long the scrape took
+        :param cpu_seconds: the CPU time of the scrape
+        :return: dict, the definitions
+        """
+        # a discovered file can be deeper in the Data directory, but is profiled with its CubeBlocks directory
+        source_dir = self.block_file_dirs.get(source_file, os.path.dirname(source_file))
+        self.stats.add_time(f"scrape_{kind}:{source_dir}", wall_seconds, cpu_seconds)
+        self.stats.count("files_parsed")
+        self.stats.count("bytes_parsed", file_size(source_file))
+
+        if definitions is None:
+            self.stats.count("parse_errors")
+            self.stats.count(f"parse_errors:{source_dir}")
+        else:
+            self.stats.count(f"{kind}_scraped", len(definitions))
+
+        return definitions
+
+
+def scrape_blocks_file(cube_blocks_file: str) -> dict:
+    """
+    Scrape the blocks from a single cube blocks file
+
+    :param cube_blocks_file: path to an .sbc file, or a file inside an archive
+    :return: dict, or None if the file could not be parsed
+    """
+    blocks = {}
+
+    try:
+        with open_source(cube_blocks_file) as source:
+            tree = ElementTree.parse(source)
+    except ElementTree.ParseError:
+        my_log.warn(f"Skipped due to ParseError: {cube_blocks_file}")
+        return None
+    except ARCHIVE_ERRORS as error:
+        my_log.warn(f"Skipped due to damaged archive: {cube_blocks_file}: {error!r}")
+        return None
+
+    for element in tree.getroot().iter("Definition"):
+        block = Block()
+        block.from_element(element)
+
+        if block.type_id is None:
+            my_log.warn(f"Skipped due to None type_id: {cube_blocks_file}")
+            continue
+        blocks[block.sub_type_id] = block.as_dict()
+
+    return blocks
+
+
+def scrape_block_sections(cube_blocks_file: str) -> dict:
+    """
+    Scrape the blocks from the CubeBlocks sections of any definitions file, letting go of everything else as it goes
+
+    :param cube_blocks_file: path to an .sbc file, or a file inside an archive
+    :return: dict, or None if the file could not be parsed
+    """
+    blocks = {}
+    sections = 0
+    parents = []
+    try:
+        with open_source(cube_blocks_file) as source:
+            for event, element in ElementTree.iterparse(source, events=("start", "end")):
+                if event == "start":
+                    parents.append(element)
+                    if element.tag == "CubeBlocks":
+                        sections += 1
                     continue
 
-                self.all_recipes[recipe.output_type_id] = recipe.as_dict()
+                parents.pop()
+                if element.tag == "CubeBlocks":
+                    sections -= 1
+                elif sections and element.tag == "Definition":
+                    block = Block()
+                    block.from_element(element)
+
+                    if block.type_id is None:
+                        my_log.warn(f"Skipped due to None type_id: {cube_blocks_file}")
+                    else:
+                        blocks[block.sub_type_id] = block.as_dict()
+                elif sections:
+                    # part of a definition, read with the rest of it
+                    continue
+
+                element.clear()
+                if parents:
+                    parents[-1].remove(element)
+
+    except ElementTree.ParseError:
+        my_log.warn(f"Skipped due to ParseError: {cube_blocks_file}")
+        return None
+    except ARCHIVE_ERRORS as error:
+        my_log.warn(f"Skipped due to damaged archive: {cube_blocks_file}: {error!r}")
+        return None
+
+    return blocks
+
+
+def scrape_recipes_file(recipes_file: str) -> dict:
+    """
+    Scrape the component recipes from a recipes blueprint file
+
+    :param recipes_file: path to an .sbc file, or a file inside an archive
+    :return: dict, or None if the file could not be parsed
+    """
+    recipes = {}
+
+    try:
+        with open_source(recipes_file) as source:
+            tree = ElementTree.parse(source)
+    except ElementTree.ParseError:
+        my_log.warn(f"Skipped due to ParseError: {recipes_file}")
+        return None
+    except ARCHIVE_ERRORS as error:
+        my_log.warn(f"Skipped due to damaged archive: {recipes_file}: {error!r}")
+        return None
+
+    for element in tree.getroot().iter("Blueprint"):
+        recipe = Recipe()
+        recipe.from_element(element)
+
+        if recipe.output_type_id is None:
+            continue
+
+        recipes[recipe.output_type_id] = recipe.as_dict()
 
-        except ElementTree.ParseError:
-            my_log.warn(f"Skipped due to ParseError: {recipes_file}")
+    return recipes
@@ -0,0 +1,410 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os.path
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from logbook import Logger
+
+from bp_checker import BLUEPRINT_MODES, BluePrintChecker
+from check_mats import cube_blocks_paths, load_config, load_scraper, log_setup
+from definition_snapshot import DefinitionSnapshot, write_snapshot
+from result_cache import CachingChecker, ResultCache
+
+
+my_log = Logger(__name__)
+
+# snapshots kept, the last executor's workers can still be starting up with the one before the newest
+SNAPSHOTS_KEPT = 2
+
+MAX_UPLOAD_BYTES = 1024 ** 3
+REASONS = {200: "OK",
+           400: "Bad Request",
+           404: "Not Found",
+           405: "Method Not Allowed",
+           413: "Payload Too Large"}
+
+
+class CheckServer:
+    """
+    Answers blueprint checks over HTTP, keeping the definitions loaded between requests
+    """
+    def __init__(self, config: dict, modded_blocks: bool = False, mode: str = "dom", workers: int = 1,
+                 poll_seconds: float = 5.0) -> None:
+        """
+        Create a CheckServer class
+
+        :param config: the loaded config
+        :param modded_blocks: load modded blocks from mods path
+        :param mode: how to read uploaded blueprints, see BluePrintChecker.check_blueprint
+        :param workers: number of processes to check blueprints with, 1 checks them on a thread
+        :param poll_seconds: how often to look for changed definition files
+        :return: None
+        """
+        self.config = config
+        self.modded_blocks = modded_blocks
+        self.mode = mode
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.scraper = None
+        self.checker = None
+        self.executor = None
+        self.snapshot_dir = None  # where the definitions snapshots for worker processes are written
+        self.snapshots = 0
+
+        # results are keyed by the definitions too, so they are kept when the definitions are reloaded
+        self.results = None
+        if config.get("result_cache") is not None:
+            self.results = ResultCache(**config["result_cache"])
+        self.grid_cache_options = config.get("grid_cache")
+        self.grids = None
+        if self.grid_cache_options is not None:
+            self.grids = ResultCache(**self.grid_cache_options)
+        self.caching = None
+
+    def load_checker(self) -> tuple:
+        """
+        Load the definitions into a new checker, this is slow so it is run off the event loop
+
+        :return: tuple from make_checker
+        """
+        self.scraper = load_scraper(config=self.config, modded_blocks=self.modded_blocks, workers=self.workers)
+
+        return self.make_checker()
+
+    def refresh_checker(self) -> tuple:
+        """
+        Reload just the definition files that have changed, off the event loop
+
+        :return: tuple from make_checker, or None if nothing changed
+        """
+        changed = self.scraper.refresh(cube_blocks_paths(config=self.config, modded_blocks=self.modded_blocks),
+                                       self.workers)
+        if not changed:
+            return None
+
+        if self.scraper.cache is not None:
+            self.scraper.cache.save()
+
+        return self.make_checker()
+
+    def make_checker(self) -> tuple:
+        """
+        Make a checker with a precompiled table from the scraper's definitions, and a snapshot of them for workers
+
+        :return: tuple of the BluePrintChecker and the snapshot file, None with only one worker
+        """
+        # copies, so refreshing the scraper never changes definitions under a running check
+        checker = BluePrintChecker(dict(self.scraper.all_blocks), dict(self.scraper.all_recipes))
+        checker.precompile()
+
+        snapshot_file = None
+        if self.workers > 1:
+            if self.snapshot_dir is None:
+                self.snapshot_dir = tempfile.mkdtemp(prefix="check_server_")
+            self.snapshots += 1
+            snapshot_file = os.path.join(self.snapshot_dir, f"definitions_{self.snapshots}.snapshot")
+            write_snapshot(snapshot_file, checker.blocks, checker.components, checker.block_table)
+
+        return checker, snapshot_file
+
+    async def reload(self) -> None:
+        """
+        Load all the definitions from scratch
+
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        self.swap_checker(*await loop.run_in_executor(None, self.load_checker))
+
+    async def check_for_changes(self) -> bool:
+        """
+        Reload the definition files that have changed
+
+        :return: bool, True if anything was reloaded
+        """
+        loop = asyncio.get_running_loop()
+        loaded = await loop.run_in_executor(None, self.refresh_checker)
+
+        if loaded is None:
+            return False
+
+        self.swap_checker(*loaded)
+
+        return True
+
+    def swap_checker(self, checker: BluePrintChecker, snapshot_file: str = None) -> None:
+        """
+        Start using a new checker, this must be called on the event loop
+
+        :param checker: the checker with the newly loaded definitions
+        :param snapshot_file: a snapshot of the definitions for worker processes to map
+        :return: None
+        """
+        if self.workers > 1:
+            # spawned rather than forked, a forked worker would hold on to open client sockets, the workers all map
+            # the one snapshot so a new worker is ready without being sent the definitions
+            executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=_init_server_checker,
+                                           initargs=(snapshot_file, self.grid_cache_options))
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+
+        # swapped on the event loop so a request never sees a checker without its executor,
+        # checks already queued on the old executor still finish
+        old_executor = self.executor
+        self.checker, self.executor = checker, executor
+        self.caching = CachingChecker(checker, self.results, self.grids)
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+        self.remove_old_snapshot()
+
+        my_log.info(f"Loaded {len(checker.blocks)} blocks and {len(checker.components)} recipes")
+
+    def remove_old_snapshot(self) -> None:
+        """
+        Remove the snapshot no executor uses any more
+
+        :return: None
+        """
+        if self.snapshot_dir is None or self.snapshots <= SNAPSHOTS_KEPT:
+            return None
+
+        old_file = os.path.join(self.snapshot_dir, f"definitions_{self.snapshots - SNAPSHOTS_KEPT}.snapshot")
+        try:
+            os.remove(old_file)
+        except OSError as error:
+            # on windows a worker that hasn't exited yet still has it mapped
+            my_log.warn(f"Could not remove old snapshot {old_file}: {error!r}")
+
+    async def watch(self) -> None:
+        """
+        Keep looking for changed definition files
+
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+
+            try:
+                await self.check_for_changes()
+                if self.results is not None:
+                    await asyncio.get_running_loop().run_in_executor(None, self.results.prune)
+            except OSError as error:
+                # most likely a mod being updated under us, keep the old definitions and try again later
+                my_log.warn(f"Could not reload definitions: {error!r}")
+
+    async def check(self, body: bytes) -> dict:
+        """
+        Check an uploaded blueprint without blocking the event loop
+
+        :param body: the blueprint xml
+        :return: dict
+        """
+        loop = asyncio.get_running_loop()
+
+        if not isinstance(self.executor, ProcessPoolExecutor):
+            return await loop.run_in_executor(self.executor, self.caching.check_bytes, body, self.mode)
+
+        # the result cache lives in this process, each worker keeps its own grid cache
+        caching = self.caching
+        key, result = await loop.run_in_executor(None, caching.cached_result, body)
+        if result is not None:
+            return result
+
+        result = await loop.run_in_executor(self.executor, _check_upload, body, self.mode)
+        if key is not None:
+            await loop.run_in_executor(None, caching.results.put, key, result)
+
+        return result
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Handle a single HTTP request
+
+        :return: None
+        """
+        try:
+            status, response = await self.respond(reader)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            status, response = 400, {"error": "Malformed request"}
+
+        payload = json.dumps(response).encode()
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + payload)
+
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            my_log.warn("Client went away before the response was sent")
+
+    async def respond(self, reader: asyncio.StreamReader) -> tuple:
+        """
+        Read a request and work out the response
+
+        :return: tuple of the status code and the response body
+        """
+        method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if path == "/health":
+            if method != "GET":
+                return 405, {"error": f"{method} not allowed on {path}"}
+
+            health = {"status": "ok",
+                      "blocks": len(self.checker.blocks),
+                      "recipes": len(self.checker.components)}
+            if self.results is not None:
+                health["result_cache"] = {"entries": len(self.results.entries),
+                                          "hits": self.results.hits,
+                                          "misses": self.results.misses}
+
+            return 200, health
+
+        if path != "/check":
+            return 404, {"error": f"Nothing at {path}"}
+
+        if method != "POST":
+            return 405, {"error": f"{method} not allowed on {path}"}
+
+        length = int(headers.get("content-length", 0))
+        if length > MAX_UPLOAD_BYTES:
+            return 413, {"error": f"Blueprints over {MAX_UPLOAD_BYTES} bytes are not accepted"}
+
+        body = await reader.readexactly(length)
+        try:
+            return 200, await self.check(body)
+        except Exception as error:
+            my_log.error(f"Could not check uploaded BP: {error!r}")
+            return 400, {"error": f"Could not check blueprint: {error!r}"}
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000, unix_socket: str = None) -> None:
+        """
+        Load the definitions and serve checks until cancelled
+
+        :param host: the address to listen on
+        :param port: the port to listen on
+        :param unix_socket: listen on this unix socket instead of host and port
+        :return: None
+        """
+        await self.reload()
+
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.handle, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+
+        my_log.info(f"Serving checks on {unix_socket or f'{host}:{port}'}")
+        watcher = asyncio.create_task(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.executor.shutdown()
+            if self.snapshot_dir is not None:
+                shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+
+
+_server_checker = None
+
+
+def _init_server_checker(snapshot_file: str, grid_cache_options: dict = None) -> None:
+    """
+    Give a server worker process its own checker, reading the definitions from the shared snapshot
+
+    :return: None
+    """
+    global _server_checker
+    checker = DefinitionSnapshot(snapshot_file).checker()
+    grids = ResultCache(**grid_cache_options) if grid_cache_options is not None else None
+    _server_checker = CachingChecker(checker, grids=grids)
+
+
+def _check_upload(body: bytes, mode: str) -> dict:
+    """
+    Check an uploaded blueprint in a server worker process
+
+    :return: dict
+    """
+    return _server_checker.check_bytes(body, mode)
+
+
+if __name__ == "__main__":
+    """
+    usage: server.py [-h] [-c [CONFIG]] [-mb | --modded-blocks] [-m {dom,stream,scan}] [-w WORKERS] [--host HOST]
+                     [--port PORT] [--unix-socket UNIX_SOCKET] [--poll POLL]
+
+    Serve blueprint checks with the definitions kept in memory
+
+    options:
+      -h, --help                      show this help message and exit
+      -c [CONFIG], --config [CONFIG]  override config.yaml with another, better yaml file
+      -mb, --modded-blocks            load modded blocks from mods path
+      -m {dom,stream,scan}, --mode {dom,stream,scan}
+                                      how to read the blueprint, stream keeps memory flat for huge blueprints,
+                                      scan searches the bytes for blocks and is fastest
+      -w WORKERS, --workers WORKERS   number of processes to check blueprints with
+      --host HOST                     the address to listen on
+      --port PORT                     the port to listen on
+      --unix-socket UNIX_SOCKET       listen on a unix socket instead
+      --poll POLL                     seconds between looking for changed definition files
+    """
+    argp = argparse.ArgumentParser(prog="server.py",
+                                   description="Serve blueprint checks with the definitions kept in memory")
+    argp.add_argument("-c", "--config",
+                      help="override config.yaml with another, better yaml file",
+                      type=str,
+                      nargs="?")
+    argp.add_argument("-mb", "--modded-blocks",
+                      help="load modded blocks from mods path",
+                      action=argparse.BooleanOptionalAction,
+                      default=False)
+    argp.add_argument("-m", "--mode",
+                      help="how to read the blueprint, stream keeps memory flat for huge blueprints, scan searches the "
+                           "bytes for blocks and is fastest",
+                      choices=BLUEPRINT_MODES,
+                      default="dom")
+    argp.add_argument("-w", "--workers",
+                      help="number of processes to check blueprints with",
+                      type=int,
+                      default=1)
+    argp.add_argument("--host",
+                      help="the address to listen on",
+                      type=str,
+                      default="127.0.0.1")
+    argp.add_argument("--port",
+                      help="the port to listen on",
+                      type=int,
+                      default=8000)
+    argp.add_argument("--unix-socket",
+                      help="listen on a unix socket instead",
+                      type=str)
+    argp.add_argument("--poll",
+                      help="seconds between looking for changed definition files",
+                      type=float,
+                      default=5.0)
+    args = argp.parse_args()
+
+    config = load_config(args.config)
+
+    with log_setup(config):
+        my_log.info("Starting check server")
+        my_log.info(f"With options: {vars(args)}")
+        check_server = CheckServer(config, args.modded_blocks, args.mode, args.workers, args.poll)
+        asyncio.run(check_server.serve(args.host, args.port, args.unix_socket))
@@ -0,0 +1,194 @@
+import os.path
+import time
+from contextlib import nullcontext
+
+from logbook import Logger
+
+
+class Stats:
+    """
+    Per-stage wall and CPU times plus counters, for finding out where a slow check or load spent its time
+    """
+    enabled = True
+
+    def __init__(self) -> None:
+        """
+        Create a Stats class
+
+        :return: None
+        """
+        self.stages = {}
+        self.counters = {}
+
+    def stage(self, name: str) -> "StageTimer":
+        """
+        Time a stage, use it as a context manager
+
+        :param name: the stage, timings for the same name add up
+        :return: StageTimer
+        """
+        return StageTimer(self, name)
+
+    def add_time(self, name: str, wall_seconds: float, cpu_seconds: float, calls: int = 1) -> None:
+        """
+        Add time spent in a stage
+
+        :param name: the stage
+        :param wall_seconds: wall clock time
+        :param cpu_seconds: CPU time of the process that did the work
+        :param calls: how many times the stage ran
+        :return: None
+        """
+        stage = self.stages.get(name)
+        if stage is None:
+            self.stages[name] = {"calls": calls, "wall_seconds": wall_seconds, "cpu_seconds": cpu_seconds}
+            return None
+
+        stage["calls"] += calls
+        stage["wall_seconds"] += wall_seconds
+        stage["cpu_seconds"] += cpu_seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """
+        Add to a counter
+
+        :param name: the counter, e.g. "files_parsed"
+        :param amount: how much to add
+        :return: None
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, other: "Stats") -> None:
+        """
+        Add another Stats' timings and counters to these
+
+        :param other: the stats to add
+        :return: None
+        """
+        for name, stage in other.stages.items():
+            self.add_time(name, stage["wall_seconds"], stage["cpu_seconds"], stage["calls"])
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+
+    @classmethod
+    def from_dict(cls, stats: dict) -> "Stats":
+        """
+        Make Stats from a dict given by as_dict, e.g. from a check result
+
+        :param stats: the stats as a dict
+        :return: Stats
+        """
+        made = cls()
+        for name, stage in stats["stages"].items():
+            made.add_time(name, stage["wall_seconds"], stage["cpu_seconds"], stage["calls"])
+        for name, amount in stats["counters"].items():
+            made.count(name, amount)
+
+        return made
+
+    def as_dict(self) -> dict:
+        """
+        Return the stats as a dict
+
+        :return: dict
+        """
+        return {"stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "counters": dict(self.counters)}
+
+    def emit(self, logger: Logger, title: str) -> None:
+        """
+        Log the stats, slowest stage first
+
+        :param logger: the logbook logger to log with
+        :param title: what the stats are for
+        :return: None
+        """
+        logger.info(f"{title} stats:")
+        for name, stage in sorted(self.stages.items(), key=lambda item: item[1]["wall_seconds"], reverse=True):
+            logger.info(f"  {name}: {stage['wall_seconds']:.4f}s wall, {stage['cpu_seconds']:.4f}s cpu, "
+                        f"{stage['calls']} calls")
+        for name, amount in sorted(self.counters.items()):
+            logger.info(f"  {name}: {amount}")
+
+
+class NullStats(Stats):
+    """
+    Stats that record nothing, used when instrumentation is off so the code timing stages doesn't need to check
+    """
+    enabled = False
+
+    def stage(self, name: str) -> nullcontext:
+        return NULL_STAGE
+
+    def add_time(self, name: str, wall_seconds: float, cpu_seconds: float, calls: int = 1) -> None:
+        return None
+
+    def count(self, name: str, amount: int = 1) -> None:
+        return None
+
+
+class StageTimer:
+    """
+    Times one run of a stage
+    """
+    __slots__ = ("stats", "name", "wall_started", "cpu_started")
+
+    def __init__(self, stats: Stats, name: str) -> None:
+        """
+        Create a StageTimer class
+
+        :param stats: the stats to add the time to
+        :param name: the stage
+        :return: None
+        """
+        self.stats = stats
+        self.name = name
+        self.wall_started = 0.0
+        self.cpu_started = 0.0
+
+    def __enter__(self) -> "StageTimer":
+        self.wall_started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stats.add_time(self.name, time.perf_counter() - self.wall_started,
+                            time.process_time() - self.cpu_started)
+
+
+NULL_STAGE = nullcontext()
+NO_STATS = NullStats()
+
+
+def source_size(source) -> int:
+    """
+    How many bytes a file to be parsed has, without reading it
+
+    :param source: a path or a file object
+    :return: int, 0 if it can't be told
+    """
+    if isinstance(source, (str, os.PathLike)):
+        try:
+            return os.path.getsize(source)
+        except OSError:
+            return 0
+
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer().nbytes
+
+    return 0
+
+
+def timed(scrape, source_file: str) -> tuple:
+    """
+    Run a scrape function and time it, this is module level so it also works in worker processes
+
+    :param scrape: a module level scrape function
+    :param source_file: the file to scrape
+    :return: tuple of the definitions, the wall time and the CPU time
+    """
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    definitions = scrape(source_file)
+
+    return definitions, time.perf_counter() - wall_started, time.process_time() - cpu_started
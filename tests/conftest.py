@@ -0,0 +1,32 @@
+import os
+import os.path
+import xml.etree.ElementTree as ElementTree
+
+
+def write_blocks(cube_blocks_path: str, file_name: str, sub_type_ids: list, count: int = 0,
+                 type_id: str = "CubeBlock") -> str:
+    """
+    Write a block file defining some blocks, each made of count steel plates
+
+    With a count, the file's mtime is set from it, so writing it again with another count is always seen as a change.
+    """
+    os.makedirs(cube_blocks_path, exist_ok=True)
+    definitions_element = ElementTree.Element("Definitions")
+    cube_blocks_element = ElementTree.SubElement(definitions_element, "CubeBlocks")
+    for sub_type_id in sub_type_ids:
+        block_element = ElementTree.SubElement(cube_blocks_element, "Definition")
+        block_id_element = ElementTree.SubElement(block_element, "Id")
+        ElementTree.SubElement(block_id_element, "TypeId").text = type_id
+        ElementTree.SubElement(block_id_element, "SubtypeId").text = sub_type_id
+        ElementTree.SubElement(block_element, "DisplayName").text = sub_type_id
+        component_element = ElementTree.SubElement(block_element, "Components")
+        if count:
+            ElementTree.SubElement(component_element, "Component",
+                                   attrib={"Subtype": "SteelPlate", "Count": str(count)})
+
+    file_path = os.path.join(cube_blocks_path, file_name)
+    ElementTree.ElementTree(definitions_element).write(file_path)
+    if count:
+        os.utime(file_path, ns=(count * 1000000000, count * 1000000000))
+
+    return file_path
@@ -0,0 +1,64 @@
+import os.path
+from tempfile import TemporaryDirectory
+
+from benchmark import generate_blueprint, generate_content, generate_mods, measure, run_benchmarks
+from bp_checker import BluePrintChecker
+from scraper import Scraper
+
+
+class TestBenchmark:
+    """
+    A test benchmark class for benchmark function tests
+    """
+    def test_generated_content_loads(self):
+        """
+        Generate content, mods and a blueprint that the scraper and checker can read
+        """
+        with TemporaryDirectory() as test_dir:
+            se_path = os.path.join(test_dir, "Content")
+            sub_type_ids = generate_content(se_path, 20, files=3)
+            sub_type_ids += generate_mods(os.path.join(test_dir, "mods"), 2, 5)
+            bp_file = os.path.join(test_dir, "bp.sbc")
+            generate_blueprint(bp_file, 101, sub_type_ids, grids=2)
+
+            scraper = Scraper()
+            scraper.load_blocks(os.path.join(se_path, "Data", "CubeBlocks"))
+            for mod in sorted(os.listdir(os.path.join(test_dir, "mods"))):
+                scraper.load_blocks(os.path.join(test_dir, "mods", mod, "Data", "CubeBlocks"))
+            scraper.load_recipes(os.path.join(se_path, "Data", "Blueprints.sbc"))
+
+            assert len(sub_type_ids) == 30
+            assert sorted(scraper.all_blocks) == sorted(sub_type_ids)
+            assert len(scraper.all_recipes) == 10
+
+            bpc = BluePrintChecker(scraper.all_blocks, scraper.all_recipes)
+            for mode in ["dom", "stream", "scan"]:
+                result = bpc.check_blueprint(bp_file, mode)
+                assert sum(result["blocks"].values()) == 101
+                assert result["unknown_blocks"] == []
+
+    def test_measure(self):
+        """
+        Measure a stage's timings, throughput and peak memory
+        """
+        stage = measure(lambda size: bytearray(size), repeats=4, items=10, setup=lambda: 1000000)
+
+        assert stage["repeats"] == 4
+        assert stage["seconds"]["max"] >= stage["seconds"]["p50"] > 0
+        assert stage["items_per_second"] > 0
+        assert stage["peak_bytes"] >= 1000000
+
+    def test_run_benchmarks(self):
+        """
+        Run every stage on a tiny generated tree
+        """
+        with TemporaryDirectory() as test_dir:
+            results = run_benchmarks(test_dir, block_types=10, files=2, mods=1, mod_block_types=5, bp_blocks=50,
+                                     repeats=1)
+
+        assert results["parameters"]["bp_blocks"] == 50
+        assert set(results["stages"]) == {"load_blocks", "load_blocks_modded", "load_recipes", "precompile",
+                                          "lookup_dict", "lookup_snapshot",
+                                          "check_blueprint_dom", "check_blueprint_dom_precompiled",
+                                          "check_blueprint_stream", "check_blueprint_stream_precompiled",
+                                          "check_blueprint_scan", "check_blueprint_scan_precompiled"}
@@ -1,10 +1,17 @@
+import io
 import os.path
 import xml.etree.ElementTree as ElementTree
 from tempfile import TemporaryDirectory
 
+import pytest
+import logbook
+
 from bp_checker import BluePrintChecker
 
 
+BP_FILE = os.path.join(os.path.dirname(__file__), "..", "blueprints", "bp.sbc")
+
+
 class TestBluePrintChecker:
     """
     A test blue print checker class for BluePrintChecker class tests
@@ -191,3 +198,438 @@ class TestBluePrintChecker:
 
         assert mats["materials"] == {"Iron": 210.0}
         assert mats["unknown_components"] == ["AnotherComponent"]
+
+    def test_stream_blocks(self):
+        """
+        Stream the blocks quantity from a blueprint file
+        """
+        bpc = BluePrintChecker({}, {})
+
+        blocks = bpc.stream_blocks(BP_FILE)
+
+        assert blocks == bpc.check_blocks(bpc.open_blueprint(BP_FILE))
+        assert sum(blocks.values()) == 128
+
+    def test_stream_non_xml_bp(self):
+        """
+        Stream a blueprint file that isn't XML
+        """
+        bpc = BluePrintChecker({}, {})
+
+        with TemporaryDirectory() as test_dir:
+            xml_path = os.path.join(test_dir, "my_bp_file.xml")
+            with open(xml_path, "w") as xml_file:
+                xml_file.write("Some non-XML text")
+
+            assert bpc.stream_blocks(xml_path) == {}
+
+    def test_scan_blocks(self):
+        """
+        Scan the blocks quantity from a blueprint file's bytes, and from a file object
+        """
+        bpc = BluePrintChecker({}, {})
+
+        blocks = bpc.scan_blocks(BP_FILE)
+
+        assert blocks == bpc.check_blocks(bpc.open_blueprint(BP_FILE))
+        with open(BP_FILE, "rb") as blueprint_file:
+            assert bpc.scan_blocks(io.BytesIO(blueprint_file.read())) == blocks
+
+    def test_scan_blocks_file_object(self):
+        """
+        Stream a file object other than a BytesIO, which can only be read once, rather than scanning it
+        """
+        bpc = BluePrintChecker({}, {})
+
+        with open(BP_FILE, "rb") as blueprint_file:
+            assert bpc.scan_blocks(blueprint_file) is None
+            assert blueprint_file.tell() == 0
+            assert bpc.count_blocks(blueprint_file, "scan") == bpc.scan_blocks(BP_FILE) != {}
+
+    @pytest.mark.parametrize("block", [
+        "<!-- <MyObjectBuilder_CubeBlock><SubtypeName>Hidden</SubtypeName></MyObjectBuilder_CubeBlock> -->",
+        '<MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock"><SubtypeName>A&amp;B</SubtypeName>'
+        '</MyObjectBuilder_CubeBlock>',
+        '<MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_Reactor"><SubtypeName />'
+        '</MyObjectBuilder_CubeBlock>',
+        '<MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock"><EntityId>1</EntityId>'
+        '<SubtypeName>Later</SubtypeName></MyObjectBuilder_CubeBlock>'
+    ])
+    def test_scan_blocks_falls_back(self, block):
+        """
+        Give up scanning anything a byte search could get wrong, and count it by parsing instead
+        """
+        blueprint = f"""<?xml version="1.0"?>
+<Definitions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">
+    <SubtypeName>LargeBlockArmorBlock</SubtypeName>
+  </MyObjectBuilder_CubeBlock>
+  {block}
+</Definitions>
+"""
+
+        with TemporaryDirectory() as test_dir:
+            bp_file = os.path.join(test_dir, "bp.sbc")
+            with open(bp_file, "w") as blueprint_file:
+                blueprint_file.write(blueprint)
+
+            bpc = BluePrintChecker({}, {}, instrument=True)
+
+            assert bpc.scan_blocks(bp_file) is None
+            assert bpc.count_blocks(bp_file, "scan") == bpc.stream_blocks(bp_file)
+            assert bpc.check_blueprint(bp_file, "scan")["stats"]["counters"]["scan_fallbacks"] == 1
+
+    def test_scan_empty_bp(self):
+        """
+        Scan a blueprint file that is empty or in another encoding
+        """
+        bpc = BluePrintChecker({}, {})
+
+        with TemporaryDirectory() as test_dir:
+            bp_file = os.path.join(test_dir, "bp.sbc")
+            open(bp_file, "w").close()
+
+            assert bpc.scan_blocks(bp_file) is None
+            assert bpc.count_blocks(bp_file, "scan") == {}
+
+            with open(bp_file, "w", encoding="utf-16") as blueprint_file:
+                blueprint_file.write('<?xml version="1.0" encoding="utf-16"?><Definitions />')
+
+            assert bpc.scan_blocks(bp_file) is None
+
+    def test_check_blueprint_modes(self):
+        """
+        Check a blueprint the same way in every mode
+        """
+        all_blocks = {
+          "SmallBlockMediumContainer": {
+            "type_id": "CargoContainer",
+            "sub_type_id": "SmallBlockMediumContainer",
+            "display_name": "DisplayName_Block_MediumContainer",
+            "components": {
+              "SteelPlate": 12,
+              "Construction": 8
+            }
+          }
+        }
+        all_recipes = {
+            "SteelPlate": {
+                "materials": {
+                    "Iron": 21.0
+                },
+                "output_type_id": "SteelPlate",
+                "output_quantity": 1.0
+            }
+        }
+
+        bpc = BluePrintChecker(all_blocks, all_recipes)
+
+        assert bpc.check_blueprint(BP_FILE, "stream") == bpc.check_blueprint(BP_FILE)
+        assert bpc.check_blueprint(BP_FILE, "scan") == bpc.check_blueprint(BP_FILE)
+
+        with pytest.raises(ValueError):
+            bpc.check_blueprint(BP_FILE, "telepathy")
+
+    def test_precompile(self):
+        """
+        Check blocks with the precompiled table the same as with the two stage path
+        """
+        all_blocks = {
+          "LargeRailStraight": {
+            "type_id": "CubeBlock",
+            "sub_type_id": "LargeRailStraight",
+            "display_name": "LargeRailStraight",
+            "components": {
+              "SteelPlate": 12,
+              "Construction": 8,
+              "MysteryComponent": 1
+            }
+          },
+          "SmallBlockArmorBlock": {
+            "type_id": "CubeBlock",
+            "sub_type_id": "SmallBlockArmorBlock",
+            "display_name": "SmallBlockArmorBlock",
+            "components": {
+              "SteelPlate": 1
+            }
+          }
+        }
+        all_recipes = {
+            "SteelPlate": {
+                "materials": {
+                    "Iron": 21.0
+                },
+                "output_type_id": "SteelPlate",
+                "output_quantity": 1.0
+            },
+            "Construction": {
+                "materials": {
+                    "Iron": 8.0,
+                    "Nickel": 0.5
+                },
+                "output_type_id": "Construction",
+                "output_quantity": 1.0
+            }
+        }
+        used_blocks = {
+            "LargeRailStraight": 2,
+            "SmallBlockArmorBlock": 7,
+            "AnotherBlock": 5
+        }
+
+        bpc = BluePrintChecker(all_blocks, all_recipes)
+        with logbook.TestHandler() as expected_log:
+            expected = bpc.check_counts(used_blocks)
+        bpc.precompile()
+
+        with logbook.TestHandler() as table_log:
+            assert bpc.check_counts(used_blocks) == expected
+        assert table_log.formatted_records == expected_log.formatted_records
+        assert table_log.has_warning("Unknown component type: MysteryComponent")
+        assert expected["materials_estimate"] == {"Iron": 779.0, "Nickel": 8.0}
+        assert bpc.check_blueprint(BP_FILE)["unknown_blocks"] == \
+            BluePrintChecker(all_blocks, all_recipes).check_blueprint(BP_FILE)["unknown_blocks"]
+
+    def test_check_blueprint_instrumented(self):
+        """
+        Check a blueprint with stats for every stage, giving the same result otherwise
+        """
+        all_blocks = {
+          "SmallBlockMediumContainer": {
+            "type_id": "CargoContainer",
+            "sub_type_id": "SmallBlockMediumContainer",
+            "display_name": "DisplayName_Block_MediumContainer",
+            "components": {
+              "SteelPlate": 12
+            }
+          }
+        }
+
+        expected = BluePrintChecker(all_blocks, {}).check_blueprint(BP_FILE)
+        bpc = BluePrintChecker(all_blocks, {}, instrument=True)
+
+        result = bpc.check_blueprint(BP_FILE)
+        stats = result.pop("stats")
+
+        assert result == expected
+        assert set(stats["stages"]) == {"check_blueprint", "open_blueprint", "check_blocks", "check_components",
+                                        "check_mats"}
+        assert stats["stages"]["check_blueprint"]["wall_seconds"] >= stats["stages"]["open_blueprint"]["wall_seconds"]
+        assert stats["counters"]["files_parsed"] == 1
+        assert stats["counters"]["bytes_parsed"] == os.path.getsize(BP_FILE)
+        assert stats["counters"]["cube_blocks"] == sum(expected["blocks"].values())
+        assert stats["counters"]["unknown_blocks"] == len(expected["unknown_blocks"])
+
+        bpc.precompile()
+        stats = bpc.check_blueprint(BP_FILE, "stream")["stats"]
+
+        assert set(stats["stages"]) == {"check_blueprint", "stream_blocks", "check_table"}
+
+    def test_referenced_mods(self):
+        """
+        Read the mods a blueprint lists, by workshop id or by name for local mods
+        """
+        blueprint = """<?xml version="1.0"?>
+<Definitions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <ShipBlueprints>
+    <ShipBlueprint>
+      <CubeGrids>
+        <CubeGrid>
+          <CubeBlocks>
+            <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">
+              <SubtypeName>ModdedArmor</SubtypeName>
+            </MyObjectBuilder_CubeBlock>
+          </CubeBlocks>
+        </CubeGrid>
+      </CubeGrids>
+      <Mods>
+        <ModItem FriendlyName="Modded Armor">
+          <Name>123456.sbm</Name>
+          <PublishedFileId>123456</PublishedFileId>
+        </ModItem>
+        <ModItem FriendlyName="My Local Mod">
+          <Name>MyLocalMod</Name>
+          <PublishedFileId>0</PublishedFileId>
+        </ModItem>
+      </Mods>
+    </ShipBlueprint>
+  </ShipBlueprints>
+</Definitions>
+"""
+
+        with TemporaryDirectory() as test_dir:
+            bp_file = os.path.join(test_dir, "bp.sbc")
+            with open(bp_file, "w") as blueprint_file:
+                blueprint_file.write(blueprint)
+
+            assert BluePrintChecker.referenced_mods(bp_file) == ["123456", "MyLocalMod"]
+
+        assert BluePrintChecker.referenced_mods(BP_FILE) == []
+
+    def test_check_blueprint_breakdown(self):
+        """
+        Give each grid's and each grid size's totals, adding up to the same totals as without them
+        """
+        all_blocks = {
+          "SmallBlockMediumContainer": {
+            "type_id": "CargoContainer",
+            "sub_type_id": "SmallBlockMediumContainer",
+            "display_name": "DisplayName_Block_MediumContainer",
+            "components": {
+              "SteelPlate": 12
+            }
+          }
+        }
+        all_recipes = {
+            "SteelPlate": {
+                "materials": {
+                    "Iron": 21.0
+                },
+                "output_type_id": "SteelPlate",
+                "output_quantity": 1.0
+            }
+        }
+
+        bpc = BluePrintChecker(all_blocks, all_recipes)
+        expected = bpc.check_blueprint(BP_FILE)
+
+        for mode in ["dom", "stream", "scan"]:
+            result = bpc.check_blueprint(BP_FILE, mode, breakdown=True)
+
+            assert {key: result[key] for key in expected} == expected
+            assert [(grid["grid_size"], grid["display_name"], sum(grid["blocks"].values()))
+                    for grid in result["grids"]] == [("Small", "SmallCargoDrone", 99),
+                                                     ("Small", "Small Grid 9063", 12),
+                                                     ("Small", "Small Grid 8913", 17)]
+            assert result["grids"][0]["components"] == {"SteelPlate": 24}
+            assert result["grid_sizes"]["Small"]["materials_estimate"] == {"Iron": 504.0}
+
+    def test_count_grids_loose_blocks(self):
+        """
+        Count blocks outside any grid in a grid of their own, and the grid's own name but not a block's
+        """
+        blueprint = """<Definitions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <CubeGrid>
+    <GridSizeEnum>Large</GridSizeEnum>
+    <CubeBlocks>
+      <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">
+        <SubtypeName>LargeBlockArmorBlock</SubtypeName>
+        <DisplayName>Not the grid's name</DisplayName>
+      </MyObjectBuilder_CubeBlock>
+    </CubeBlocks>
+    <DisplayName>Large Grid 1</DisplayName>
+  </CubeGrid>
+  <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">
+    <SubtypeName>LargeBlockArmorBlock</SubtypeName>
+  </MyObjectBuilder_CubeBlock>
+</Definitions>
+"""
+
+        with TemporaryDirectory() as test_dir:
+            bp_file = os.path.join(test_dir, "bp.sbc")
+            with open(bp_file, "w") as blueprint_file:
+                blueprint_file.write(blueprint)
+
+            bpc = BluePrintChecker({}, {})
+            grids = bpc.count_grids(bp_file, "stream")
+
+            assert grids == [{"grid_size": "Large", "display_name": "Large Grid 1",
+                              "blocks": {"LargeBlockArmorBlock": 1}},
+                             {"grid_size": None, "display_name": None, "blocks": {"LargeBlockArmorBlock": 1}}]
+            assert list(bpc.check_grids(grids)["grid_sizes"]) == ["Large", "Unknown"]
+
+            with open(bp_file, "w") as blueprint_file:
+                blueprint_file.write("Some non-XML text")
+
+            assert bpc.count_grids(bp_file) == []
+
+    def test_check_remaining(self):
+        """
+        Check what is left to build of partly built and damaged blocks, less what is in their stockpiles
+        """
+        blueprint = """<Definitions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <CubeGrid>
+    <CubeBlocks>
+      <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">
+        <SubtypeName>Frame</SubtypeName>
+      </MyObjectBuilder_CubeBlock>
+      <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">
+        <SubtypeName>Frame</SubtypeName>
+        <BuildPercent>0.5</BuildPercent>
+        <IntegrityPercent>0.5</IntegrityPercent>
+      </MyObjectBuilder_CubeBlock>
+      <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">
+        <SubtypeName>Frame</SubtypeName>
+        <IntegrityPercent>0.25</IntegrityPercent>
+        <ConstructionStockpile>
+          <Items>
+            <MyObjectBuilder_StockpileItem>
+              <Amount>2</Amount>
+              <PhysicalContent xsi:type="MyObjectBuilder_Component">
+                <SubtypeName>SteelPlate</SubtypeName>
+              </PhysicalContent>
+            </MyObjectBuilder_StockpileItem>
+          </Items>
+        </ConstructionStockpile>
+      </MyObjectBuilder_CubeBlock>
+    </CubeBlocks>
+  </CubeGrid>
+</Definitions>
+"""
+        all_blocks = {"Frame": {"components": {"Construction": 4, "SteelPlate": 6}}}
+        all_recipes = {"Construction": {"materials": {"Iron": 8.0}},
+                       "SteelPlate": {"materials": {"Iron": 21.0}}}
+
+        with TemporaryDirectory() as test_dir:
+            bp_file = os.path.join(test_dir, "bp.sbc")
+            with open(bp_file, "w") as blueprint_file:
+                blueprint_file.write(blueprint)
+
+            bpc = BluePrintChecker(all_blocks, all_recipes, instrument=True)
+            blocks, partial_blocks = bpc.count_build_state(bp_file)
+            result = bpc.check_blueprint(bp_file, remaining=True)
+
+            assert blocks == {"Frame": 3}
+            assert partial_blocks == [("Frame", 0.5, {}), ("Frame", 0.25, {"SteelPlate": 2})]
+            assert result["components"] == {"Construction": 12, "SteelPlate": 18}
+            # half built has its 4 construction and 1 plate in, a quarter has 2 construction and 2 plates waiting
+            assert result["remaining_components"] == {"SteelPlate": 9, "Construction": 2}
+            assert result["remaining_materials"] == {"Iron": 205.0}
+            assert result["stats"]["counters"]["partial_blocks"] == 2
+
+            with pytest.raises(ValueError):
+                bpc.check_blueprint(bp_file, breakdown=True, remaining=True)
+
+    @pytest.mark.parametrize("build_percent, integrity_percent, bad_percent, partial_blocks", [
+        ("half", "0.5", "BuildPercent 'half'", [("Frame", 0.5, {})]),
+        ("0.5", "NaN", "IntegrityPercent 'NaN'", [("Frame", 0.5, {})]),
+        ("", "1,5", "IntegrityPercent '1,5'", [])
+    ])
+    def test_count_build_state_bad_percent(self, build_percent, integrity_percent, bad_percent, partial_blocks):
+        """
+        Count a block whose percent isn't a number as finished, rather than failing the check
+        """
+        element = ElementTree.fromstring(f"<MyObjectBuilder_CubeBlock><SubtypeName>Frame</SubtypeName>"
+                                         f"<BuildPercent>{build_percent}</BuildPercent>"
+                                         f"<IntegrityPercent>{integrity_percent}</IntegrityPercent>"
+                                         f"</MyObjectBuilder_CubeBlock>")
+
+        with TemporaryDirectory() as test_dir:
+            bp_file = os.path.join(test_dir, "bp.sbc")
+            ElementTree.ElementTree(element).write(bp_file)
+
+            with logbook.TestHandler() as handler:
+                assert BluePrintChecker({}, {}).count_build_state(bp_file) == ({"Frame": 1}, partial_blocks)
+
+            assert handler.has_warning(f"Bad {bad_percent} on a Frame, counting it as finished")
+
+    def test_check_remaining_finished(self):
+        """
+        Check a blueprint with only finished blocks, which has nothing left to build
+        """
+        bpc = BluePrintChecker({"SmallBlockMediumContainer": {"components": {"SteelPlate": 12}}}, {})
+
+        result = bpc.check_blueprint(BP_FILE, remaining=True)
+
+        assert result["remaining_components"] == {}
+        assert result["blocks"] == bpc.count_blocks(BP_FILE)
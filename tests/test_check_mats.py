@@ -0,0 +1,190 @@
+import io
+import json
+import os.path
+import shutil
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from benchmark import generate_content
+from bp_checker import BluePrintChecker
+from check_mats import check_blueprints, check_mats, cube_blocks_paths, find_blueprints, percentile
+from definition_cache import DefinitionCache
+
+
+BP_FILE = os.path.join(os.path.dirname(__file__), "..", "blueprints", "bp.sbc")
+
+
+class TestCheckMats:
+    """
+    A test check mats class for check_mats function tests
+    """
+    def test_find_blueprints_in_directory(self):
+        """
+        Find every bp.sbc under a directory
+        """
+        with TemporaryDirectory() as test_dir:
+            for name in ["ship-a", "ship-b"]:
+                os.mkdir(os.path.join(test_dir, name))
+                shutil.copy(BP_FILE, os.path.join(test_dir, name, "bp.sbc"))
+            with open(os.path.join(test_dir, "ship-a", "thumb.png"), "w") as thumb_file:
+                thumb_file.write("not a blueprint")
+
+            bp_files = find_blueprints(test_dir)
+
+            assert bp_files == [os.path.join(test_dir, "ship-a", "bp.sbc"),
+                                os.path.join(test_dir, "ship-b", "bp.sbc")]
+
+    def test_find_blueprints_with_glob(self):
+        """
+        Find every file matching a glob
+        """
+        with TemporaryDirectory() as test_dir:
+            shutil.copy(BP_FILE, os.path.join(test_dir, "one.sbc"))
+            shutil.copy(BP_FILE, os.path.join(test_dir, "two.sbc"))
+
+            bp_files = find_blueprints(os.path.join(test_dir, "*.sbc"))
+
+            assert len(bp_files) == 2
+
+    def test_check_blueprints(self):
+        """
+        Check several blueprints with one checker, in and out of process
+        """
+        all_blocks = {
+          "SmallBlockMediumContainer": {
+            "type_id": "CargoContainer",
+            "sub_type_id": "SmallBlockMediumContainer",
+            "display_name": "DisplayName_Block_MediumContainer",
+            "components": {
+              "SteelPlate": 12
+            }
+          }
+        }
+
+        bpc = BluePrintChecker(all_blocks, {})
+        expected = bpc.check_blueprint(BP_FILE)
+
+        with TemporaryDirectory() as test_dir:
+            missing_file = os.path.join(test_dir, "missing.sbc")
+
+            for workers in [1, 2]:
+                results_file = io.StringIO()
+                summary = check_blueprints(bpc, [BP_FILE, BP_FILE, missing_file], results_file, workers=workers)
+                lines = [json.loads(line) for line in results_file.getvalue().splitlines()]
+
+                assert summary["blueprints"] == 3
+                assert summary["failed"] == 1
+                assert summary["latency_seconds"]["max"] >= summary["latency_seconds"]["p50"]
+                assert [line["file"] for line in lines] == [BP_FILE, BP_FILE, missing_file]
+                assert lines[0]["result"] == expected
+                assert lines[1]["result"] == expected
+                assert "error" in lines[2]
+
+    def test_percentile(self):
+        """
+        Get the nearest rank percentile of some values
+        """
+        values = [1.0, 2.0, 3.0, 4.0]
+
+        assert percentile(values, 0.5) == 2.0
+        assert percentile(values, 0.95) == 4.0
+        assert percentile(values, 0.0) == 1.0
+        assert percentile([], 0.5) == 0.0
+
+    def test_cube_blocks_paths_for_some_mods(self):
+        """
+        List vanilla and only the mods asked for
+        """
+        with TemporaryDirectory() as test_dir:
+            for mod in ["111", "222", "333"]:
+                os.mkdir(os.path.join(test_dir, mod))
+            config = {"se_path": "Content", "mods_path": test_dir}
+
+            assert len(cube_blocks_paths(config=config, modded_blocks=True)) == 4
+            assert cube_blocks_paths(config=config, modded_blocks=True, mod_ids=["222", "444"]) == \
+                [os.path.join("Content", "Data", "CubeBlocks"), os.path.join(test_dir, "222", "Data", "CubeBlocks")]
+
+    def test_check_mats_lazy_mods(self):
+        """
+        Load only the mods a blueprint's blocks need, with the same result as loading them all
+        """
+        with TemporaryDirectory() as test_dir:
+            config = {"se_path": os.path.join(test_dir, "Content"), "mods_path": os.path.join(test_dir, "mods"),
+                      "cache_path": os.path.join(test_dir, "definitions.json")}
+            generate_content(config["se_path"], 5)
+            generate_content(os.path.join(config["mods_path"], "111"), 5, prefix="Unused")
+            generate_content(os.path.join(config["mods_path"], "222"), 1, prefix="SmallBlockMediumContainer")
+            mod_file = os.path.join(config["mods_path"], "222", "Data", "CubeBlocks", "CubeBlocks_0.sbc")
+            with open(mod_file) as sbc_file:
+                contents = sbc_file.read().replace("SmallBlockMediumContainer0<", "SmallBlockMediumContainer<")
+            with open(mod_file, "w") as sbc_file:
+                sbc_file.write(contents)
+
+            lazy = check_mats(config=config, file=BP_FILE, modded_blocks=True, lazy_mods=True)
+            cache = DefinitionCache(config["cache_path"])
+            cache.load()
+            eager = check_mats(config=config, file=BP_FILE, modded_blocks=True)
+
+            assert lazy == eager
+            assert "SmallBlockMediumContainer" not in lazy["unknown_blocks"]
+            assert sorted(os.path.relpath(source_file, test_dir) for source_file in cache.entries["blocks"]) == \
+                [os.path.join("Content", "Data", "CubeBlocks", "CubeBlocks_0.sbc"),
+                 os.path.join("mods", "222", "Data", "CubeBlocks", "CubeBlocks_0.sbc")]
+            assert len(cache.entries["subtypes"]) == 2
+
+    def test_check_mats_lazy_grids(self):
+        """
+        Give the same per grid breakdown with lazy mods as with every mod loaded
+        """
+        with TemporaryDirectory() as test_dir:
+            config = {"se_path": os.path.join(test_dir, "Content"), "mods_path": os.path.join(test_dir, "mods")}
+            generate_content(config["se_path"], 5)
+            generate_content(os.path.join(config["mods_path"], "111"), 5, prefix="Unused")
+
+            lazy = check_mats(config=config, file=BP_FILE, modded_blocks=True, lazy_mods=True, grids=True)
+            eager = check_mats(config=config, file=BP_FILE, modded_blocks=True, grids=True)
+
+            assert lazy == eager
+            assert "grids" in lazy and "grid_sizes" in lazy
+            with pytest.raises(ValueError):
+                check_mats(config=config, file=BP_FILE, modded_blocks=True, lazy_mods=True, grids=True,
+                           remaining=True)
+
+    def test_check_mats_lazy_stats(self):
+        """
+        Give the stats of a lazy check, with the mod loading timed too
+        """
+        with TemporaryDirectory() as test_dir:
+            config = {"se_path": os.path.join(test_dir, "Content"), "mods_path": os.path.join(test_dir, "mods")}
+            generate_content(config["se_path"], 5)
+            generate_content(os.path.join(config["mods_path"], "111"), 5, prefix="Unused")
+
+            lazy = check_mats(config=config, file=BP_FILE, modded_blocks=True, lazy_mods=True, stats=True)
+            remaining = check_mats(config=config, file=BP_FILE, modded_blocks=True, lazy_mods=True, stats=True,
+                                   remaining=True)
+
+            for result in [lazy, remaining]:
+                assert {"check_mats_lazy", "load_mods"} <= result["stats"]["stages"].keys()
+                assert result["stats"]["counters"]["mods_loaded"] == 0
+                assert result["stats"]["counters"]["files_parsed"] == 1
+                assert result["stats"]["counters"]["unknown_blocks"] == len(result["unknown_blocks"])
+            assert "count_build_state" in remaining["stats"]["stages"]
+            assert check_mats(config=config, file=BP_FILE, modded_blocks=True, lazy_mods=True).keys() == \
+                lazy.keys() - {"stats"}
+
+    def test_check_mats_plan(self):
+        """
+        Add a production plan to the result, components nothing makes are inputs to it
+        """
+        with TemporaryDirectory() as test_dir:
+            config = {"se_path": os.path.join(test_dir, "Content"), "factory": {"assemblers": 2}}
+            generate_content(config["se_path"], 5)
+
+            result = check_mats(config=config, file=BP_FILE, modded_blocks=False, plan=True)
+
+            assert result["production"]["makespan_seconds"] == 0.0
+            assert result["production"]["inputs"] == {f"Component/{component}": c_quantity
+                                                      for component, c_quantity in result["components"].items()}
+            assert [machine["name"] for machine in result["production"]["machines"]] == ["assembler-1",
+                                                                                         "assembler-2"]
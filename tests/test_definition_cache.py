@@ -0,0 +1,110 @@
+import os.path
+from tempfile import TemporaryDirectory
+
+from definition_cache import DefinitionCache
+
+
+class TestDefinitionCache:
+    """
+    A test definition cache class for DefinitionCache class tests
+    """
+    def test_new_cache(self):
+        """
+        Make a new empty cache
+        """
+        cache = DefinitionCache("cache.json")
+
+        assert cache.cache_file == "cache.json"
+        assert cache.entries == {}
+        assert cache.hits == 0
+        assert cache.misses == 0
+
+    def test_put_and_get(self):
+        """
+        Get definitions back out of the cache for an unchanged file
+        """
+        definitions = {"MyBlock": {"components": {"SteelPlate": 10}}}
+
+        with TemporaryDirectory() as test_dir:
+            source_file = os.path.join(test_dir, "blocks.sbc")
+            with open(source_file, "w") as sbc_file:
+                sbc_file.write("<Definitions />")
+
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+            cache.put("blocks", source_file, definitions)
+
+            assert cache.get("blocks", source_file) == definitions
+            assert cache.get("recipes", source_file) is None
+            assert cache.hits == 1
+            assert cache.misses == 1
+
+    def test_get_changed_file(self):
+        """
+        Miss the cache when the source file has changed
+        """
+        with TemporaryDirectory() as test_dir:
+            source_file = os.path.join(test_dir, "blocks.sbc")
+            with open(source_file, "w") as sbc_file:
+                sbc_file.write("<Definitions />")
+
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+            cache.put("blocks", source_file, {})
+
+            with open(source_file, "w") as sbc_file:
+                sbc_file.write("<Definitions></Definitions>")
+
+            assert cache.get("blocks", source_file) is None
+
+    def test_save_and_load(self):
+        """
+        Save a cache to disk and load it again
+        """
+        definitions = {"MyBlock": {"components": {"SteelPlate": 10}}}
+
+        with TemporaryDirectory() as test_dir:
+            source_file = os.path.join(test_dir, "blocks.sbc")
+            with open(source_file, "w") as sbc_file:
+                sbc_file.write("<Definitions />")
+
+            cache_file = os.path.join(test_dir, "cache", "cache.json")
+            cache = DefinitionCache(cache_file)
+            cache.put("blocks", source_file, definitions)
+            cache.save()
+
+            assert os.path.isfile(cache_file)
+            assert cache.dirty is False
+
+            another_cache = DefinitionCache(cache_file)
+            another_cache.load()
+
+            assert another_cache.get("blocks", source_file) == definitions
+
+    def test_load_non_json_cache(self):
+        """
+        Load a cache file that isn't json
+        """
+        with TemporaryDirectory() as test_dir:
+            cache_file = os.path.join(test_dir, "cache.json")
+            with open(cache_file, "w") as cache_json:
+                cache_json.write("Some non-json text")
+
+            cache = DefinitionCache(cache_file)
+            cache.load()
+
+            assert cache.entries == {}
+
+    def test_prune(self):
+        """
+        Prune entries for files that have been removed
+        """
+        with TemporaryDirectory() as test_dir:
+            source_file = os.path.join(test_dir, "blocks.sbc")
+            with open(source_file, "w") as sbc_file:
+                sbc_file.write("<Definitions />")
+
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+            cache.put("blocks", source_file, {})
+            os.remove(source_file)
+            cache.prune()
+
+            assert cache.entries == {"blocks": {}}
@@ -0,0 +1,206 @@
+import gc
+import io
+import json
+import os.path
+import pickle
+import tracemalloc
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from bp_checker import BluePrintChecker
+from check_mats import check_blueprints
+import definition_snapshot
+from benchmark import lookup_blocks
+from definition_snapshot import DefinitionSnapshot, SnapshotQuantities, fnv1a, write_snapshot
+from models import CompactBlock
+
+BP_FILE = os.path.join(os.path.dirname(__file__), "..", "blueprints", "bp.sbc")
+
+BLOCKS = {f"Block{index}": {"type_id": "CubeBlock",
+                            "sub_type_id": f"Block{index}",
+                            "display_name": f"Bloc n°{index}" if index % 2 else None,
+                            "components": {"SteelPlate": index + 1, "Computer": 2}}
+          for index in range(300)}
+RECIPES = {"SteelPlate": {"materials": {"Iron": 21.0}, "output_type_id": "SteelPlate", "output_quantity": 1.0},
+           "Computer": {"materials": {"Iron": 0.5, "Silicon": 0.2}, "output_type_id": "Computer",
+                        "output_quantity": None}}
+
+
+class TestDefinitionSnapshot:
+    """
+    A test definition snapshot class for DefinitionSnapshot class tests
+    """
+    def test_round_trip(self):
+        """
+        Read back the definitions a snapshot was written with, looked up by name or iterated in order
+        """
+        with TemporaryDirectory() as test_dir:
+            snapshot_file = os.path.join(test_dir, "definitions.snapshot")
+            write_snapshot(snapshot_file, BLOCKS, RECIPES)
+            snapshot = DefinitionSnapshot(snapshot_file)
+
+            assert list(snapshot.blocks) == list(BLOCKS)
+            assert {name: dict(block) for name, block in snapshot.blocks.items()} == BLOCKS
+            assert {name: recipe.as_dict() for name, recipe in snapshot.recipes.items()} == RECIPES
+            assert "Block7" in snapshot.blocks
+            assert "Block300" not in snapshot.blocks
+            assert snapshot.blocks.get("Missing") is None
+            with pytest.raises(KeyError):
+                _ = snapshot.recipes["Missing"]
+
+            snapshot.close()
+
+    def test_compact_definitions(self):
+        """
+        Write a snapshot from compact blocks the same as from dicts
+        """
+        with TemporaryDirectory() as test_dir:
+            snapshot_file = os.path.join(test_dir, "definitions.snapshot")
+            write_snapshot(snapshot_file, {name: CompactBlock.from_dict(block) for name, block in BLOCKS.items()},
+                           RECIPES)
+            snapshot = DefinitionSnapshot(snapshot_file)
+
+            assert snapshot.blocks["Block5"].as_dict() == BLOCKS["Block5"]
+
+            snapshot.close()
+
+    def test_checker(self):
+        """
+        Check with the costs precompiled into the snapshot, the same as a checker with the definitions in memory
+        """
+        blocks = {"Block1": 3, "Block299": 2, "Unknown": 1}
+        checker = BluePrintChecker(BLOCKS, RECIPES)
+        checker.precompile()
+
+        with TemporaryDirectory() as test_dir:
+            snapshot_file = os.path.join(test_dir, "definitions.snapshot")
+            write_snapshot(snapshot_file, BLOCKS, RECIPES)
+            snapshot = DefinitionSnapshot(snapshot_file)
+
+            assert snapshot.checker().check_counts(blocks) == checker.check_counts(blocks)
+            assert BluePrintChecker(snapshot.blocks, snapshot.recipes).check_counts(blocks) == \
+                BluePrintChecker(BLOCKS, RECIPES).check_counts(blocks)
+
+            snapshot.close()
+
+    def test_lookups(self):
+        """
+        Look quantities up through views of the snapshot, with names found once a process and a bounded string cache
+        """
+        with TemporaryDirectory() as test_dir:
+            snapshot_file = os.path.join(test_dir, "definitions.snapshot")
+            write_snapshot(snapshot_file, BLOCKS, RECIPES)
+            snapshot = DefinitionSnapshot(snapshot_file)
+
+            components = snapshot.blocks["Block7"]["components"]
+            assert isinstance(components, SnapshotQuantities)
+            assert components == {"SteelPlate": 8, "Computer": 2}
+            assert components["SteelPlate"] == 8
+            assert isinstance(components["SteelPlate"], int)
+            assert list(components.items()) == [("SteelPlate", 8), ("Computer", 2)]
+            assert list(components.values()) == [8, 2]
+            assert "Motor" not in components
+            assert snapshot.recipes["Computer"]["materials"] == {"Iron": 0.5, "Silicon": 0.2}
+
+            assert snapshot.blocks.indexes == {"Block7": 7}
+            assert snapshot.blocks.find("Block7") == 7
+            assert snapshot.blocks.find("Block300") == -1
+            assert "Block300" not in snapshot.blocks.indexes
+
+            snapshot.close()
+
+    def test_string_cache_size(self, monkeypatch):
+        """
+        Keep only the strings decoded most recently
+        """
+        monkeypatch.setattr(definition_snapshot, "STRING_CACHE_SIZE", 10)
+        with TemporaryDirectory() as test_dir:
+            snapshot_file = os.path.join(test_dir, "definitions.snapshot")
+            write_snapshot(snapshot_file, BLOCKS, RECIPES)
+            snapshot = DefinitionSnapshot(snapshot_file)
+
+            assert list(snapshot.blocks) == list(BLOCKS)
+            assert len(snapshot.strings) == 10
+            assert list(snapshot.strings.values())[-1] == "Block299"
+
+            snapshot.close()
+
+    def test_lookup_memory(self):
+        """
+        Look every block up holding less than a worker does with the definitions pickled over to it
+        """
+        with TemporaryDirectory() as test_dir:
+            snapshot_file = os.path.join(test_dir, "definitions.snapshot")
+            write_snapshot(snapshot_file, BLOCKS, RECIPES)
+            definitions = pickle.dumps((BLOCKS, RECIPES))
+
+            memory = {}
+            for path in ["dict", "snapshot"]:
+                gc.collect()
+                tracemalloc.start()
+                if path == "dict":
+                    blocks = pickle.loads(definitions)[0]
+                else:
+                    snapshot = DefinitionSnapshot(snapshot_file)
+                    blocks = snapshot.blocks
+                total = lookup_blocks(blocks, list(BLOCKS))
+                gc.collect()
+                memory[path] = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+
+                assert total == sum(index + 3 for index in range(300))
+
+            snapshot.close()
+
+            assert memory["snapshot"] < memory["dict"] / 2
+
+    def test_not_a_snapshot(self):
+        """
+        Refuse to read a file that isn't a snapshot
+        """
+        with TemporaryDirectory() as test_dir:
+            snapshot_file = os.path.join(test_dir, "definitions.snapshot")
+            with open(snapshot_file, "wb") as snapshot:
+                snapshot.write(b"<?xml version=\"1.0\"?>" * 10)
+
+            with pytest.raises(ValueError):
+                DefinitionSnapshot(snapshot_file)
+
+    def test_empty_snapshot(self):
+        """
+        Write and read a snapshot with nothing in it
+        """
+        with TemporaryDirectory() as test_dir:
+            snapshot_file = os.path.join(test_dir, "definitions.snapshot")
+            write_snapshot(snapshot_file, {}, {})
+            snapshot = DefinitionSnapshot(snapshot_file)
+
+            assert len(snapshot.blocks) == 0
+            assert "Block1" not in snapshot.blocks
+
+            snapshot.close()
+
+    def test_fnv1a(self):
+        """
+        Hash like the published FNV-1a test vectors
+        """
+        assert fnv1a(b"") == 0x811c9dc5
+        assert fnv1a(b"a") == 0xe40c292c
+        assert fnv1a(b"foobar") == 0xbf9cf968
+
+    def test_batch_workers(self):
+        """
+        Check a batch in worker processes that map a snapshot, with the same results as one process
+        """
+        bp_files = [BP_FILE] * 3
+        checker = BluePrintChecker(BLOCKS, RECIPES)
+        checker.precompile()
+
+        results = []
+        for workers in (1, 2):
+            results_file = io.StringIO()
+            check_blueprints(checker, bp_files, results_file, workers=workers)
+            results.append([json.loads(line)["result"] for line in results_file.getvalue().splitlines()])
+
+        assert results[0] == results[1]
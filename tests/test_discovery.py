@@ -0,0 +1,123 @@
+import os.path
+from tempfile import TemporaryDirectory
+
+from definition_cache import DefinitionCache
+from discovery import discover_files, sniff_sections
+from mod_index import ModIndex
+from scraper import Scraper, scrape_block_sections
+
+
+BLOCK_DEFINITION = """    <Definition>
+      <Id><TypeId>CubeBlock</TypeId><SubtypeId>{sub_type_id}</SubtypeId></Id>
+      <DisplayName>{sub_type_id}</DisplayName>
+      <Components><Component Subtype="SteelPlate" Count="{count}" /></Components>
+    </Definition>
+"""
+MIXED_FILE = """<?xml version="1.0"?>
+<Definitions>
+  <Characters>
+    <Definition><Id><TypeId>Character</TypeId><SubtypeId>Engineer</SubtypeId></Id></Definition>
+  </Characters>
+  <CubeBlocks>
+{blocks}  </CubeBlocks>
+  <Blueprints>
+    <Blueprint><Id><TypeId>BlueprintDefinition</TypeId><SubtypeId>SteelPlate</SubtypeId></Id></Blueprint>
+  </Blueprints>
+</Definitions>
+"""
+OTHER_FILE = """<?xml version="1.0"?>
+<Definitions>
+  <Characters>
+    <Definition><Id><TypeId>Character</TypeId><SubtypeId>Engineer</SubtypeId></Id></Definition>
+  </Characters>
+</Definitions>
+"""
+
+
+def write_file(path: str, contents: str) -> str:
+    """
+    Write a file, making its directory
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as sbc_file:
+        sbc_file.write(contents)
+
+    return path
+
+
+def write_mod(data_path: str) -> None:
+    """
+    A mod's Data directory with blocks in CubeBlocks, in a subdirectory and mixed in with other definitions
+    """
+    write_file(os.path.join(data_path, "CubeBlocks", "Blocks.sbc"),
+               MIXED_FILE.format(blocks=BLOCK_DEFINITION.format(sub_type_id="Armor", count=1)))
+    write_file(os.path.join(data_path, "Extra", "Deep", "MoreBlocks.sbc"),
+               MIXED_FILE.format(blocks=BLOCK_DEFINITION.format(sub_type_id="Armor", count=2) +
+                                 BLOCK_DEFINITION.format(sub_type_id="Window", count=3)))
+    write_file(os.path.join(data_path, "Characters.sbc"), OTHER_FILE)
+    write_file(os.path.join(data_path, "Empty.sbc"), "")
+    write_file(os.path.join(data_path, "Notes.txt"), "<CubeBlocks>")
+
+
+class TestDiscovery:
+    """
+    A test discovery class for discovery function tests
+    """
+    def test_sniff_sections(self):
+        """
+        Find the sections a file has without parsing it
+        """
+        with TemporaryDirectory() as test_dir:
+            write_mod(test_dir)
+
+            assert sniff_sections(os.path.join(test_dir, "CubeBlocks", "Blocks.sbc")) == ["Blueprints", "CubeBlocks"]
+            assert sniff_sections(os.path.join(test_dir, "Characters.sbc")) == []
+            assert sniff_sections(os.path.join(test_dir, "Empty.sbc")) == []
+            assert sniff_sections(os.path.join(test_dir, "Missing.sbc")) == []
+
+    def test_discover_files(self):
+        """
+        Find the files with a section at any depth, in a fixed order, keeping their sections in the cache
+        """
+        with TemporaryDirectory() as test_dir:
+            data_path = os.path.join(test_dir, "Data")
+            write_mod(data_path)
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+
+            found = discover_files(data_path, "CubeBlocks", cache)
+            assert found == [os.path.join(data_path, "CubeBlocks", "Blocks.sbc"),
+                             os.path.join(data_path, "Extra", "Deep", "MoreBlocks.sbc")]
+            assert discover_files(data_path, "Blueprints", cache) == found
+            assert cache.hits == 4
+
+    def test_scrape_block_sections(self):
+        """
+        Only read the definitions inside CubeBlocks
+        """
+        with TemporaryDirectory() as test_dir:
+            write_mod(test_dir)
+
+            blocks = scrape_block_sections(os.path.join(test_dir, "Extra", "Deep", "MoreBlocks.sbc"))
+            assert list(blocks) == ["Armor", "Window"]
+            assert blocks["Window"]["components"] == {"SteelPlate": 3}
+            assert scrape_block_sections(os.path.join(test_dir, "Notes.txt")) is None
+
+    def test_scraper_discover(self):
+        """
+        Load blocks from anywhere in a Data directory, later files winning as they would in a CubeBlocks directory
+        """
+        with TemporaryDirectory() as test_dir:
+            data_path = os.path.join(test_dir, "Data")
+            write_mod(data_path)
+            cube_blocks_path = os.path.join(data_path, "CubeBlocks")
+
+            scraper = Scraper(discover=True)
+            scraper.load_block_dirs([cube_blocks_path])
+            # the character in the same files isn't a block, and would fail to read as one
+            assert sorted(scraper.all_blocks) == ["Armor", "Window"]
+            assert scraper.all_blocks["Armor"]["components"] == {"SteelPlate": 2}
+            assert {entry["dir"] for entry in scraper.block_files.values()} == {cube_blocks_path}
+
+            mod_index = ModIndex(discover=True)
+            mod_index.build([cube_blocks_path])
+            assert mod_index.mods_for(["Window"]) == [cube_blocks_path]
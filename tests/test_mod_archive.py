@@ -0,0 +1,209 @@
+import os.path
+import zipfile
+from tempfile import TemporaryDirectory
+
+from check_mats import cube_blocks_paths, load_recipe_graph
+from definition_cache import DefinitionCache
+from discovery import find_block_files, find_recipe_files
+from mod_archive import archive_for, list_members, member_path, open_source, source_exists, source_stamp
+from mod_index import ModIndex
+from scraper import Scraper
+
+
+BLOCKS_FILE = """<?xml version="1.0"?>
+<Definitions>
+  <CubeBlocks>
+    <Definition>
+      <Id><TypeId>CubeBlock</TypeId><SubtypeId>{sub_type_id}</SubtypeId></Id>
+      <DisplayName>{sub_type_id}</DisplayName>
+      <Components><Component Subtype="SteelPlate" Count="{count}" /></Components>
+    </Definition>
+  </CubeBlocks>
+</Definitions>
+"""
+BLUEPRINTS_FILE = """<?xml version="1.0"?>
+<Definitions>
+  <Blueprints>
+    <Blueprint>
+      <Id><TypeId>BlueprintDefinition</TypeId><SubtypeId>ModPlate</SubtypeId></Id>
+      <Prerequisites><Item Amount="7" TypeId="Ingot" SubtypeId="Iron" /></Prerequisites>
+      <Result Amount="1" TypeId="Component" SubtypeId="ModPlate" />
+      <BaseProductionTimeInSeconds>1</BaseProductionTimeInSeconds>
+    </Blueprint>
+  </Blueprints>
+</Definitions>
+"""
+
+
+def write_archive(archive: str, members: dict) -> None:
+    """
+    Zip some files up as a mod
+    """
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for member, contents in members.items():
+            zip_file.writestr(member, contents)
+
+
+def mod_members(count: int = 1) -> dict:
+    """
+    A mod's files, with some that aren't blocks
+    """
+    return {"Data/CubeBlocks/Blocks.sbc": BLOCKS_FILE.format(sub_type_id="ModBlock", count=count),
+            "Data/CubeBlocks/Empty.sbc": "",
+            "Data/CubeBlocks/Readme.txt": "<CubeBlocks>",
+            "Data/Extra/MoreBlocks.sbc": BLOCKS_FILE.format(sub_type_id="DeepBlock", count=2),
+            "Data/Blueprints.sbc": BLUEPRINTS_FILE,
+            "Textures/Icon.dds": "not xml"}
+
+
+class TestModArchive:
+    """
+    A test mod archive class for mod_archive function tests
+    """
+    def test_archive_for(self):
+        """
+        Find a mod zipped next to where its directory would be, or inside its workshop directory
+        """
+        with TemporaryDirectory() as test_dir:
+            write_archive(os.path.join(test_dir, "Local.sbm"), mod_members())
+            os.mkdir(os.path.join(test_dir, "123"))
+            write_archive(os.path.join(test_dir, "123", "123_legacy.sbm"), mod_members())
+
+            assert archive_for(os.path.join(test_dir, "Local")) == os.path.join(test_dir, "Local.sbm")
+            assert archive_for(os.path.join(test_dir, "123")) == os.path.join(test_dir, "123", "123_legacy.sbm")
+            assert archive_for(os.path.join(test_dir, "456")) is None
+
+    def test_list_members(self):
+        """
+        List the .sbc files in a directory of an archive, leaving out empty ones
+        """
+        with TemporaryDirectory() as test_dir:
+            archive = os.path.join(test_dir, "Mod.sbm")
+            write_archive(archive, mod_members())
+
+            assert list_members(archive, "Data/CubeBlocks") == [member_path(archive, "Data/CubeBlocks/Blocks.sbc")]
+            assert list_members(archive, "data/cubeblocks") == list_members(archive, "Data/CubeBlocks")
+            assert list_members(archive, "Data", recursive=True) == [
+                member_path(archive, member) for member in
+                ["Data/Blueprints.sbc", "Data/CubeBlocks/Blocks.sbc", "Data/Extra/MoreBlocks.sbc"]]
+
+    def test_member_stamp(self):
+        """
+        Stamp a file in an archive with the archive's size and mtime and the file's CRC
+        """
+        with TemporaryDirectory() as test_dir:
+            archive = os.path.join(test_dir, "Mod.sbm")
+            write_archive(archive, mod_members())
+            blocks_file = member_path(archive, "Data/CubeBlocks/Blocks.sbc")
+
+            stamp = source_stamp(blocks_file)
+            assert stamp[:2] == source_stamp(archive)
+            assert stamp[2] == zipfile.crc32(BLOCKS_FILE.format(sub_type_id="ModBlock", count=1).encode())
+            assert source_exists(blocks_file)
+            assert not source_exists(member_path(archive, "Data/CubeBlocks/Missing.sbc"))
+            with open_source(blocks_file) as sbc_file:
+                assert sbc_file.read().startswith(b"<?xml")
+
+    def test_scraper_loads_archive(self):
+        """
+        Load a zipped mod the same as an extracted one, from the cache when it hasn't changed
+        """
+        with TemporaryDirectory() as test_dir:
+            mods_path = os.path.join(test_dir, "Mods")
+            os.makedirs(os.path.join(mods_path, "Extracted"))
+            write_archive(os.path.join(mods_path, "Zipped.sbm"), mod_members())
+            with zipfile.ZipFile(os.path.join(mods_path, "Zipped.sbm")) as zip_file:
+                zip_file.extractall(os.path.join(mods_path, "Extracted"))
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+
+            extracted = Scraper()
+            extracted.load_block_dirs([os.path.join(mods_path, "Extracted", "Data", "CubeBlocks")])
+            zipped = Scraper(cache)
+            zipped.load_block_dirs([os.path.join(mods_path, "Zipped", "Data", "CubeBlocks")])
+            assert zipped.all_blocks == extracted.all_blocks == {
+                "ModBlock": {"type_id": "CubeBlock", "sub_type_id": "ModBlock", "display_name": "ModBlock",
+                             "components": {"SteelPlate": 1}}}
+
+            cache.save()
+            cache.load()
+            cached = Scraper(cache)
+            cached.load_block_dirs([os.path.join(mods_path, "Zipped", "Data", "CubeBlocks")])
+            assert cached.all_blocks == zipped.all_blocks
+            assert cache.hits == 1
+
+            cache.prune()
+            assert len(cache.entries["blocks"]) == 1
+
+    def test_refresh_changed_archive(self):
+        """
+        Pick up a changed file when its mod is zipped again
+        """
+        with TemporaryDirectory() as test_dir:
+            archive = os.path.join(test_dir, "Mod.sbm")
+            write_archive(archive, mod_members())
+            cube_blocks_path = os.path.join(test_dir, "Mod", "Data", "CubeBlocks")
+            scraper = Scraper()
+            scraper.load_block_dirs([cube_blocks_path])
+
+            write_archive(archive, mod_members(count=5))
+            os.utime(archive, ns=(os.stat(archive).st_atime_ns, os.stat(archive).st_mtime_ns + 1000000))
+
+            assert scraper.refresh() == [member_path(archive, "Data/CubeBlocks/Blocks.sbc")]
+            assert scraper.all_blocks["ModBlock"]["components"] == {"SteelPlate": 5}
+
+    def test_discover_archive(self):
+        """
+        Find block files anywhere in a zipped mod, remembering which files have none so they aren't read again
+        """
+        with TemporaryDirectory() as test_dir:
+            archive = os.path.join(test_dir, "Mod.sbm")
+            write_archive(archive, mod_members())
+            cube_blocks_path = os.path.join(test_dir, "Mod", "Data", "CubeBlocks")
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+
+            found = find_block_files(cube_blocks_path, True, cache)
+            assert found == [member_path(archive, "Data/CubeBlocks/Blocks.sbc"),
+                             member_path(archive, "Data/Extra/MoreBlocks.sbc")]
+            assert cache.entries["sections"][os.path.abspath(member_path(archive, "Data/Blueprints.sbc"))][
+                       "definitions"] == ["Blueprints"]
+
+            assert find_block_files(cube_blocks_path, True, cache) == found
+            assert cache.hits == 3
+
+            scraper = Scraper(discover=True)
+            scraper.load_block_dirs([cube_blocks_path])
+            assert sorted(scraper.all_blocks) == ["DeepBlock", "ModBlock"]
+
+            mod_index = ModIndex(cache, discover=True)
+            mod_index.build([cube_blocks_path])
+            assert mod_index.mods_for(["DeepBlock"]) == [cube_blocks_path]
+
+    def test_zipped_mods_listed(self):
+        """
+        Load zipped mods, and their recipes, with every mod
+        """
+        with TemporaryDirectory() as test_dir:
+            config = {"se_path": os.path.join(test_dir, "Content"), "mods_path": os.path.join(test_dir, "Mods")}
+            os.makedirs(os.path.join(config["mods_path"], "Extracted"))
+            write_archive(os.path.join(config["mods_path"], "Zipped.sbm"), mod_members())
+
+            paths = cube_blocks_paths(config=config, modded_blocks=True)
+            assert sorted(paths[1:]) == [os.path.join(config["mods_path"], mod, "Data", "CubeBlocks")
+                                         for mod in ["Extracted", "Zipped"]]
+
+            recipe_graph = load_recipe_graph(config=config, modded_blocks=True)
+            assert recipe_graph.expand_components({"ModPlate": 2}) == {"Ingot/Iron": 14.0}
+
+    def test_zipped_recipes_any_case(self):
+        """
+        Find a zipped mod's recipes whatever the case of their name, like windows does
+        """
+        with TemporaryDirectory() as test_dir:
+            archive = os.path.join(test_dir, "Zipped.sbm")
+            write_archive(archive, {"data/BLUEPRINTS.SBC": BLUEPRINTS_FILE, "data/CubeBlocks/Blueprints.sbc": ""})
+
+            assert find_recipe_files(os.path.join(test_dir, "Zipped", "Data")) == \
+                [member_path(archive, "data/BLUEPRINTS.SBC")]
+
+            write_archive(archive, {"Data/CubeBlocks/Blocks.sbc": BLOCKS_FILE})
+            assert find_recipe_files(os.path.join(test_dir, "Zipped", "Data")) == []
@@ -0,0 +1,81 @@
+import os.path
+from tempfile import TemporaryDirectory
+
+from definition_cache import DefinitionCache
+from mod_index import ModIndex, scan_subtypes
+from scraper import Scraper, scrape_blocks_file
+
+
+def write_sbc(cube_blocks_path: str, file_name: str, contents: str) -> None:
+    """
+    Write a block file
+    """
+    os.makedirs(cube_blocks_path, exist_ok=True)
+    with open(os.path.join(cube_blocks_path, file_name), "w") as sbc_file:
+        sbc_file.write(contents)
+
+
+class TestModIndex:
+    """
+    A test mod index class for ModIndex class tests
+    """
+    def test_scan_subtypes(self):
+        """
+        Find subtypes written as elements and as attributes without parsing
+        """
+        with TemporaryDirectory() as test_dir:
+            write_sbc(test_dir, "blocks.sbc",
+                      "<Definitions><CubeBlocks>"
+                      "<Definition><Id><TypeId>CubeBlock</TypeId><SubtypeId>Armor&amp;Glass</SubtypeId></Id>"
+                      "</Definition>"
+                      '<Definition><Id Type="MyObjectBuilder_Thrust" Subtype="BigThruster" /></Definition>'
+                      "<Definition><Id><SubtypeId>BigThruster</SubtypeId></Id></Definition>"
+                      "</CubeBlocks></Definitions>")
+
+            assert scan_subtypes(os.path.join(test_dir, "blocks.sbc")) == ["Armor&Glass", "BigThruster"]
+            assert scan_subtypes(os.path.join(test_dir, "missing.sbc")) == []
+
+    def test_scan_empty_subtypes(self):
+        """
+        Index a definition with an empty SubtypeId by its TypeId, the same key the Scraper gives it
+        """
+        with TemporaryDirectory() as test_dir:
+            ids = ["<TypeId>Passage</TypeId><SubtypeId />",
+                   "\n  <TypeId>Ladder2</TypeId>\n  <SubtypeId></SubtypeId>\n",
+                   "<SubtypeId/><TypeId>Door</TypeId>",
+                   "<TypeId>CubeBlock</TypeId><SubtypeId>Armor</SubtypeId>"]
+            write_sbc(test_dir, "blocks.sbc",
+                      "<Definitions><CubeBlocks>"
+                      + "".join(f"<Definition><Id>{block_id}</Id><DisplayName /><Components /></Definition>"
+                                for block_id in ids)
+                      + "</CubeBlocks></Definitions>")
+
+            assert scan_subtypes(os.path.join(test_dir, "blocks.sbc")) == ["Passage", "Ladder2", "Door", "Armor"]
+            assert Scraper().scrape_files("blocks", [os.path.join(test_dir, "blocks.sbc")],
+                                          scrape_blocks_file)[0].keys() >= {"Passage", "Ladder2", "Door"}
+
+    def test_mods_for(self):
+        """
+        Find the mods defining some subtypes, in load order, from the cache the second time
+        """
+        with TemporaryDirectory() as test_dir:
+            mod_dirs = [os.path.join(test_dir, mod, "Data", "CubeBlocks") for mod in ["333", "111", "222"]]
+            write_sbc(mod_dirs[0], "a.sbc", "<SubtypeId>Thruster</SubtypeId><SubtypeId>Armor</SubtypeId>")
+            write_sbc(mod_dirs[1], "a.sbc", "<SubtypeId>Armor</SubtypeId>")
+            write_sbc(mod_dirs[2], "a.sbc", "<SubtypeId>Window</SubtypeId>")
+            write_sbc(mod_dirs[2], "notes.txt", "<SubtypeId>Thruster</SubtypeId>")
+
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+            mod_index = ModIndex(cache)
+            mod_index.build(mod_dirs + [os.path.join(test_dir, "missing")])
+
+            assert mod_index.mods_for(["Armor"]) == mod_dirs[:2]
+            assert mod_index.mods_for(["Thruster", "Window", "Unknown"]) == [mod_dirs[0], mod_dirs[2]]
+            assert mod_index.mods_for([]) == []
+            assert cache.misses == 3
+
+            cache.save()
+            cache.load()
+            ModIndex(cache).build(mod_dirs)
+
+            assert cache.hits == 3
@@ -0,0 +1,127 @@
+import os
+import os.path
+from tempfile import TemporaryDirectory
+
+import logbook
+
+from check_mats import cube_blocks_paths
+from mod_list import mod_load_order, read_mod_list
+
+
+SANDBOX = """<?xml version="1.0"?>
+<MyObjectBuilder_Checkpoint xmlns:xsd="http://www.w3.org/2001/XMLSchema" \
+xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <SessionName>Server</SessionName>
+  <Mods>
+    <ModItem FriendlyName="Top">
+      <Name>333.sbm</Name>
+      <PublishedFileId>333</PublishedFileId>
+    </ModItem>
+    <ModItem FriendlyName="Local">
+      <Name>MyLocalMod</Name>
+      <PublishedFileId>0</PublishedFileId>
+    </ModItem>
+    <ModItem FriendlyName="Bottom">
+      <Name>111.sbm</Name>
+      <PublishedFileId>111</PublishedFileId>
+      <PublishedServiceName>Steam</PublishedServiceName>
+    </ModItem>
+    <ModItem FriendlyName="Elsewhere">
+      <Name>2222222</Name>
+      <PublishedFileId>2222222</PublishedFileId>
+      <PublishedServiceName>mod.io</PublishedServiceName>
+    </ModItem>
+  </Mods>
+  <Settings />
+</MyObjectBuilder_Checkpoint>
+"""
+MOD_LIST = """# server mods, top has priority
+https://steamcommunity.com/sharedfiles/filedetails/?id=333
+
+MyLocalMod.sbm
+111
+333
+"""
+
+
+class TestModList:
+    """
+    A test mod list class for mod_list function tests
+    """
+    def test_read_mod_list(self):
+        """
+        Read the same mods in the same order from a Sandbox.sbc and a modlist file
+        """
+        with TemporaryDirectory() as test_dir:
+            sandbox_file = os.path.join(test_dir, "Sandbox.sbc")
+            with open(sandbox_file, "w") as sbc_file:
+                sbc_file.write(SANDBOX)
+            list_file = os.path.join(test_dir, "mods.txt")
+            with open(list_file, "w") as text_file:
+                text_file.write(MOD_LIST)
+
+            with logbook.TestHandler() as handler:
+                assert read_mod_list(sandbox_file) == ["333", "MyLocalMod", "111"]
+            assert read_mod_list(list_file) == ["333", "MyLocalMod", "111"]
+            assert handler.has_warning("Skipped mod 2222222 from mod.io, only Steam workshop and local mods can be "
+                                       "loaded")
+
+            with open(sandbox_file, "w") as sbc_file:
+                sbc_file.write("<Broken>")
+            assert read_mod_list(sandbox_file) == []
+
+    def test_mod_load_order(self):
+        """
+        Load the bottom of the list first, so the top wins, skipping mods that aren't downloaded
+        """
+        with TemporaryDirectory() as test_dir:
+            for mod in ["111", "222", "333"]:
+                os.makedirs(os.path.join(test_dir, mod))
+
+            assert mod_load_order(test_dir, ["333", "MyLocalMod", "111"]) == [os.path.join(test_dir, "111"),
+                                                                              os.path.join(test_dir, "333")]
+
+    def test_mod_load_order_local(self):
+        """
+        Find local mods, listed by name, in the local mods directory and workshop mods in the workshop one
+        """
+        with TemporaryDirectory() as test_dir:
+            mods_path = os.path.join(test_dir, "workshop")
+            local_mods_path = os.path.join(test_dir, "local")
+            for mod_path in [os.path.join(mods_path, "111"), os.path.join(local_mods_path, "MyLocalMod"),
+                             os.path.join(local_mods_path, "111")]:
+                os.makedirs(mod_path)
+
+            with logbook.TestHandler() as handler:
+                assert mod_load_order(mods_path, ["MyLocalMod", "111"]) == [os.path.join(mods_path, "111")]
+            assert mod_load_order(mods_path, ["MyLocalMod", "111"], local_mods_path) == \
+                [os.path.join(mods_path, "111"), os.path.join(local_mods_path, "MyLocalMod")]
+            assert handler.has_warning(f"Local mod MyLocalMod is listed but not in {mods_path}, set local_mods_path "
+                                       f"to load it")
+
+            config = {"se_path": "Content", "mods_path": mods_path, "local_mods_path": local_mods_path}
+            assert cube_blocks_paths(config=config, modded_blocks=True) == \
+                [os.path.join("Content", "Data", "CubeBlocks"), os.path.join(mods_path, "111", "Data", "CubeBlocks")] \
+                + [os.path.join(local_mods_path, mod, "Data", "CubeBlocks") for mod in os.listdir(local_mods_path)]
+            assert cube_blocks_paths(config=config, modded_blocks=True, mod_ids=["MyLocalMod"]) == \
+                [os.path.join("Content", "Data", "CubeBlocks"),
+                 os.path.join(local_mods_path, "MyLocalMod", "Data", "CubeBlocks")]
+
+    def test_cube_blocks_paths_mod_list(self):
+        """
+        Load only the listed mods in load order, from the command line or the config
+        """
+        with TemporaryDirectory() as test_dir:
+            for mod in ["111", "222", "333"]:
+                os.makedirs(os.path.join(test_dir, mod))
+            list_file = os.path.join(test_dir, "mods.txt")
+            with open(list_file, "w") as text_file:
+                text_file.write("333\n111\n")
+            config = {"se_path": "Content", "mods_path": test_dir}
+            expected = [os.path.join("Content", "Data", "CubeBlocks"),
+                        os.path.join(test_dir, "111", "Data", "CubeBlocks"),
+                        os.path.join(test_dir, "333", "Data", "CubeBlocks")]
+
+            assert cube_blocks_paths(config=config, modded_blocks=True, mod_list=list_file) == expected
+            assert cube_blocks_paths(config=dict(config, mod_list=list_file), modded_blocks=True) == expected
+            assert cube_blocks_paths(config=config, modded_blocks=False, mod_list=list_file) == expected[:1]
@@ -0,0 +1,105 @@
+import os.path
+import zipfile
+from tempfile import TemporaryDirectory
+
+from conftest import write_blocks
+from mod_profile import mod_name, profile_mods
+from scraper import Scraper
+from stats import Stats
+
+
+class TestModProfile:
+    """
+    A test mod profile class for profile_mods function tests
+    """
+    def test_profile_mods(self):
+        """
+        Profile each mod's files, blocks, parse errors and clashes
+        """
+        with TemporaryDirectory() as test_dir:
+            vanilla_dir = os.path.join(test_dir, "Content", "Data", "CubeBlocks")
+            mod_a_dir = os.path.join(test_dir, "mods", "111", "Data", "CubeBlocks")
+            mod_b_dir = os.path.join(test_dir, "mods", "222", "Data", "CubeBlocks")
+            write_blocks(vanilla_dir, "blocks.sbc", ["Armor", "Window"])
+            write_blocks(mod_a_dir, "a.sbc", ["Armor", "Thruster"])
+            write_blocks(mod_a_dir, "b.sbc", ["Thruster"])
+            write_blocks(mod_b_dir, "blocks.sbc", ["Armor"])
+            with open(os.path.join(mod_b_dir, "broken.sbc"), "w") as broken_file:
+                broken_file.write("Some non-XML text")
+
+            scraper = Scraper(stats=Stats())
+            scraper.load_block_dirs([vanilla_dir, mod_a_dir, mod_b_dir])
+            profiles = {profile["mod"]: profile for profile in profile_mods(scraper)}
+
+            assert profiles["Content"]["blocks"] == 2
+            assert profiles["Content"]["shadowed"] == ["Armor"]
+            assert profiles["Content"]["overrides"] == []
+            assert profiles["111"]["files"] == 2
+            assert profiles["111"]["blocks"] == 3
+            assert profiles["111"]["shadowed"] == ["Armor"]
+            # redefining its own block in another file isn't a clash
+            assert profiles["111"]["overrides"] == []
+            assert profiles["222"]["overrides"] == ["Armor"]
+            assert profiles["222"]["parse_errors"] == 1
+            assert profiles["222"]["bytes"] == sum(os.path.getsize(os.path.join(mod_b_dir, file))
+                                                   for file in os.listdir(mod_b_dir))
+            assert all(profile["parse_seconds"] > 0 for profile in profiles.values())
+
+            parse_seconds = [profile["parse_seconds"] for profile in profile_mods(scraper)]
+            assert parse_seconds == sorted(parse_seconds, reverse=True)
+
+    def test_profile_discovered(self):
+        """
+        Profile a discovered file deeper in the Data directory with the mod's CubeBlocks directory
+        """
+        with TemporaryDirectory() as test_dir:
+            mod_dir = os.path.join(test_dir, "mods", "111", "Data", "CubeBlocks")
+            write_blocks(mod_dir, "a.sbc", ["Armor"])
+            extra_dir = os.path.join(test_dir, "mods", "111", "Data", "Extra")
+            write_blocks(extra_dir, "b.sbc", ["Thruster"])
+            with open(os.path.join(extra_dir, "broken.sbc"), "w") as broken_file:
+                broken_file.write("<Definitions><CubeBlocks>")
+
+            scraper = Scraper(stats=Stats(), discover=True)
+            scraper.load_block_dirs([mod_dir])
+            profiles = profile_mods(scraper)
+
+            assert len(profiles) == 1
+            assert profiles[0]["files"] == 3
+            assert profiles[0]["blocks"] == 2
+            assert profiles[0]["parse_errors"] == 1
+            assert scraper.stats.stages[f"scrape_blocks:{os.path.normpath(mod_dir)}"]["calls"] == 3
+
+    def test_profile_zipped(self):
+        """
+        Profile a zipped mod's files under its CubeBlocks directory, with each file's own size
+        """
+        with TemporaryDirectory() as test_dir:
+            files_dir = os.path.join(test_dir, "files")
+            write_blocks(files_dir, "a.sbc", ["Armor"])
+            write_blocks(files_dir, "b.sbc", ["Thruster", "Window"])
+            with open(os.path.join(files_dir, "broken.sbc"), "w") as broken_file:
+                broken_file.write("Some non-XML text")
+            os.makedirs(os.path.join(test_dir, "mods"))
+            with zipfile.ZipFile(os.path.join(test_dir, "mods", "111.sbm"), "w", zipfile.ZIP_DEFLATED) as zip_file:
+                for file_name in os.listdir(files_dir):
+                    zip_file.write(os.path.join(files_dir, file_name), f"Data/CubeBlocks/{file_name}")
+
+            scraper = Scraper(stats=Stats())
+            scraper.load_block_dirs([os.path.join(test_dir, "mods", "111", "Data", "CubeBlocks")])
+            profiles = profile_mods(scraper)
+
+            assert len(profiles) == 1
+            assert profiles[0]["mod"] == "111"
+            assert profiles[0]["files"] == 3
+            assert profiles[0]["blocks"] == 3
+            assert profiles[0]["parse_errors"] == 1
+            assert profiles[0]["parse_seconds"] > 0
+            assert profiles[0]["bytes"] == sum(os.path.getsize(os.path.join(files_dir, file))
+                                               for file in os.listdir(files_dir))
+
+    def test_mod_name(self):
+        """
+        Name a mod after the directory above Data
+        """
+        assert mod_name(os.path.join("mods", "123456", "Data", "CubeBlocks")) == "123456"
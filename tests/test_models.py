@@ -1,6 +1,6 @@
 import xml.etree.ElementTree as ElementTree
 
-from models import Block, Recipe
+from models import Block, CompactBlock, CompactRecipe, PackedQuantities, Recipe
 
 
 class TestBlock:
@@ -196,3 +196,77 @@ class TestRecipe:
             "output_type_id": sub_type_id,
             "output_quantity": amount
         }
+
+
+class TestCompactBlock:
+    """
+    A test compact block class for CompactBlock class tests
+    """
+    def test_compact_block_from_dict(self):
+        """
+        Make a compact block from a block dict and read it like one
+        """
+        block_dict = {
+            "type_id": "my-type-id",
+            "sub_type_id": "my-subtype-id",
+            "display_name": "my-display-name",
+            "components": {"SteelPlate": 10, "Construction": 5}
+        }
+
+        block = CompactBlock.from_dict(block_dict)
+
+        assert block.components == ("SteelPlate", 10, "Construction", 5)
+        assert block["components"] == {"SteelPlate": 10, "Construction": 5}
+        assert block["sub_type_id"] == "my-subtype-id"
+        assert block == block_dict
+        assert block.as_dict() == block_dict
+        assert CompactBlock.from_dict(block) is block
+
+    def test_compact_block_missing_key(self):
+        """
+        Read a key a block doesn't have
+        """
+        block = CompactBlock("my-type-id", "my-subtype-id", None, {})
+
+        assert block.get("materials") is None
+        assert "components" in block
+
+    def test_compact_block_components(self):
+        """
+        Read a block's components straight from the packed tuple
+        """
+        block = CompactBlock("my-type-id", "my-subtype-id", None, {"SteelPlate": 10, "Construction": 5})
+        components = block["components"]
+
+        assert isinstance(components, PackedQuantities)
+        assert components.packed is block.components
+        assert list(components.items()) == [("SteelPlate", 10), ("Construction", 5)]
+        assert list(components.values()) == [10, 5]
+        assert sum(components.values()) == 15
+        assert list(components) == ["SteelPlate", "Construction"]
+        assert len(components) == 2
+        assert components["Construction"] == 5
+        assert "Computer" not in components
+        assert components.get("Computer", 0) == 0
+
+
+class TestCompactRecipe:
+    """
+    A test compact recipe class for CompactRecipe class tests
+    """
+    def test_compact_recipe_from_dict(self):
+        """
+        Make a compact recipe from a recipe dict and read it like one
+        """
+        recipe_dict = {
+            "materials": {"Iron": 8.0, "Nickel": 0.5},
+            "output_type_id": "Construction",
+            "output_quantity": 1.0
+        }
+
+        recipe = CompactRecipe.from_dict(recipe_dict)
+
+        assert recipe.materials == ("Iron", 8.0, "Nickel", 0.5)
+        assert recipe["materials"] == {"Iron": 8.0, "Nickel": 0.5}
+        assert recipe == recipe_dict
+        assert recipe.as_dict() == recipe_dict
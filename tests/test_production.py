@@ -0,0 +1,124 @@
+import time
+
+import logbook
+import pytest
+
+from production import Machine, ProductionPlanner, machines_from_config, SPEED_MODULE_BONUS, YIELD_MODULE_BONUS
+from recipe_graph import RecipeGraph
+
+
+def make_graph() -> RecipeGraph:
+    """
+    A small graph, iron ore to ingots to plates and nickel ore to ingots to grids
+    """
+    recipe_graph = RecipeGraph()
+    recipe_graph.add_blueprint("IronOreToIngot", {("Ore", "Iron"): 1.0}, {("Ingot", "Iron"): 0.5}, 1.0)
+    recipe_graph.add_blueprint("NickelOreToIngot", {("Ore", "Nickel"): 1.0}, {("Ingot", "Nickel"): 0.5}, 2.0)
+    recipe_graph.add_blueprint("SteelPlate", {("Ingot", "Iron"): 20.0}, {("Component", "SteelPlate"): 1.0}, 10.0)
+    recipe_graph.add_blueprint("MetalGrid", {("Ingot", "Iron"): 10.0, ("Ingot", "Nickel"): 5.0},
+                               {("Component", "MetalGrid"): 1.0}, 20.0)
+    recipe_graph.build()
+
+    return recipe_graph
+
+
+class TestProductionPlanner:
+    """
+    A test production planner class for ProductionPlanner class tests
+    """
+    def test_demand(self):
+        planner = ProductionPlanner(make_graph(), [Machine("a", "assembler"), Machine("r", "refinery")])
+        jobs, inputs = planner.demand({("Component", "SteelPlate"): 2, ("Component", "MetalGrid"): 1})
+
+        assert jobs[("Component", "SteelPlate")]["seconds"] == 20.0
+        assert jobs[("Component", "MetalGrid")]["seconds"] == 20.0
+        # 50 iron ingots take 100 runs, 5 nickel ingots take 10
+        assert jobs[("Ingot", "Iron")]["runs"] == 100.0
+        assert jobs[("Ingot", "Nickel")]["seconds"] == 20.0
+        assert inputs == {("Ore", "Iron"): 100.0, ("Ore", "Nickel"): 10.0}
+
+    def test_demand_unknown_component(self):
+        planner = ProductionPlanner(make_graph(), [Machine("a", "assembler")])
+        jobs, inputs = planner.demand({("Component", "Mystery"): 3})
+
+        assert jobs == {}
+        assert inputs == {("Component", "Mystery"): 3}
+
+    def test_plan(self):
+        machines = [Machine("a1", "assembler"), Machine("a2", "assembler"), Machine("r1", "refinery")]
+        plan = ProductionPlanner(make_graph(), machines).plan({"SteelPlate": 2, "MetalGrid": 1})
+
+        # 40 seconds of assembling split evenly, 120 seconds of refining on the one refinery
+        assert plan["stages"]["assembler"]["makespan_seconds"] == 20.0
+        assert plan["stages"]["refinery"]["makespan_seconds"] == 120.0
+        assert plan["makespan_seconds"] == 120.0
+        assert plan["sequential_seconds"] == 140.0
+        assert plan["bottleneck"] == "refinery"
+        assert plan["bottleneck_items"][0] == {"item": "Ingot/Iron", "seconds": 100.0, "share": 100.0 / 120.0}
+        assert plan["inputs"] == {"Ore/Iron": 100.0, "Ore/Nickel": 10.0}
+
+        queues = {machine["name"]: machine for machine in plan["machines"]}
+        assert queues["a1"]["busy_seconds"] == queues["a2"]["busy_seconds"] == 20.0
+        assert [job["item"] for job in queues["r1"]["queue"]] == ["Ingot/Iron", "Ingot/Nickel"]
+        assert queues["r1"]["queue"][1]["start"] == queues["r1"]["queue"][0]["end"]
+
+    def test_plan_without_refineries(self):
+        plan = ProductionPlanner(make_graph(), [Machine("a", "assembler")]).plan({"SteelPlate": 1})
+
+        assert plan["makespan_seconds"] == 10.0
+        assert plan["inputs"] == {"Ingot/Iron": 20.0}
+
+    def test_plan_modules(self):
+        machines = [Machine.from_modules("a", "assembler", 2), Machine.from_modules("r", "refinery", 0, 2)]
+        plan = ProductionPlanner(make_graph(), machines).plan({"SteelPlate": 1})
+
+        assert plan["stages"]["assembler"]["makespan_seconds"] == pytest.approx(10.0 / (1 + 2 * SPEED_MODULE_BONUS))
+        assert plan["inputs"]["Ore/Iron"] == pytest.approx(40.0 / (1 + 2 * YIELD_MODULE_BONUS))
+
+    def test_plan_mixed_speeds(self):
+        machines = [Machine("slow", "assembler"), Machine("fast", "assembler", speed=3.0)]
+        plan = ProductionPlanner(make_graph(), machines).plan({"SteelPlate": 4})
+
+        queues = {machine["name"]: machine for machine in plan["machines"]}
+        # both halves of the job go to the fast assembler, finishing at 40 / 3, before the slow one would at 20
+        assert queues["slow"]["queue"] == []
+        assert plan["makespan_seconds"] == pytest.approx(40.0 / 3.0)
+
+    def test_plan_large_order(self):
+        recipe_graph = make_graph()
+        for index in range(2000):
+            recipe_graph.add_blueprint(f"Part{index}", {("Ingot", "Iron"): 1.0, ("Ingot", "Nickel"): 1.0},
+                                       {("Component", f"Part{index}"): 1.0}, 1.0 + index % 7)
+        recipe_graph.build()
+        components = {f"Part{index}": 1000000 for index in range(2000)}
+        machines = machines_from_config({"assemblers": 64, "refineries": 32, "assembler_speed_modules": 4})
+
+        started = time.perf_counter()
+        plan = ProductionPlanner(recipe_graph, machines).plan(components)
+
+        assert time.perf_counter() - started < 1.0
+        assert plan["stages"]["assembler"]["makespan_seconds"] >= plan["stages"]["assembler"]["work_seconds"] / (
+                64 * (1 + 4 * SPEED_MODULE_BONUS))
+
+
+class TestMachinesFromConfig:
+    """
+    A test machines from config class for machines_from_config function tests
+    """
+    def test_machines_from_config(self):
+        machines = machines_from_config({"assemblers": 2, "refineries": 1, "refinery_yield_modules": 4})
+
+        assert [(machine.name, machine.kind) for machine in machines] == [
+            ("assembler-1", "assembler"), ("assembler-2", "assembler"), ("refinery-1", "refinery")]
+        assert machines[2].yield_factor == 1 + 4 * YIELD_MODULE_BONUS
+        assert machines[0].speed == 1.0
+
+    def test_assembler_yield_modules(self):
+        """
+        Ignore yield modules on assemblers, which can't take them
+        """
+        with logbook.TestHandler() as handler:
+            machines = machines_from_config({"assemblers": 1, "refineries": 1, "assembler_yield_modules": 4})
+
+        assert [machine.yield_factor for machine in machines] == [1.0, 1.0]
+        assert handler.has_warning("Assemblers don't take yield modules, ignoring assembler_yield_modules")
@@ -0,0 +1,121 @@
+import os.path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from definition_cache import DefinitionCache
+from recipe_graph import RecipeGraph, scrape_graph_file
+
+
+BLUEPRINTS = """<?xml version="1.0"?>
+<Definitions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <Blueprints>
+    <Blueprint>
+      <Id><TypeId>BlueprintDefinition</TypeId><SubtypeId>IronOreToIngot</SubtypeId></Id>
+      <Prerequisites><Item Amount="1" TypeId="Ore" SubtypeId="Iron" /></Prerequisites>
+      <Result Amount="0.7" TypeId="Ingot" SubtypeId="Iron" />
+      <BaseProductionTimeInSeconds>0.05</BaseProductionTimeInSeconds>
+    </Blueprint>
+    <Blueprint>
+      <Id><TypeId>BlueprintDefinition</TypeId><SubtypeId>StoneOreToIngot</SubtypeId></Id>
+      <Prerequisites><Item Amount="1" TypeId="Ore" SubtypeId="Stone" /></Prerequisites>
+      <Results>
+        <Item Amount="0.05" TypeId="Ingot" SubtypeId="Iron" />
+        <Item Amount="0.01" TypeId="Ingot" SubtypeId="Nickel" />
+      </Results>
+      <BaseProductionTimeInSeconds>0.5</BaseProductionTimeInSeconds>
+    </Blueprint>
+    <Blueprint>
+      <Id Type="MyObjectBuilder_BlueprintDefinition" Subtype="ScrapToIronIngot" />
+      <Prerequisites><Item Amount="1" TypeId="MyObjectBuilder_Ore" SubtypeId="Scrap" /></Prerequisites>
+      <Result Amount="0.8" TypeId="Ingot" SubtypeId="Iron" />
+    </Blueprint>
+    <Blueprint>
+      <Id><TypeId>BlueprintDefinition</TypeId><SubtypeId>MetalGrid</SubtypeId></Id>
+      <Prerequisites>
+        <Item Amount="12" TypeId="Ingot" SubtypeId="Iron" />
+        <Item Amount="5" TypeId="Ingot" SubtypeId="Nickel" />
+      </Prerequisites>
+      <Result Amount="1" TypeId="Component" SubtypeId="MetalGrid" />
+      <BaseProductionTimeInSeconds>24</BaseProductionTimeInSeconds>
+    </Blueprint>
+  </Blueprints>
+</Definitions>
+"""
+
+
+def write_blueprints(test_dir: str) -> str:
+    """
+    Write the test recipes file
+    """
+    recipes_file = os.path.join(test_dir, "Blueprints.sbc")
+    with open(recipes_file, "w") as blueprints_file:
+        blueprints_file.write(BLUEPRINTS)
+
+    return recipes_file
+
+
+class TestRecipeGraph:
+    """
+    A test recipe graph class for RecipeGraph class tests
+    """
+    def test_scrape_graph_file(self):
+        """
+        Scrape every blueprint, single and multi result, with either kind of Id
+        """
+        with TemporaryDirectory() as test_dir:
+            blueprints = scrape_graph_file(write_blueprints(test_dir))
+
+        assert [blueprint["id"] for blueprint in blueprints] == ["IronOreToIngot", "StoneOreToIngot",
+                                                                 "ScrapToIronIngot", "MetalGrid"]
+        assert blueprints[1]["results"] == [[("Ingot", "Iron"), 0.05], [("Ingot", "Nickel"), 0.01]]
+        assert blueprints[2]["prerequisites"] == [[("Ore", "Scrap"), 1.0]]
+        assert blueprints[3]["seconds"] == 24.0
+
+    def test_expand_components(self):
+        """
+        Expand components down to ore, through the chosen blueprints
+        """
+        with TemporaryDirectory() as test_dir:
+            recipes_file = write_blueprints(test_dir)
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+
+            recipe_graph = RecipeGraph()
+            recipe_graph.load_file(recipes_file, cache)
+            cache.save()
+            cache.load()
+            cached_graph = RecipeGraph()
+            cached_graph.load_file(recipes_file, cache)
+
+        raw_items = recipe_graph.expand_components({"MetalGrid": 2, "MysteryComponent": 1})
+
+        # nickel is only made from stone, iron from the first single result blueprint
+        assert raw_items["Ore/Iron"] == pytest.approx(2 * 12 / 0.7)
+        assert raw_items["Ore/Stone"] == pytest.approx(2 * 5 / 0.01)
+        assert raw_items["Component/MysteryComponent"] == 1.0
+        assert cached_graph.expand_components({"MetalGrid": 2}) == recipe_graph.expand_components({"MetalGrid": 2})
+        assert recipe_graph.order.index(("Ingot", "Iron")) < recipe_graph.order.index(("Component", "MetalGrid"))
+
+    def test_preferred_recipe(self):
+        """
+        Make an item with the preferred blueprint
+        """
+        with TemporaryDirectory() as test_dir:
+            recipe_graph = RecipeGraph({"Ingot/Iron": "ScrapToIronIngot"})
+            recipe_graph.load_file(write_blueprints(test_dir))
+
+        assert recipe_graph.expand({("Ingot", "Iron"): 8.0}) == {("Ore", "Scrap"): pytest.approx(10.0)}
+
+    def test_cycle(self):
+        """
+        Break a cycle by treating the item that closes it as raw
+        """
+        recipe_graph = RecipeGraph()
+        recipe_graph.add_blueprint("IngotToOre", {("Ingot", "Iron"): 1.0}, {("Ore", "Iron"): 1.0}, 1.0)
+        recipe_graph.add_blueprint("OreToIngot", {("Ore", "Iron"): 2.0}, {("Ingot", "Iron"): 1.0}, 1.0)
+        recipe_graph.add_blueprint("Plate", {("Ingot", "Iron"): 3.0}, {("Component", "SteelPlate"): 1.0}, 1.0)
+        recipe_graph.build()
+
+        # ore is reached first, so it closes the cycle and is raw
+        assert recipe_graph.expand({("Component", "SteelPlate"): 1}) == {("Ore", "Iron"): 6.0}
+        assert len(recipe_graph.order) == 3
@@ -0,0 +1,145 @@
+import os.path
+from tempfile import TemporaryDirectory
+
+from bp_checker import BluePrintChecker
+from result_cache import CachingChecker, ResultCache, definitions_fingerprint, split_grids
+
+
+BP_FILE = os.path.join(os.path.dirname(__file__), "..", "blueprints", "bp.sbc")
+
+ALL_BLOCKS = {
+  "SmallBlockMediumContainer": {
+    "type_id": "CargoContainer",
+    "sub_type_id": "SmallBlockMediumContainer",
+    "display_name": "DisplayName_Block_MediumContainer",
+    "components": {
+      "SteelPlate": 12
+    }
+  }
+}
+ALL_RECIPES = {
+    "SteelPlate": {
+        "materials": {
+            "Iron": 21.0
+        },
+        "output_type_id": "SteelPlate",
+        "output_quantity": 1.0
+    }
+}
+
+
+class TestResultCache:
+    """
+    A test result cache class for ResultCache class tests
+    """
+    def test_evict_least_recently_used(self):
+        """
+        Keep the most recently used results within the entry and byte limits
+        """
+        results = ResultCache(max_entries=2)
+        results.put("a", {"blocks": 1})
+        results.put("b", {"blocks": 2})
+        assert results.get("a") == {"blocks": 1}
+        results.put("c", {"blocks": 3})
+
+        assert results.get("b") is None
+        assert results.get("a") == {"blocks": 1}
+        assert results.get("c") == {"blocks": 3}
+        assert (results.hits, results.misses) == (3, 1)
+
+        results = ResultCache(max_bytes=30)
+        results.put("a", {"blocks": "x" * 10})
+        results.put("b", {"blocks": "y" * 10})
+
+        assert list(results.entries) == ["b"]
+        assert results.size_bytes == len('{"blocks": "yyyyyyyyyy"}')
+
+    def test_expire(self):
+        """
+        Drop results older than the time to live
+        """
+        results = ResultCache(ttl_seconds=-1.0)
+        results.put("a", {"blocks": 1})
+
+        assert results.get("a") is None
+        assert results.size_bytes == 0
+
+    def test_results_on_disk(self):
+        """
+        Find results kept on disk by an earlier cache, and prune the oldest
+        """
+        with TemporaryDirectory() as test_dir:
+            results = ResultCache(max_entries=2, cache_dir=test_dir)
+            for index, key in enumerate(["a", "b", "c"]):
+                results.put(key, {"blocks": index})
+                os.utime(results.file_path(key), (index, index))
+
+            assert ResultCache(cache_dir=test_dir).get("a") == {"blocks": 0}
+
+            results.prune()
+
+            assert sorted(os.listdir(test_dir)) == ["b.json", "c.json"]
+            assert ResultCache(cache_dir=test_dir, ttl_seconds=-1.0).get("c") is None
+            assert sorted(os.listdir(test_dir)) == ["b.json"]
+
+
+class TestCachingChecker:
+    """
+    A test caching checker class for CachingChecker class tests
+    """
+    def test_split_grids(self):
+        """
+        Cut a blueprint into its grids, or give up when a byte search can't be trusted
+        """
+        with open(BP_FILE, "rb") as bp_file:
+            body = bp_file.read()
+
+        fragments = split_grids(body)
+
+        assert len(fragments) == 3
+        assert all(fragment.startswith(b"<CubeGrid>") and fragment.endswith(b"</CubeGrid>") for fragment in fragments)
+        assert split_grids(body.replace(b"<CubeGrids>", b"<CubeGrids><!-- <CubeGrid> -->")) is None
+        assert split_grids(body.replace(b"<CubeGrids>", b"<CubeGrids><CubeGrid />")) is None
+        assert split_grids(body.replace(b"</CubeGrids>",
+                                        b'<MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">'
+                                        b"<SubtypeName>Loose</SubtypeName></MyObjectBuilder_CubeBlock>"
+                                        b"</CubeGrids>")) is None
+        assert split_grids(body.replace(b'<?xml version="1.0"?>', b'<?xml version="1.0" encoding="utf-16"?>')) \
+            is None
+        assert split_grids(b"<Definitions />") is None
+
+    def test_check_bytes(self):
+        """
+        Check a blueprint the same as the checker, then from the caches
+        """
+        with open(BP_FILE, "rb") as bp_file:
+            body = bp_file.read()
+
+        checker = BluePrintChecker(ALL_BLOCKS, ALL_RECIPES)
+        expected = checker.check_blueprint(BP_FILE)
+        results = ResultCache()
+        grids = ResultCache()
+        caching = CachingChecker(checker, results, grids)
+
+        for mode in ["dom", "stream"]:
+            assert caching.check_bytes(body, mode) == expected
+        assert (results.hits, results.misses) == (1, 1)
+        assert (grids.hits, grids.misses) == (0, 3)
+
+        # one grid changed, only that grid is parsed again
+        changed = body.replace(b"<CustomName>Cargo.Medium.01</CustomName>", b"<CustomName>Cargo</CustomName>")
+        assert caching.check_bytes(changed) == expected
+        assert (grids.hits, grids.misses) == (2, 4)
+
+        # new definitions, new results
+        reloaded = CachingChecker(BluePrintChecker(ALL_BLOCKS, {}), results, grids)
+        assert reloaded.check_bytes(body)["materials_estimate"] == {}
+        assert results.misses == 3
+
+    def test_definitions_fingerprint(self):
+        """
+        Give equal definitions the same fingerprint and different ones another
+        """
+        assert definitions_fingerprint(ALL_BLOCKS, ALL_RECIPES) == \
+            definitions_fingerprint(dict(ALL_BLOCKS), dict(ALL_RECIPES))
+        assert definitions_fingerprint(ALL_BLOCKS, ALL_RECIPES) != definitions_fingerprint(ALL_BLOCKS, {})
@@ -1,8 +1,13 @@
+import gc
 import os.path
+import tracemalloc
 import xml.etree.ElementTree as ElementTree
 from tempfile import TemporaryDirectory
 
-from scraper import Scraper
+from conftest import write_blocks
+from definition_cache import DefinitionCache
+from scraper import Scraper, scrape_blocks_file
+from stats import Stats
 
 
 class TestScraper:
@@ -187,3 +192,178 @@ class TestScraper:
 
         assert len(scraper.all_recipes) == 0
         assert scraper.all_recipes == {}
+
+    def test_load_blocks_from_cache(self):
+        """
+        Load blocks from the cache instead of scraping an unchanged file
+        """
+        sub_type_id = "my-subtype-id"
+
+        block_element = ElementTree.Element("Definition")
+        block_id_element = ElementTree.SubElement(block_element, "Id")
+        ElementTree.SubElement(block_id_element, "TypeId").text = "my-type-id"
+        ElementTree.SubElement(block_id_element, "SubtypeId").text = sub_type_id
+        ElementTree.SubElement(block_element, "DisplayName").text = "my-display-name"
+        component_element = ElementTree.SubElement(block_element, "Components")
+        ElementTree.SubElement(component_element, "Component",
+                               attrib={"Subtype": "SteelPlate", "Count": "10"})
+
+        with TemporaryDirectory() as test_dir:
+            blocks_dir = os.path.join(test_dir, "CubeBlocks")
+            os.mkdir(blocks_dir)
+            xml_path = os.path.join(blocks_dir, "my_xml_file.sbc")
+            ElementTree.ElementTree(block_element).write(xml_path)
+
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+            Scraper(cache).load_blocks(blocks_dir)
+
+            assert cache.misses == 1
+
+            scraper = Scraper(cache)
+            scraper.load_blocks(blocks_dir)
+
+            assert cache.hits == 1
+            assert scraper.all_blocks[sub_type_id]["components"] == {"SteelPlate": 10}
+
+    def test_load_block_dirs_in_parallel(self):
+        """
+        Load blocks from several directories with a process pool, later directories win
+        """
+        with TemporaryDirectory() as test_dir:
+            vanilla_dir = os.path.join(test_dir, "vanilla")
+            mod_dir = os.path.join(test_dir, "mod")
+            os.mkdir(vanilla_dir)
+            os.mkdir(mod_dir)
+            write_blocks(vanilla_dir, "a.sbc", ["BlockA"], 1)
+            write_blocks(vanilla_dir, "b.sbc", ["BlockB"], 2)
+            write_blocks(mod_dir, "a.sbc", ["BlockA"], 3)
+
+            serial_scraper = Scraper()
+            serial_scraper.load_block_dirs([vanilla_dir, mod_dir])
+            parallel_scraper = Scraper()
+            parallel_scraper.load_block_dirs([vanilla_dir, mod_dir], workers=2)
+
+            assert parallel_scraper.all_blocks == serial_scraper.all_blocks
+            assert parallel_scraper.all_blocks["BlockA"]["components"] == {"SteelPlate": 3}
+            assert list(parallel_scraper.all_blocks.keys()) == ["BlockA", "BlockB"]
+
+    def test_load_block_dirs_with_stats(self):
+        """
+        Time the scraping of each directory and count files, bytes and cache hits
+        """
+        with TemporaryDirectory() as test_dir:
+            vanilla_dir = os.path.join(test_dir, "vanilla")
+            mod_dir = os.path.join(test_dir, "mod")
+            for blocks_dir in [vanilla_dir, mod_dir]:
+                os.mkdir(blocks_dir)
+                write_blocks(blocks_dir, "blocks.sbc", [os.path.basename(blocks_dir)])
+            with open(os.path.join(mod_dir, "broken.sbc"), "w") as broken_file:
+                broken_file.write("Some non-XML text")
+
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+            Scraper(cache).load_block_dirs([vanilla_dir, mod_dir])
+
+            for workers in [1, 2]:
+                stats = Stats()
+                Scraper(cache, stats=stats).load_block_dirs([vanilla_dir, mod_dir], workers)
+
+                assert stats.counters["blocks_cache_hits"] == 2
+                assert stats.counters["blocks_cache_misses"] == 1
+                assert stats.counters["files_parsed"] == 1
+                assert stats.counters["parse_errors"] == 1
+                assert stats.counters["bytes_parsed"] == len("Some non-XML text")
+                assert stats.stages[f"scrape_blocks:{mod_dir}"]["calls"] == 1
+                assert f"scrape_blocks:{vanilla_dir}" not in stats.stages
+
+    def test_refresh_changed_block_files(self):
+        """
+        Reload only the block files that changed, restoring the blocks they were shadowing
+        """
+        with TemporaryDirectory() as test_dir:
+            vanilla_dir = os.path.join(test_dir, "vanilla")
+            mod_dir = os.path.join(test_dir, "mod")
+            os.mkdir(vanilla_dir)
+            os.mkdir(mod_dir)
+            write_blocks(vanilla_dir, "a.sbc", ["BlockA"], 1)
+            write_blocks(vanilla_dir, "b.sbc", ["BlockB"], 2)
+            write_blocks(mod_dir, "a.sbc", ["BlockA"], 3)
+
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+            scraper = Scraper(cache)
+            scraper.load_block_dirs([vanilla_dir, mod_dir])
+
+            assert scraper.all_blocks["BlockA"]["components"] == {"SteelPlate": 3}
+            assert scraper.refresh() == []
+
+            # the mod stops overriding BlockA and adds BlockC instead
+            write_blocks(mod_dir, "a.sbc", ["BlockC"], 4)
+            misses = cache.misses
+
+            assert scraper.refresh() == [os.path.join(mod_dir, "a.sbc")]
+            assert cache.misses == misses + 1
+            assert scraper.all_blocks["BlockA"]["components"] == {"SteelPlate": 1}
+            assert scraper.all_blocks["BlockC"]["components"] == {"SteelPlate": 4}
+
+            os.remove(os.path.join(mod_dir, "a.sbc"))
+            write_blocks(vanilla_dir, "c.sbc", ["BlockB"], 5)
+            scraper.refresh()
+
+            assert sorted(scraper.all_blocks.keys()) == ["BlockA", "BlockB"]
+            assert scraper.all_blocks["BlockB"]["components"] == {"SteelPlate": 5}
+
+            # loading the mod directory first means vanilla now wins
+            write_blocks(mod_dir, "z.sbc", ["BlockB"], 6)
+            scraper.refresh([mod_dir, vanilla_dir])
+
+            assert scraper.all_blocks["BlockB"]["components"] == {"SteelPlate": 5}
+
+            scraper.refresh([vanilla_dir, mod_dir])
+
+            assert scraper.all_blocks["BlockB"]["components"] == {"SteelPlate": 6}
+
+    def test_load_compact_blocks(self):
+        """
+        Load compact blocks that read the same as dicts in well under half the memory
+        """
+        definitions_element = ElementTree.Element("Definitions")
+        cube_blocks_element = ElementTree.SubElement(definitions_element, "CubeBlocks")
+        for index in range(2000):
+            block_element = ElementTree.SubElement(cube_blocks_element, "Definition")
+            block_id_element = ElementTree.SubElement(block_element, "Id")
+            ElementTree.SubElement(block_id_element, "TypeId").text = "CubeBlock"
+            ElementTree.SubElement(block_id_element, "SubtypeId").text = f"LargeBlockArmor{index}"
+            ElementTree.SubElement(block_element, "DisplayName").text = f"DisplayName_Block_Armor{index // 2}"
+            component_element = ElementTree.SubElement(block_element, "Components")
+            for component in ["SteelPlate", "Construction", "InteriorPlate", "SmallTube", "Computer"]:
+                ElementTree.SubElement(component_element, "Component",
+                                       attrib={"Subtype": component, "Count": str(index % 50 + 1)})
+
+        with TemporaryDirectory() as test_dir:
+            cache = DefinitionCache(os.path.join(test_dir, "cache.json"))
+            ElementTree.ElementTree(definitions_element).write(os.path.join(test_dir, "blocks.sbc"))
+
+            # growing the interpreter's table of interned names happens once a process, don't count it below
+            warm_up = Scraper(None, True)
+            warm_up.load_blocks(test_dir)
+
+            memory = {}
+            for compact in [False, True]:
+                gc.collect()
+                tracemalloc.start()
+                scraper = Scraper(cache if compact else None, compact)
+                scraper.load_blocks(test_dir)
+                gc.collect()
+                memory[compact] = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+
+                assert len(scraper.all_blocks) == 2000
+                assert scraper.all_blocks["LargeBlockArmor7"]["components"]["Computer"] == 8
+
+            assert memory[True] < memory[False] / 2
+
+            cache.save()
+            another_cache = DefinitionCache(cache.cache_file)
+            another_cache.load()
+
+            assert Scraper(another_cache).scrape_files("blocks", [os.path.join(test_dir, "blocks.sbc")], None)[0] == \
+                Scraper().scrape_files("blocks", [os.path.join(test_dir, "blocks.sbc")], scrape_blocks_file)[0]
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os.path
+import shutil
+import xml.etree.ElementTree as ElementTree
+from tempfile import TemporaryDirectory
+
+from conftest import write_blocks
+from server import CheckServer
+
+
+BP_FILE = os.path.join(os.path.dirname(__file__), "..", "blueprints", "bp.sbc")
+
+
+def write_content(se_path: str, count: int) -> None:
+    """
+    Write a tiny Content directory with one block and one recipe
+    """
+    write_blocks(os.path.join(se_path, "Data", "CubeBlocks"), "blocks.sbc", ["SmallBlockMediumContainer"], count,
+                 "CargoContainer")
+
+    recipe_element = ElementTree.Element("Blueprint")
+    ElementTree.SubElement(recipe_element, "Result",
+                           attrib={"SubtypeId": "SteelPlate", "Amount": "1", "TypeId": "Component"})
+    prerequisites_element = ElementTree.SubElement(recipe_element, "Prerequisites")
+    ElementTree.SubElement(prerequisites_element, "Item", attrib={"SubtypeId": "Iron", "Amount": "21"})
+    ElementTree.ElementTree(recipe_element).write(os.path.join(se_path, "Data", "Blueprints.sbc"))
+
+
+async def request(port: int, method: str, path: str, body: bytes = b"") -> tuple:
+    """
+    Send a request to the server and read the response
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+
+    head, _, payload = response.partition(b"\r\n\r\n")
+
+    return int(head.split(b" ")[1]), json.loads(payload)
+
+
+class TestCheckServer:
+    """
+    A test check server class for CheckServer class tests
+    """
+    def test_check_upload(self):
+        """
+        Check an uploaded blueprint, then reload when the definitions change
+        """
+        with open(BP_FILE, "rb") as bp_file:
+            bp_body = bp_file.read()
+
+        async def scenario(se_path):
+            check_server = CheckServer({"se_path": se_path, "mods_path": se_path,
+                                        "result_cache": {"max_entries": 8}, "grid_cache": {"max_entries": 8}})
+            await check_server.reload()
+            server = await asyncio.start_server(check_server.handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+
+            async with server:
+                status, health = await request(port, "GET", "/health")
+                assert status == 200
+                assert health == {"status": "ok", "blocks": 1, "recipes": 1,
+                                  "result_cache": {"entries": 0, "hits": 0, "misses": 0}}
+
+                responses = await asyncio.gather(request(port, "POST", "/check", bp_body),
+                                                 request(port, "POST", "/check", bp_body))
+                assert responses[0] == responses[1]
+                status, result = responses[0]
+                assert status == 200
+                assert result["blocks"]["SmallBlockMediumContainer"] == 2
+                assert result["components"] == {"SteelPlate": 20}
+                assert result["materials_estimate"] == {"Iron": 420.0}
+
+                assert await check_server.check_for_changes() is False
+                write_content(se_path, 20)
+                assert await check_server.check_for_changes() is True
+
+                status, result = await request(port, "POST", "/check", bp_body)
+                assert result["components"] == {"SteelPlate": 40}
+
+                status, health = await request(port, "GET", "/health")
+                assert health["result_cache"]["hits"] >= 1
+
+                status, result = await request(port, "POST", "/check", b"Some non-XML text")
+                assert status == 400
+
+                status, result = await request(port, "GET", "/check")
+                assert status == 405
+
+                status, result = await request(port, "GET", "/nowhere")
+                assert status == 404
+
+            check_server.executor.shutdown()
+
+        with TemporaryDirectory() as se_path:
+            write_content(se_path, 10)
+            asyncio.run(scenario(se_path))
+
+    def test_check_in_workers(self):
+        """
+        Check in worker processes that map a snapshot of the definitions, with a new snapshot when they change
+        """
+        with open(BP_FILE, "rb") as bp_file:
+            bp_body = bp_file.read()
+
+        async def scenario(se_path):
+            check_server = CheckServer({"se_path": se_path, "mods_path": se_path}, workers=2)
+            await check_server.reload()
+
+            result = await check_server.check(bp_body)
+            assert result["components"] == {"SteelPlate": 20}
+
+            write_content(se_path, 20)
+            assert await check_server.check_for_changes() is True
+            result = await check_server.check(bp_body)
+            assert result["components"] == {"SteelPlate": 40}
+            assert sorted(os.listdir(check_server.snapshot_dir)) == ["definitions_1.snapshot",
+                                                                     "definitions_2.snapshot"]
+
+            check_server.executor.shutdown()
+            shutil.rmtree(check_server.snapshot_dir)
+
+        with TemporaryDirectory() as se_path:
+            write_content(se_path, 10)
+            asyncio.run(scenario(se_path))
@@ -0,0 +1,53 @@
+import io
+
+from stats import NO_STATS, Stats, source_size
+
+
+class TestStats:
+    """
+    A test stats class for Stats class tests
+    """
+    def test_stages_and_counters(self):
+        """
+        Time the same stage twice and add to a counter
+        """
+        stats = Stats()
+        for _ in range(2):
+            with stats.stage("parse"):
+                sum(range(1000))
+        stats.count("files_parsed")
+        stats.count("files_parsed", 2)
+
+        assert stats.stages["parse"]["calls"] == 2
+        assert stats.stages["parse"]["wall_seconds"] > 0
+        assert stats.counters == {"files_parsed": 3}
+
+    def test_merge_and_from_dict(self):
+        """
+        Add stats together, including ones turned into dicts and back
+        """
+        stats = Stats()
+        stats.add_time("parse", 1.0, 0.5)
+        stats.count("files_parsed")
+
+        merged = Stats.from_dict(stats.as_dict())
+        merged.merge(stats)
+
+        assert merged.as_dict() == {"stages": {"parse": {"calls": 2, "wall_seconds": 2.0, "cpu_seconds": 1.0}},
+                                    "counters": {"files_parsed": 2}}
+
+    def test_no_stats(self):
+        """
+        Record nothing when instrumentation is off
+        """
+        with NO_STATS.stage("parse"):
+            NO_STATS.count("files_parsed")
+
+        assert NO_STATS.as_dict() == {"stages": {}, "counters": {}}
+
+    def test_source_size(self):
+        """
+        Tell the size of a path or an in memory upload
+        """
+        assert source_size(io.BytesIO(b"12345")) == 5
+        assert source_size("no/such/file.sbc") == 0
@@ -0,0 +1,135 @@
+import os.path
+
+import pytest
+
+from bp_checker import BluePrintChecker
+
+numpy = pytest.importorskip("numpy")
+
+from vector_engine import VectorEngine  # noqa: E402
+
+
+BP_FILE = os.path.join(os.path.dirname(__file__), "..", "blueprints", "bp.sbc")
+
+ALL_BLOCKS = {
+  "SmallBlockMediumContainer": {
+    "type_id": "CargoContainer",
+    "sub_type_id": "SmallBlockMediumContainer",
+    "display_name": "DisplayName_Block_MediumContainer",
+    "components": {
+      "SteelPlate": 12,
+      "Construction": 8,
+      "MysteryComponent": 1
+    }
+  },
+  "SmallBlockArmorBlock": {
+    "type_id": "CubeBlock",
+    "sub_type_id": "SmallBlockArmorBlock",
+    "display_name": "DisplayName_Block_LightArmorBlock",
+    "components": {
+      "SteelPlate": 1
+    }
+  },
+  "LargeRailStraight": {
+    "type_id": "CubeBlock",
+    "sub_type_id": "LargeRailStraight",
+    "display_name": "LargeRailStraight",
+    "components": {
+      "Girder": 4
+    }
+  }
+}
+
+ALL_RECIPES = {
+    "SteelPlate": {
+        "materials": {
+            "Iron": 21.0
+        },
+        "output_type_id": "SteelPlate",
+        "output_quantity": 1.0
+    },
+    "Construction": {
+        "materials": {
+            "Iron": 8.0,
+            "Nickel": 0.5
+        },
+        "output_type_id": "Construction",
+        "output_quantity": 1.0
+    },
+    "Girder": {
+        "materials": {
+            "Iron": 6.0,
+            "Cobalt": 0.25
+        },
+        "output_type_id": "Girder",
+        "output_quantity": 1.0
+    }
+}
+
+
+class TestVectorEngine:
+    """
+    A test vector engine class for VectorEngine class tests
+    """
+    def test_new_engine(self):
+        """
+        Make a new engine with interned names
+        """
+        engine = VectorEngine(ALL_BLOCKS, ALL_RECIPES)
+
+        assert engine.block_names == ["SmallBlockMediumContainer", "SmallBlockArmorBlock", "LargeRailStraight"]
+        assert engine.component_names == ["SteelPlate", "Construction", "MysteryComponent", "Girder"]
+        assert engine.block_components.shape == (3, 4)
+        assert engine.component_materials.shape == (4, 3)
+
+    def test_check_counts(self):
+        """
+        Check block counts the same as BluePrintChecker
+        """
+        used_blocks = {
+            "SmallBlockMediumContainer": 2,
+            "SmallBlockArmorBlock": 7,
+            "AnotherBlock": 5
+        }
+
+        engine = VectorEngine(ALL_BLOCKS, ALL_RECIPES)
+
+        assert engine.check_counts(used_blocks) == BluePrintChecker(ALL_BLOCKS, ALL_RECIPES).check_counts(used_blocks)
+
+    def test_check_blueprints(self):
+        """
+        Check several blueprints in one go the same as BluePrintChecker
+        """
+        bpc = BluePrintChecker(ALL_BLOCKS, ALL_RECIPES)
+        engine = VectorEngine(ALL_BLOCKS, ALL_RECIPES)
+
+        results = engine.check_blueprints([BP_FILE, BP_FILE], "stream")
+
+        assert results == [bpc.check_blueprint(BP_FILE), bpc.check_blueprint(BP_FILE)]
+
+    def test_check_many(self):
+        """
+        Check lots of different block counts as one matrix product
+        """
+        blocks_list = [{}, {"LargeRailStraight": 3}, {"SmallBlockArmorBlock": 1, "LargeRailStraight": 1}]
+
+        bpc = BluePrintChecker(ALL_BLOCKS, ALL_RECIPES)
+        engine = VectorEngine(ALL_BLOCKS, ALL_RECIPES)
+
+        assert engine.check_many(blocks_list) == [bpc.check_counts(blocks) for blocks in blocks_list]
+
+    def test_check_zero_counts(self):
+        """
+        Check blocks listed with a count of 0 the same as BluePrintChecker, with and without its table
+        """
+        blocks_list = [{"SmallBlockMediumContainer": 0}, {"SmallBlockArmorBlock": 0, "LargeRailStraight": 2},
+                       {"AnotherBlock": 0}]
+
+        bpc = BluePrintChecker(ALL_BLOCKS, ALL_RECIPES)
+        engine = VectorEngine(ALL_BLOCKS, ALL_RECIPES)
+        expected = [bpc.check_counts(blocks) for blocks in blocks_list]
+        bpc.precompile()
+
+        assert engine.check_many(blocks_list) == expected
+        assert [bpc.check_counts(blocks) for blocks in blocks_list] == expected
+        assert set(expected[0]["components"].values()) == {0}
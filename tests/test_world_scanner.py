@@ -0,0 +1,207 @@
+import io
+import json
+import os.path
+import tracemalloc
+from tempfile import TemporaryDirectory
+
+from bp_checker import BluePrintChecker
+from check_mats import check_mats_world
+from world_scanner import WorldScanner, read_grids, split_entities
+
+
+WORLD_HEAD = """<?xml version="1.0"?>
+<MyObjectBuilder_Sector xmlns:xsd="http://www.w3.org/2001/XMLSchema" \
+xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <SectorObjects>
+"""
+WORLD_TAIL = """  </SectorObjects>
+</MyObjectBuilder_Sector>
+"""
+FLOATING_OBJECT = """    <MyObjectBuilder_EntityBase xsi:type="MyObjectBuilder_FloatingObject">
+      <EntityId>1</EntityId>
+      <Item><PhysicalContent xsi:type="MyObjectBuilder_Ore"><SubtypeName>Stone</SubtypeName></PhysicalContent></Item>
+    </MyObjectBuilder_EntityBase>
+"""
+PROJECTOR = """        <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_Projector">
+          <SubtypeName>LargeProjector</SubtypeName>
+          <Owner>222</Owner>
+          <ProjectedGrid>
+            <CubeBlocks>
+              <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">
+                <SubtypeName>LargeBlockArmorBlock</SubtypeName>
+              </MyObjectBuilder_CubeBlock>
+            </CubeBlocks>
+          </ProjectedGrid>
+        </MyObjectBuilder_CubeBlock>
+"""
+BLOCKS = {"LargeBlockArmorBlock": {"components": {"SteelPlate": 25}},
+          "LargeProjector": {"components": {"SteelPlate": 21, "Computer": 25}}}
+RECIPES = {"SteelPlate": {"materials": {"Iron": 21.0}}}
+
+
+def grid_xml(entity_id: int, name: str, armor: int, owner: str = None) -> str:
+    """
+    A grid entity with some armor blocks built by someone, and a projector if it has an owner
+    """
+    blocks = "".join("""        <MyObjectBuilder_CubeBlock xsi:type="MyObjectBuilder_CubeBlock">
+          <SubtypeName>LargeBlockArmorBlock</SubtypeName>
+          <BuiltBy>111</BuiltBy>
+        </MyObjectBuilder_CubeBlock>
+""" for _ in range(armor))
+
+    return f"""    <MyObjectBuilder_EntityBase xsi:type="MyObjectBuilder_CubeGrid">
+      <SubtypeName />
+      <EntityId>{entity_id}</EntityId>
+      <GridSizeEnum>Large</GridSizeEnum>
+      <CubeBlocks>
+{blocks}{PROJECTOR if owner else ""}      </CubeBlocks>
+      <DisplayName>{name}</DisplayName>
+    </MyObjectBuilder_EntityBase>
+"""
+
+
+def write_world(world_file: str, grids: int, middle: str = "") -> None:
+    """
+    Write a world save with some grids, a floating object between them and anything else in the middle
+    """
+    with open(world_file, "w") as sbs_file:
+        sbs_file.write(WORLD_HEAD)
+        for grid in range(grids):
+            sbs_file.write(grid_xml(100 + grid, f"Grid {grid}", grid % 3 + 1, "222" if grid % 2 else None))
+            if grid == 0:
+                sbs_file.write(FLOATING_OBJECT + middle)
+        sbs_file.write(WORLD_TAIL)
+
+
+class TestWorldScanner:
+    """
+    A test world scanner class for WorldScanner class tests
+    """
+    def test_scan(self):
+        """
+        Cost every grid by grid and by owner, leaving out projected blocks and entities that aren't grids
+        """
+        with TemporaryDirectory() as test_dir:
+            world_file = os.path.join(test_dir, "SANDBOX_0_0_0_.sbs")
+            write_world(world_file, 2)
+
+            grid_results = []
+            totals = WorldScanner(BluePrintChecker(BLOCKS, RECIPES)).scan(world_file, on_grid=grid_results.append)
+
+        assert [(grid["entity_id"], grid["display_name"], grid["grid_size"], grid["owner"])
+                for grid in grid_results] == [("100", "Grid 0", "Large", "111"), ("101", "Grid 1", "Large", "111")]
+        assert grid_results[1]["blocks"] == {"LargeBlockArmorBlock": 2, "LargeProjector": 1}
+        assert grid_results[1]["owners"]["222"]["components"] == {"SteelPlate": 21, "Computer": 25}
+        assert totals["grids"] == 2
+        assert totals["blocks"] == {"LargeBlockArmorBlock": 3, "LargeProjector": 1}
+        assert totals["components"] == {"SteelPlate": 96, "Computer": 25}
+        assert totals["owners"]["111"]["grids"] == 2
+        assert totals["owners"]["111"]["materials_estimate"] == {"Iron": 75 * 21.0}
+        assert totals["owners"]["222"]["blocks"] == {"LargeProjector": 1}
+
+    def test_scan_workers(self):
+        """
+        Cost grids across processes, with the same results in the same order as one process
+        """
+        with TemporaryDirectory() as test_dir:
+            world_file = os.path.join(test_dir, "SANDBOX_0_0_0_.sbs")
+            write_world(world_file, 7)
+            scanner = WorldScanner(BluePrintChecker(BLOCKS, RECIPES))
+
+            streamed = []
+            streamed_totals = scanner.scan(world_file, on_grid=streamed.append)
+            split = []
+            split_totals = scanner.scan(world_file, workers=2, on_grid=split.append)
+
+        assert split == streamed
+        assert split_totals == streamed_totals
+        assert split_totals["complete"] is True
+
+    def test_scan_broken(self):
+        """
+        Mark the totals incomplete when the save can't be read to the end, streamed or across processes
+        """
+        with TemporaryDirectory() as test_dir:
+            world_file = os.path.join(test_dir, "SANDBOX_0_0_0_.sbs")
+            write_world(world_file, 3)
+            with open(world_file) as sbs_file:
+                contents = sbs_file.read()
+            with open(world_file, "w") as sbs_file:
+                sbs_file.write(contents.replace("<DisplayName>Grid 1</DisplayName>", "<DisplayName>Grid & 1</DisplayName>"))
+            scanner = WorldScanner(BluePrintChecker(BLOCKS, RECIPES))
+
+            for workers in [1, 2]:
+                grid_results = []
+                totals = scanner.scan(world_file, workers, on_grid=grid_results.append)
+
+                assert [grid["entity_id"] for grid in grid_results] == ["100"]
+                assert totals["grids"] == 1
+                assert totals["complete"] is False
+                assert totals["error"].startswith("ParseError: ")
+
+    def test_split_entities(self):
+        """
+        Find each grid's bytes, and give up on anything a byte search could get wrong
+        """
+        world = (WORLD_HEAD + grid_xml(1, "One", 1) + FLOATING_OBJECT + grid_xml(2, "Two", 1) + WORLD_TAIL).encode()
+
+        spans = split_entities(world)
+
+        assert len(spans) == 2
+        assert world[spans[1][0]:spans[1][1]].decode() == grid_xml(2, "Two", 1).strip()
+        assert split_entities(world.replace(b"<SectorObjects>", b"<SectorObjects><!-- -->")) is None
+        assert split_entities(world.replace(b'version="1.0"', b'version="1.0" encoding="utf-16"')) is None
+        assert split_entities((WORLD_HEAD + WORLD_TAIL).encode()) is None
+
+    def test_scan_workers_falls_back(self):
+        """
+        Stream a save in one process when it can't be split by grid
+        """
+        with TemporaryDirectory() as test_dir:
+            world_file = os.path.join(test_dir, "SANDBOX_0_0_0_.sbs")
+            write_world(world_file, 3, "    <!-- a comment -->\n")
+            scanner = WorldScanner(BluePrintChecker(BLOCKS, RECIPES))
+
+            assert scanner.scan(world_file, workers=2) == scanner.scan(world_file)
+
+    def test_read_grids_bounded_memory(self):
+        """
+        Stream a save with memory that doesn't grow with the number of grids
+        """
+        def peak_bytes(grids: int) -> int:
+            world = io.StringIO()
+            world.write(WORLD_HEAD)
+            for grid in range(grids):
+                world.write(grid_xml(grid, f"Grid {grid}", 20))
+            world.write(WORLD_TAIL)
+            contents = io.BytesIO(world.getvalue().encode())
+
+            tracemalloc.start()
+            for _ in read_grids(contents):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            return peak
+
+        assert peak_bytes(2000) < peak_bytes(200) * 2
+
+    def test_check_mats_world(self):
+        """
+        Write a json line per grid then one per owner
+        """
+        with TemporaryDirectory() as test_dir:
+            world_file = os.path.join(test_dir, "SANDBOX_0_0_0_.sbs")
+            write_world(world_file, 2)
+            output = os.path.join(test_dir, "world.jsonl")
+            config = {"se_path": os.path.join(test_dir, "Content")}
+
+            totals = check_mats_world(config=config, world=world_file, output=output, modded_blocks=False)
+            with open(output) as results_file:
+                lines = [json.loads(line) for line in results_file]
+
+        assert totals["grids"] == 2
+        assert totals["complete"] is True
+        assert [line["grid"]["entity_id"] for line in lines[:2]] == ["100", "101"]
+        assert [line["owner"] for line in lines[2:]] == ["111", "222"]
+        assert totals["unknown_blocks"] == ["LargeBlockArmorBlock", "LargeProjector"]
@@ -0,0 +1,145 @@
+from logbook import Logger
+
+from bp_checker import BluePrintChecker
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, only the vector engine needs it
+    numpy = None
+
+
+my_log = Logger(__name__)
+
+
+class VectorEngine:
+    """
+    Totals blocks, components and materials with matrix products, for checking lots of blueprints at once
+    """
+    def __init__(self, blocks: dict, components: dict) -> None:
+        """
+        Create a VectorEngine class
+
+        :param blocks: a dict with all the blocks in
+        :param components: a dict with all the component recipes in
+        :return: None
+        """
+        if numpy is None:
+            raise ImportError("VectorEngine needs numpy, install it with: pip install numpy")
+
+        self.checker = BluePrintChecker(blocks, components)  # for counting blocks in blueprints
+
+        # every name gets an integer id, the index of its row or column in the matrices
+        self.block_names = list(blocks.keys())
+        self.block_ids = {name: index for index, name in enumerate(self.block_names)}
+        self.component_names = []
+        self.component_ids = {}
+        for block in blocks.values():
+            for component in block["components"]:
+                if component not in self.component_ids:
+                    self.component_ids[component] = len(self.component_names)
+                    self.component_names.append(component)
+
+        self.material_names = []
+        self.material_ids = {}
+        for component in self.component_names:
+            for material in components.get(component, {"materials": {}})["materials"]:
+                if material not in self.material_ids:
+                    self.material_ids[material] = len(self.material_names)
+                    self.material_names.append(material)
+
+        self.block_components = numpy.zeros((len(self.block_names), len(self.component_names)), dtype=numpy.int64)
+        # which entries exist at all, a component listed with a count of 0 still shows up in the totals
+        self.block_uses = numpy.zeros(self.block_components.shape, dtype=numpy.int64)
+        for block_id, block in enumerate(blocks.values()):
+            for component, c_quantity in block["components"].items():
+                self.block_components[block_id, self.component_ids[component]] = c_quantity
+                self.block_uses[block_id, self.component_ids[component]] = 1
+
+        self.component_materials = numpy.zeros((len(self.component_names), len(self.material_names)))
+        self.component_makes = numpy.zeros(self.component_materials.shape, dtype=numpy.int64)
+        self.component_known = numpy.zeros(len(self.component_names), dtype=bool)
+        for component_id, component in enumerate(self.component_names):
+            if component not in components:
+                continue
+
+            self.component_known[component_id] = True
+            for material, m_quantity in components[component]["materials"].items():
+                self.component_materials[component_id, self.material_ids[material]] = m_quantity
+                self.component_makes[component_id, self.material_ids[material]] = 1
+
+        for component_id in numpy.flatnonzero(~self.component_known):
+            my_log.warn(f"Unknown component type: {self.component_names[component_id]}")
+
+    def count_vectors(self, blocks_list: list) -> tuple:
+        """
+        Turn block counts into a matrix with one row per blueprint
+
+        :param blocks_list: a list of dicts of block counts
+        :return: tuple of the count matrix, which blocks are listed at all and each blueprint's unknown blocks
+        """
+        counts = numpy.zeros((len(blocks_list), len(self.block_names)), dtype=numpy.int64)
+        # a block listed with a count of 0 still puts its components in the totals, as it does for check_components
+        listed = numpy.zeros(counts.shape, dtype=numpy.int64)
+        unknown_blocks_list = []
+        for row, blocks in enumerate(blocks_list):
+            unknown_blocks = []
+            for block, b_quantity in blocks.items():
+                block_id = self.block_ids.get(block)
+                if block_id is None:
+                    my_log.warn(f"Unknown block type: {block}")
+                    unknown_blocks.append(block)
+                    continue
+
+                counts[row, block_id] += b_quantity
+                listed[row, block_id] = 1
+            unknown_blocks_list.append(unknown_blocks)
+
+        return counts, listed, unknown_blocks_list
+
+    def check_many(self, blocks_list: list) -> list:
+        """
+        Check the components and materials for many sets of block counts as one matrix product
+
+        :param blocks_list: a list of dicts of block counts
+        :return: list of dicts, the same as BluePrintChecker.check_counts gives for each
+        """
+        counts, listed, unknown_blocks_list = self.count_vectors(blocks_list)
+
+        components = counts @ self.block_components
+        used = listed @ self.block_uses > 0
+        # unknown components are left out of the materials, like check_mats does
+        made = used & self.component_known
+        materials = numpy.where(made, components, 0) @ self.component_materials
+        made_materials = made.astype(numpy.int64) @ self.component_makes > 0
+
+        results = []
+        for row, blocks in enumerate(blocks_list):
+            results.append({
+                "blocks": blocks,
+                "components": {self.component_names[component_id]: int(components[row, component_id])
+                               for component_id in numpy.flatnonzero(used[row])},
+                "unknown_blocks": unknown_blocks_list[row],
+                "materials_estimate": {self.material_names[material_id]: float(materials[row, material_id])
+                                       for material_id in numpy.flatnonzero(made_materials[row])}
+            })
+
+        return results
+
+    def check_counts(self, blocks: dict) -> dict:
+        """
+        Check the components and materials for one set of block counts
+
+        :param blocks: a dict of block counts
+        :return: dict
+        """
+        return self.check_many([blocks])[0]
+
+    def check_blueprints(self, bp_files: list, mode: str = "dom") -> list:
+        """
+        Check many blueprints, counting their blocks one by one and totalling them all at once
+
+        :param bp_files: paths to xml blueprint files
+        :param mode: how to read the blueprints, see BluePrintChecker.check_blueprint
+        :return: list of dicts, the same as BluePrintChecker.check_blueprint gives for each
+        """
+        return self.check_many([self.checker.count_blocks(bp_file, mode) for bp_file in bp_files])
@@ -0,0 +1,273 @@
+import io
+import mmap
+import os.path
+import re
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import TemporaryDirectory
+
+from logbook import Logger
+
+from bp_checker import ENCODING_PATTERN, UNSPLITTABLE, BluePrintChecker, add_result
+from definition_snapshot import DefinitionSnapshot, write_snapshot
+from result_cache import GRID_HEAD, GRID_TAIL
+
+
+my_log = Logger(__name__)
+
+ENTITY_PATTERN = re.compile(rb"<MyObjectBuilder_EntityBase[\s>/]|</MyObjectBuilder_EntityBase>")
+GRID_TYPE = b'xsi:type="MyObjectBuilder_CubeGrid"'
+XSI_TYPE = "{http://www.w3.org/2001/XMLSchema-instance}type"
+# a projector keeps the blueprint it projects, those blocks aren't built
+PROJECTED_TAGS = ("ProjectedGrid", "ProjectedGrids")
+NO_OWNER = "0"
+
+
+class WorldScanner:
+    """
+    Costs every grid in a world save, by grid and by owner, without holding more than one grid in memory
+    """
+    def __init__(self, checker: BluePrintChecker) -> None:
+        """
+        Create a WorldScanner class
+
+        :param checker: the checker to cost the grids with, it gets precompiled
+        :return: None
+        """
+        self.checker = checker
+        if self.checker.block_table is None:
+            self.checker.precompile()
+
+    def scan(self, sbs_file: str, workers: int = 1, on_grid=None) -> dict:
+        """
+        Cost every grid in a world save, handing each grid's result on as soon as it is ready
+
+        With more than one worker the save is memory mapped and each grid's bytes are found with a byte search, so the
+        workers only get told where their grids are. The definitions go to the workers as a snapshot they all map.
+        Anything a byte search could get wrong means one process streams the save instead.
+
+        :param sbs_file: path to a SANDBOX_0_0_0_.sbs file
+        :param workers: number of processes to cost grids with
+        :param on_grid: called with each grid's result, in the order they are in the save
+        :return: dict of the world's totals and each owner's totals, "complete" is False and "error" says why if the
+            save couldn't be read to the end, the totals are then only for the grids before that
+        """
+        spans = split_world(sbs_file) if workers > 1 else None
+        snapshot_dir = None
+        if spans is None:
+            if workers > 1:
+                my_log.info(f"Can't split {sbs_file} by grid, streaming it in one process")
+            executor = None
+            checked = (self.check_grid(grid) for grid in read_grids(sbs_file))
+        else:
+            snapshot_dir = TemporaryDirectory()
+            snapshot_file = os.path.join(snapshot_dir.name, "definitions.snapshot")
+            write_snapshot(snapshot_file, self.checker.blocks, self.checker.components, self.checker.block_table)
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_world_worker,
+                                           initargs=(sbs_file, snapshot_file))
+            checked = executor.map(_check_world_grid, spans, chunksize=max(1, len(spans) // (workers * 16)))
+
+        totals = {"grids": 0, "blocks": {}, "components": {}, "unknown_blocks": [], "materials_estimate": {},
+                  "complete": True}
+        owners = {}
+        try:
+            for grid_result in checked:
+                totals["grids"] += 1
+                add_result(totals, grid_result)
+                for owner, owner_result in grid_result["owners"].items():
+                    if owner not in owners:
+                        owners[owner] = {"grids": 0, "blocks": {}, "components": {}, "unknown_blocks": [],
+                                         "materials_estimate": {}}
+                    owners[owner]["grids"] += 1
+                    add_result(owners[owner], owner_result)
+
+                if on_grid is not None:
+                    on_grid(grid_result)
+        except ElementTree.ParseError as error:
+            my_log.error(f"Could not read all the grids in {sbs_file} due to ParseError, the totals are incomplete: "
+                         f"{error}")
+            totals["complete"] = False
+            totals["error"] = f"ParseError: {error}"
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if snapshot_dir is not None:
+                snapshot_dir.cleanup()
+
+        totals["owners"] = owners
+
+        return totals
+
+    def check_grid(self, grid: dict) -> dict:
+        """
+        Cost a grid, and the blocks each owner has on it
+
+        :param grid: a grid from read_grids
+        :return: dict like check_counts gives, plus the grid's id, name, size, owner and "owners"
+        """
+        blocks = {}
+        owners = {}
+        for owner, owner_blocks in grid["owner_blocks"].items():
+            owners[owner] = self.checker.check_counts(owner_blocks)
+            for block, b_quantity in owner_blocks.items():
+                blocks[block] = blocks.get(block, 0) + b_quantity
+
+        # the owner with the most blocks, as the game decides who owns a grid
+        owner = max(owners, key=lambda o: sum(owners[o]["blocks"].values())) if owners else None
+
+        return {"entity_id": grid["entity_id"],
+                "display_name": grid["display_name"],
+                "grid_size": grid["grid_size"],
+                "owner": owner,
+                **self.checker.check_counts(blocks),
+                "owners": owners}
+
+
+def read_grids(source):
+    """
+    Stream the grids in a world save, each grid's blocks counted by owner
+
+    A block's owner is its Owner, or whoever built it for blocks nobody owns, such as armor.
+
+    :param source: path to a world save, or a file object
+    :return: generator of dicts with each grid's "entity_id", "display_name", "grid_size" and "owner_blocks"
+    :raises ElementTree.ParseError: if the save stops being xml, after the grids before that have been given
+    """
+    grid = None
+    grid_element = None
+    projected = 0
+    parents = []
+    for event, element in ElementTree.iterparse(source, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            if element.tag == "MyObjectBuilder_EntityBase" and element.get(XSI_TYPE) == "MyObjectBuilder_CubeGrid":
+                grid = {"entity_id": None, "display_name": None, "grid_size": None, "owner_blocks": {}}
+                grid_element = element
+            elif element.tag in PROJECTED_TAGS:
+                projected += 1
+            continue
+
+        parents.pop()
+        if element.tag == "MyObjectBuilder_CubeBlock":
+            if grid is not None and not projected:
+                owner = element.findtext("Owner")
+                if not owner or owner == NO_OWNER:
+                    owner = element.findtext("BuiltBy") or NO_OWNER
+                owner_blocks = grid["owner_blocks"].setdefault(owner, {})
+                sub_type_name = BluePrintChecker.get_block_name(element)
+                owner_blocks[sub_type_name] = owner_blocks.get(sub_type_name, 0) + 1
+        elif element.tag in PROJECTED_TAGS:
+            projected -= 1
+            continue
+        elif element.tag == "MyObjectBuilder_EntityBase":
+            if element is grid_element:
+                yield grid
+                grid = None
+                grid_element = None
+        elif grid_element is not None and parents and parents[-1] is grid_element:
+            if element.tag == "EntityId":
+                grid["entity_id"] = element.text
+            elif element.tag == "DisplayName":
+                grid["display_name"] = element.text
+            elif element.tag == "GridSizeEnum":
+                grid["grid_size"] = element.text
+            continue
+        else:
+            continue
+
+        # blocks and whole entities are let go of once counted, so memory doesn't grow with the save
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
+
+
+def split_world(sbs_file: str) -> list:
+    """
+    Find where each grid is in a world save, without parsing it
+
+    :param sbs_file: path to a world save
+    :return: list of (start, end) byte offsets of each grid entity, or None if the save has to be streamed
+    """
+    try:
+        with open(sbs_file, "rb") as world_file, \
+                mmap.mmap(world_file.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+            return split_entities(contents)
+    except (OSError, ValueError):  # an empty file can't be mapped
+        return None
+
+
+def split_entities(contents) -> list:
+    """
+    Find where each grid entity is in a world save's bytes, see split_world
+
+    :param contents: the save, as bytes or an mmap
+    :return: list of (start, end), or None if the save has to be streamed
+    """
+    if any(contents.find(marker) != -1 for marker in UNSPLITTABLE) or contents[:2] in (b"\xff\xfe", b"\xfe\xff"):
+        return None
+
+    head = contents[:200]
+    declaration = ENCODING_PATTERN.match(head[3:] if head.startswith(b"\xef\xbb\xbf") else head)
+    if declaration is not None and declaration.group(1).lower() not in (b"utf-8", b"utf8", b"us-ascii", b"ascii"):
+        return None
+
+    spans = []
+    start = None
+    depth = 0
+    for match in ENTITY_PATTERN.finditer(contents):
+        if match.group() == b"</MyObjectBuilder_EntityBase>":
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0 and start is not None:
+                spans.append((start, match.end()))
+                start = None
+            continue
+
+        tag_end = contents.find(b">", match.start())
+        if tag_end == -1:
+            return None
+        if contents[tag_end - 1:tag_end] == b"/":
+            continue
+
+        # entities inside entities aren't something a save has
+        if depth > 0:
+            return None
+        depth = 1
+        if contents.find(GRID_TYPE, match.start(), tag_end) != -1:
+            start = match.start()
+
+    if depth != 0 or not spans:
+        return None
+
+    return spans
+
+
+_world_scanner = None
+_world_contents = None
+
+
+def _init_world_worker(sbs_file: str, snapshot_file: str) -> None:
+    """
+    Give a world worker process its own scanner and memory maps of the save and the definitions snapshot
+
+    :return: None
+    """
+    global _world_scanner, _world_contents
+    _world_scanner = WorldScanner(DefinitionSnapshot(snapshot_file).checker())
+    with open(sbs_file, "rb") as world_file:
+        _world_contents = mmap.mmap(world_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _check_world_grid(span: tuple) -> dict:
+    """
+    Cost the grid at some bytes of the save in a world worker process
+
+    :param span: the grid's (start, end) byte offsets
+    :return: dict
+    """
+    fragment = GRID_HEAD + _world_contents[span[0]:span[1]] + GRID_TAIL
+    for grid in read_grids(io.BytesIO(fragment)):
+        return _world_scanner.check_grid(grid)
+
+    raise ValueError(f"No grid at bytes {span[0]} to {span[1]}")